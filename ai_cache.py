@@ -0,0 +1,127 @@
+# ai_cache.py
+"""Cache persistant des réponses du modèle, adressé par contenu.
+
+La clé est un SHA-256 de (opération, modèle, prompt, texte) : la même
+requête sur une conversation inchangée est servie depuis le disque. Les
+entrées expirent après ``ttl`` secondes et, au-delà de ``max_bytes``, les
+moins récemment lues sont supprimées en premier (LRU).
+
+Les réponses (résumés, analyses tirés des messages) sont chiffrées avec la
+clé maîtresse si elle est configurée (voir crypto.py) ; les entrées en clair
+d'avant le chiffrement sont supprimées à l'ouverture.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from crypto import aad, get_keyring
+from data_access import ConnectionPool
+
+AI_CACHE_DB = os.getenv("AI_CACHE_DB", "ai_cache.db")
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_cache_accessed ON ai_cache (accessed_at);
+"""
+
+
+def cache_key(operation, model, prompt, text):
+    raw = json.dumps([operation, model, prompt, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache clé -> valeur JSON avec TTL, éviction LRU et compteurs."""
+
+    def __init__(self, path=AI_CACHE_DB, ttl=AI_CACHE_TTL, max_bytes=AI_CACHE_MAX_BYTES, keyring=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cipher = (keyring if keyring is not None else get_keyring()).cipher("ai_cache")
+        self.pool = ConnectionPool(path)
+        with self.pool.exclusive() as conn:
+            conn.executescript(SCHEMA)
+        if self._cipher.enabled:
+            # Un cache se reconstruit : les réponses en clair sont simplement retirées
+            with self.pool.write() as conn:
+                conn.execute("DELETE FROM ai_cache WHERE typeof(value) = 'text'")
+        with self.pool.read() as conn:
+            self._total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+
+    def get(self, key):
+        """Valeur en cache, ou None (absente ou expirée)."""
+        now = time.time()
+        with self.pool.read() as conn:
+            row = conn.execute("SELECT value, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self.pool.write() as conn:
+            conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(self._cipher.decrypt(row[0], aad(key)))
+
+    def put(self, key, value):
+        raw = self._cipher.encrypt(json.dumps(value, ensure_ascii=False), aad(key))
+        now = time.time()
+        with self.pool.write() as conn:
+            old = conn.execute("SELECT size FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, size, created_at, accessed_at) VALUES (?,?,?,?,?)",
+                (key, raw, len(raw), now, now),
+            )
+        with self._lock:
+            self._total += len(raw) - (old[0] if old else 0)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """Supprime les entrées expirées puis les moins récemment lues."""
+        target = int(self.max_bytes * 0.9)
+        with self.pool.write() as conn:
+            conn.execute("DELETE FROM ai_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+            if total > target:
+                freed = 0
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM ai_cache ORDER BY accessed_at"):
+                    if total - freed <= target:
+                        break
+                    victims.append((key,))
+                    freed += size
+                conn.executemany("DELETE FROM ai_cache WHERE key = ?", victims)
+                total -= freed
+        with self._lock:
+            self._total = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._total,
+            }
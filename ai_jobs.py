@@ -0,0 +1,243 @@
+# ai_jobs.py
+"""File persistante de tâches IA, traitée par un pool de workers.
+
+Les appels au modèle (sentiment, résumé, analyse de conversation) sont
+enregistrés dans la table ``ai_jobs`` puis exécutés en arrière-plan : l'envoi
+d'un message rend la main dès l'écriture locale.
+
+Plusieurs processus peuvent partager la table : une tâche prise est louée
+(``owner``, ``lease_until``) et le bail est renouvelé tant que son worker
+vit. Seuls les baux expirés (processus arrêté) sont repris par les autres.
+Une tâche en échec est retentée après un délai exponentiel (``not_before``),
+et les tâches terminées sont purgées au bout de ``JOB_RETENTION``.
+
+Les charges utiles ne portent que des identifiants (message, participants),
+jamais le texte des messages ; les résultats, tirés des conversations, sont
+chiffrés comme les analyses (voir crypto.py).
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from crypto import aad, get_keyring
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    not_before REAL NOT NULL DEFAULT 0
+);
+"""
+# Colonnes absentes des tables créées avant les baux
+ADDED_COLUMNS = {"owner": "TEXT", "lease_until": "REAL", "not_before": "REAL NOT NULL DEFAULT 0"}
+INDEXES = """
+DROP INDEX IF EXISTS idx_ai_jobs_status;
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_ready ON ai_jobs (status, not_before);
+"""
+
+JOB_WORKERS = 2
+MAX_ATTEMPTS = 3
+# Délai maximal avant de revérifier la table (tâches ajoutées par un autre processus)
+POLL_INTERVAL = 5.0
+# Durée d'un bail ; renouvelé toutes les LEASE_SECONDS / 3 par le processus vivant
+LEASE_SECONDS = 60.0
+# Premier délai avant nouvel essai, doublé à chaque échec
+RETRY_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+# Conservation des tâches terminées (done / failed) avant purge
+JOB_RETENTION = timedelta(days=7)
+
+
+class JobQueue:
+    """Tâches ``kind`` -> ``handlers[kind](payload)``, résultat passé à ``on_result``."""
+
+    def __init__(self, pool, handlers, on_result, workers=JOB_WORKERS, max_attempts=MAX_ATTEMPTS,
+                 lease=LEASE_SECONDS, retry_delay=RETRY_DELAY, retry_max_delay=RETRY_MAX_DELAY, keyring=None):
+        self.pool = pool
+        self._cipher = (keyring if keyring is not None else get_keyring()).cipher("jobs")
+        self.handlers = handlers
+        self.on_result = on_result
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        # Propriétaire des baux : unique par instance, même entre processus
+        self.owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._wakeup = threading.Event()
+        with pool.exclusive() as conn:
+            conn.executescript(SCHEMA)
+            existing = {r[1] for r in conn.execute("PRAGMA table_info(ai_jobs)")}
+            for column, decl in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE ai_jobs ADD COLUMN {column} {decl}")
+            conn.executescript(INDEXES)
+        self._migrate()
+        # Les tâches 'running' d'un processus vivant restent à lui : pas de remise à zéro
+        self.purge()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ai-job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        if workers:
+            self._threads.append(threading.Thread(target=self._heartbeat, name="ai-job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _migrate(self):
+        # Tâches écrites par les versions précédentes : texte du message retiré
+        # des tâches de sentiment (relu par identifiant), résultats en clair chiffrés
+        with self.pool.write() as conn:
+            conn.execute(
+                "UPDATE ai_jobs SET payload = json_remove(payload, '$.text') "
+                "WHERE kind = 'sentiment' AND json_extract(payload, '$.text') IS NOT NULL"
+            )
+            if self._cipher.enabled:
+                rows = conn.execute("SELECT id, result FROM ai_jobs WHERE typeof(result) = 'text'").fetchall()
+                conn.executemany(
+                    "UPDATE ai_jobs SET result = ? WHERE id = ?",
+                    [(self._cipher.encrypt(result, _job_aad(job_id)), job_id) for job_id, result in rows],
+                )
+
+    def enqueue(self, kind, payload):
+        """Ajoute une tâche et renvoie son identifiant."""
+        with self.pool.write() as conn:
+            cur = conn.execute(
+                "INSERT INTO ai_jobs (kind, payload, created_at, updated_at) VALUES (?,?,?,?)",
+                (kind, json.dumps(payload, ensure_ascii=False), _now(), _now()),
+            )
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def get(self, job_id):
+        """État d'une tâche : dict avec status, result (décodé) et error."""
+        with self.pool.read() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, result, error FROM ai_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {"id": row[0], "kind": row[1], "status": row[2], "result": None, "error": row[4]}
+        if row[3] is not None:
+            job["result"] = json.loads(self._cipher.decrypt(row[3], _job_aad(row[0])))
+        return job
+
+    def pending_count(self):
+        with self.pool.read() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM ai_jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+
+    def purge(self, retention=JOB_RETENTION):
+        """Supprime les tâches terminées depuis plus de ``retention`` ; renvoie leur nombre."""
+        with self.pool.write() as conn:
+            return conn.execute(
+                "DELETE FROM ai_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                ((datetime.now() - retention).isoformat(),),
+            ).rowcount
+
+    # ------------------------------
+    # Workers
+    # ------------------------------
+    def _claim(self):
+        """Prend la prochaine tâche prête, ou dont le bail a expiré."""
+        with self.pool.write() as conn:
+            while True:
+                now = time.time()
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM ai_jobs"
+                    " WHERE (status = 'pending' AND not_before <= ?) OR (status = 'running' AND lease_until < ?)"
+                    " ORDER BY id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[3] < self.max_attempts:
+                    break
+                # Bail expiré sur le dernier essai : le processus est mort en la traitant
+                conn.execute(
+                    "UPDATE ai_jobs SET status = 'failed', error = ?, owner = NULL, updated_at = ? WHERE id = ?",
+                    ("Tâche interrompue (bail expiré)", _now(), row[0]),
+                )
+            conn.execute(
+                "UPDATE ai_jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?,"
+                " updated_at = ? WHERE id = ?",
+                (self.owner, now + self.lease, _now(), row[0]),
+            )
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _finish(self, job_id, status, result=None, error=None, not_before=0):
+        # Bail repris entre-temps par un autre processus : son résultat fait foi
+        if result is not None:
+            result = self._cipher.encrypt(json.dumps(result, ensure_ascii=False), _job_aad(job_id))
+        with self.pool.write() as conn:
+            conn.execute(
+                "UPDATE ai_jobs SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL,"
+                " not_before = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (status, result, error, not_before, _now(), job_id, self.owner),
+            )
+
+    def _retry_at(self, attempts):
+        return time.time() + min(self.retry_max_delay, self.retry_delay * 2 ** (attempts - 1))
+
+    def _run(self, job):
+        try:
+            result = self.handlers[job["kind"]](job["payload"])
+            self.on_result(job, result)
+        except Exception as e:
+            if job["attempts"] < self.max_attempts:
+                self._finish(job["id"], "pending", error=str(e), not_before=self._retry_at(job["attempts"]))
+            else:
+                self._finish(job["id"], "failed", error=str(e))
+        else:
+            self._finish(job["id"], "done", result=result)
+
+    def _idle_timeout(self):
+        # Réveil à l'échéance du prochain nouvel essai, au plus tard après POLL_INTERVAL
+        with self.pool.read() as conn:
+            ready = conn.execute(
+                "SELECT MIN(not_before) FROM ai_jobs WHERE status = 'pending'"
+            ).fetchone()[0]
+        if ready is None:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0.0, ready - time.time()))
+
+    def _work(self):
+        while True:
+            # Effacé avant la recherche : un ajout concurrent ne peut pas être manqué
+            self._wakeup.clear()
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self._idle_timeout())
+                continue
+            self._run(job)
+
+    def _heartbeat(self):
+        """Renouvelle les baux des tâches en cours de ce processus ; purge au passage."""
+        while True:
+            time.sleep(self.lease / 3)
+            with self.pool.write() as conn:
+                conn.execute(
+                    "UPDATE ai_jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                    (time.time() + self.lease, self.owner),
+                )
+            self.purge()
+
+
+def _job_aad(job_id):
+    return aad("ai_jobs", job_id)
+
+
+def _now():
+    return datetime.now().isoformat()
@@ -1,17 +1,80 @@
 # ai_service.py
 import os
 import json
-import openai
+import logging
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+from ai_cache import cache_key
+from llm import get_client
+
+logger = logging.getLogger(__name__)
+
+def sentiment_verdict(label):
+    """Verdict affichable à partir de la réponse brute du modèle."""
+    label = label.lower()
+    if "positif" in label:
+        return {"sentiment": "positif", "emoji": "😊", "color": "#11998e"}
+    elif "négatif" in label:
+        return {"sentiment": "négatif", "emoji": "😔", "color": "#eb3349"}
+    else:
+        return {"sentiment": "neutre", "emoji": "😐", "color": "#667eea"}
 
 class AIService:
     """Service d'analyse IA"""
 
-    def __init__(self, api_key=None):
-        self.api_key = api_key or OPENAI_API_KEY
-        if self.api_key:
-            openai.api_key = self.api_key
+    def __init__(self, cache=None, llm=None):
+        self.cache = cache
+        # Client partagé du processus (fournisseur selon LLM_PROVIDER / clés API)
+        self.llm = llm if llm is not None else get_client()
+        # AI_ANALYSIS_ENABLED=false coupe l'IA sans retirer la clé
+        self.enabled = self.llm is not None and os.getenv("AI_ANALYSIS_ENABLED", "true").lower() == "true"
+
+    def _model(self, kind):
+        return self.llm.models[kind]
+
+    def _chat(self, operation, kind, messages, max_tokens):
+        """Appel au modèle, servi par le cache si la même requête a déjà abouti.
+
+        Les erreurs ne sont jamais mises en cache : elles remontent à l'appelant.
+        """
+        model = self._model(kind)
+
+        def compute():
+            return self.llm.complete(model, messages, max_tokens)
+
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(self._cache_key(operation, model, messages), compute)
+
+    def _chat_stream(self, operation, kind, messages, max_tokens, cancel=None):
+        """Variante de ``_chat`` qui produit le texte au fil des tokens.
+
+        ``cancel`` (threading.Event) interrompt la génération ; fermer le
+        générateur ferme aussi la connexion HTTP. Seule une réponse complète
+        est mise en cache.
+        """
+        model = self._model(kind)
+        key = self._cache_key(operation, model, messages) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            yield cached
+            return
+
+        stream = self.llm.stream(model, messages, max_tokens)
+        parts = []
+        try:
+            for part in stream:
+                if cancel is not None and cancel.is_set():
+                    return
+                parts.append(part)
+                yield part
+        finally:
+            stream.close()
+        if key:
+            self.cache.put(key, "".join(parts))
+
+    def _cache_key(self, operation, model, messages):
+        prompt = [m["content"] for m in messages[:-1]]
+        return cache_key(operation, model, prompt, messages[-1]["content"])
 
     def _mock_analysis(self):
         return {
@@ -28,9 +91,23 @@ class AIService:
         }
 
     def analyze_conversation(self, conversation_text: str, contact_name: str):
-        if not conversation_text.strip() or not self.api_key:
+        """Analyse pour l'interface : analyse fictive si l'IA est indisponible ou en erreur."""
+        if not conversation_text.strip() or not self.enabled:
+            return self._mock_analysis()
+
+        try:
+            return self.conversation_analysis(conversation_text, contact_name)
+        except Exception as e:
+            logger.warning("Erreur API IA, analyse fictive renvoyée : %s", e)
             return self._mock_analysis()
 
+    def conversation_analysis(self, conversation_text, contact_name):
+        """Analyse structurée de la conversation ; lève l'erreur de l'API (tâches en file)."""
+        if not self.enabled:
+            raise RuntimeError("IA non disponible")
+        if not conversation_text.strip():
+            raise ValueError("Aucun message à analyser")
+
         prompt = f"""
 Analyse cette conversation professionnelle avec {contact_name}.
 
@@ -51,18 +128,136 @@ Fournis une analyse structurée en JSON avec:
 
 Réponds uniquement en JSON.
 """
+        content = self._chat(
+            "analyze_conversation", "analysis", [{"role": "user", "content": prompt}], 1500
+        ).strip()
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        return json.loads(content)
+
+    def analyze_sentiment(self, text):
+        """Verdict pour l'interface : "erreur" affichable si l'API échoue."""
+        if not self.enabled:
+            return {"sentiment": "neutral", "emoji": "😐", "color": "#667eea"}
+
+        try:
+            return self.sentiment(text)
+        except Exception as e:
+            return {"sentiment": "erreur", "emoji": "⚠️", "color": "#ffa500", "error": str(e)}
+
+    def sentiment(self, text):
+        """Verdict de sentiment ; lève l'erreur de l'API (tâches en file)."""
+        if not self.enabled:
+            raise RuntimeError("IA non disponible")
+        result = self._chat(
+            "analyze_sentiment", "chat",
+            [
+                {"role": "system", "content": "Tu es un expert en analyse de sentiment. Réponds uniquement avec: 'positif', 'négatif' ou 'neutre'."},
+                {"role": "user", "content": f"Analyse le sentiment de ce message: {text}"}
+            ],
+            50
+        )
+        return sentiment_verdict(result)
+
+    def analyze_sentiment_batch(self, items):
+        """Sentiment de plusieurs messages en une seule requête.
+
+        ``items`` est une liste de dicts {"id", "text"} ; renvoie {id: verdict}.
+        Les ids absents de la réponse sont omis. Lève l'erreur de l'API.
+        """
+        payload = json.dumps({str(item["id"]): item["text"] for item in items}, ensure_ascii=False)
+        content = self._chat(
+            "analyze_sentiment_batch", "chat",
+            [
+                {"role": "system", "content": "Tu es un expert en analyse de sentiment. Pour chaque message du JSON fourni, réponds uniquement par un objet JSON associant son id à 'positif', 'négatif' ou 'neutre'."},
+                {"role": "user", "content": payload}
+            ],
+            12 * len(items) + 20
+        ).strip()
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        labels = json.loads(content)
+        return {
+            item["id"]: sentiment_verdict(str(labels[str(item["id"])]))
+            for item in items if str(item["id"]) in labels
+        }
+
+    def _suggest_messages(self, conversation_history):
+        messages_text = "\n".join([f"{m['sender']}: {m['text']}" for m in conversation_history[-5:]])
+        return [
+            {"role": "system", "content": "Tu es un assistant qui suggère des réponses amicales et professionnelles."},
+            {"role": "user", "content": f"Basé sur cette conversation, suggère une réponse appropriée:\n\n{messages_text}"}
+        ]
+
+    def _fold_messages(self, previous_summary, messages):
+        messages_text = "\n".join([f"{m['sender']}: {m['text']}" for m in messages])
+        if previous_summary:
+            request = (
+                f"Voici le résumé d'une conversation:\n{previous_summary}\n\n"
+                f"Mets-le à jour en 2-3 phrases avec ces nouveaux messages:\n\n{messages_text}"
+            )
+        else:
+            request = f"Résume cette conversation en 2-3 phrases:\n\n{messages_text}"
+        return [
+            {"role": "system", "content": "Tu résumes des conversations de manière concise et claire."},
+            {"role": "user", "content": request}
+        ]
+
+    def _merge_messages(self, summaries):
+        parts = "\n\n".join(f"Partie {i}: {summary}" for i, summary in enumerate(summaries, start=1))
+        return [
+            {"role": "system", "content": "Tu résumes des conversations de manière concise et claire."},
+            {"role": "user", "content": f"Fusionne ces résumés successifs d'une même conversation en 2-3 phrases:\n\n{parts}"}
+        ]
+
+    def suggest_response(self, conversation_history):
+        if not self.enabled:
+            return "IA non disponible. Ajoutez une clé API (OPENAI_API_KEY ou ANTHROPIC_API_KEY)."
+
+        try:
+            return self._chat("suggest_response", "chat", self._suggest_messages(conversation_history), 100)
+        except Exception as e:
+            return f"Erreur: {str(e)}"
+
+    def stream_suggest_response(self, conversation_history, cancel=None):
+        """Suggestion de réponse, token par token."""
+        if not self.enabled:
+            yield "IA non disponible. Ajoutez une clé API (OPENAI_API_KEY ou ANTHROPIC_API_KEY)."
+            return
+
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1500
+            yield from self._chat_stream(
+                "suggest_response", "chat", self._suggest_messages(conversation_history), 100, cancel
             )
-            content = response.choices[0].message.content.strip()
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            return json.loads(content)
         except Exception as e:
-            print(f"Erreur API OpenAI: {e}")
-            return self._mock_analysis()
\ No newline at end of file
+            yield f"Erreur: {str(e)}"
+
+    def summarize_conversation(self, messages):
+        if not self.enabled:
+            return "IA non disponible. Ajoutez une clé API (OPENAI_API_KEY ou ANTHROPIC_API_KEY)."
+
+        try:
+            return self.fold_summary(None, messages)
+        except Exception as e:
+            return f"Erreur: {str(e)}"
+
+    def fold_summary(self, previous_summary, messages):
+        """Résumé mis à jour avec ``messages`` ; lève l'erreur de l'API en cas d'échec."""
+        return self._chat("summarize_conversation", "chat", self._fold_messages(previous_summary, messages), 150)
+
+    def stream_fold_summary(self, previous_summary, messages, cancel=None):
+        """Comme ``fold_summary``, token par token."""
+        return self._chat_stream(
+            "summarize_conversation", "chat", self._fold_messages(previous_summary, messages), 150, cancel
+        )
+
+    def merge_summaries(self, summaries):
+        """Fusionne des résumés de portions successives d'une conversation."""
+        return self._chat("merge_summaries", "chat", self._merge_messages(summaries), 200)
+
+    def stream_merge_summaries(self, summaries, cancel=None):
+        return self._chat_stream("merge_summaries", "chat", self._merge_messages(summaries), 200, cancel)
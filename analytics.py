@@ -0,0 +1,143 @@
+# analytics.py
+"""Statistiques de communication calculées en colonnes (pandas).
+
+Les messages sont convertis une seule fois en colonnes (horodatages en
+datetime64) ; ceux arrivés depuis sont ajoutés par bloc à la lecture
+suivante. Les résultats sont mis en cache par utilisateur et seuls les
+utilisateurs concernés par une écriture sont recalculés.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+SENTIMENTS = ["positif", "neutre", "négatif"]
+DELAY_BINS = [0, 5, 60, 24 * 60, np.inf]
+DELAY_LABELS = ["< 5 min", "5 min – 1 h", "1 h – 1 jour", "> 1 jour"]
+
+
+class Analytics:
+    """Agrégations par utilisateur sur les colonnes des messages."""
+
+    def __init__(self, data, sentiments, contacts):
+        self._data = data
+        self._sentiments = sentiments
+        self._contacts = contacts
+        self._lock = threading.Lock()
+        self._frame = None
+        self._rows = 0
+        self._revisions = {}
+        self._results = {}
+
+    # ------------------------------
+    # Invalidation
+    # ------------------------------
+    def touch(self, *users):
+        with self._lock:
+            for user in users:
+                self._revisions[user] = self._revisions.get(user, 0) + 1
+
+    def sentiment_added(self, message_id):
+        # Un message encore absent des colonnes a déjà invalidé ses deux utilisateurs
+        with self._lock:
+            frame = self._frame
+        if frame is None or message_id not in frame.index:
+            return
+        row = frame.loc[message_id]
+        self.touch(row["sender"], row["receiver"])
+
+    # ------------------------------
+    # Colonnes
+    # ------------------------------
+    def _columns(self):
+        messages = self._data["messages"]
+        if self._rows < len(messages):
+            new = messages[self._rows:]
+            block = pd.DataFrame(
+                {
+                    "sender": [m["sender"] for m in new],
+                    "receiver": [m["receiver"] for m in new],
+                    "timestamp": pd.to_datetime([m["timestamp"] for m in new], format="ISO8601", errors="coerce"),
+                },
+                index=pd.Index([m.get("id") for m in new], name="id"),
+            )
+            self._frame = block if self._frame is None else pd.concat([self._frame, block])
+            self._rows += len(new)
+        return self._frame
+
+    def for_user(self, user):
+        """Statistiques de ``user`` (dict de DataFrame / Series), depuis le cache si à jour."""
+        with self._lock:
+            revision = self._revisions.get(user, 0)
+            cached = self._results.get(user)
+            if cached is not None and cached[0] == revision:
+                return cached[1]
+            frame = self._columns()
+        result = self._compute(user, frame)
+        with self._lock:
+            # Une écriture survenue pendant le calcul laisse l'entrée périmée
+            self._results[user] = (revision, result)
+        return result
+
+    # ------------------------------
+    # Agrégations
+    # ------------------------------
+    def _compute(self, user, frame):
+        if frame is None:
+            frame = pd.DataFrame(columns=["sender", "receiver", "timestamp"])
+        mine = frame[(frame["sender"] == user) | (frame["receiver"] == user)]
+        mine = mine[mine["timestamp"].notna()]
+        outgoing = mine["sender"] == user
+        other = mine["receiver"].where(outgoing, mine["sender"])
+        ts = pd.to_datetime(mine["timestamp"])
+        direction = pd.DataFrame({"Envoyés": outgoing.astype(int), "Reçus": (~outgoing).astype(int)})
+
+        per_day = direction.groupby(ts.dt.floor("D")).sum().rename_axis("jour")
+        per_hour = direction.groupby(ts.dt.hour).sum().reindex(range(24), fill_value=0)
+        per_hour.index.name = "heure"
+
+        return {
+            "per_day": per_day,
+            "per_hour": per_hour,
+            **self._response_times(other, ts, outgoing),
+            "sentiment": self._sentiment_over_time(mine.index, ts),
+            "domains": self._domains(user),
+        }
+
+    def _response_times(self, other, ts, outgoing):
+        """Délais (minutes) entre un message reçu et la réponse, dans chaque fil."""
+        conv = pd.DataFrame({"other": other, "ts": ts, "out": outgoing}).sort_values(["other", "ts"])
+        prev = conv.shift()
+        same = conv["other"] == prev["other"]
+        prev_out = prev["out"].fillna(False).astype(bool)
+        delay = (conv["ts"] - prev["ts"]).dt.total_seconds() / 60
+        mine = same & conv["out"] & ~prev_out
+        theirs = same & ~conv["out"] & prev_out
+
+        by_contact = pd.DataFrame({
+            "Mon délai médian (min)": delay[mine].groupby(conv["other"][mine]).median(),
+            "Son délai médian (min)": delay[theirs].groupby(conv["other"][theirs]).median(),
+            "Mes réponses": mine.groupby(conv["other"]).sum(),
+        }).round(1).rename_axis("contact")
+        distribution = (
+            pd.cut(delay[mine], bins=DELAY_BINS, labels=DELAY_LABELS, include_lowest=True)
+            .value_counts(sort=False)
+            .rename("Mes réponses")
+            .rename_axis("délai")
+        )
+        return {"response_times": by_contact, "response_distribution": distribution}
+
+    def _sentiment_over_time(self, ids, ts):
+        labels = pd.Series(
+            [(self._sentiments.get(i) or {}).get("sentiment") for i in ids], index=ts.index, dtype="object"
+        )
+        known = labels.isin(SENTIMENTS)
+        if not known.any():
+            return pd.DataFrame(columns=SENTIMENTS)
+        weeks = ts[known].dt.to_period("W").dt.start_time
+        counts = pd.crosstab(weeks, labels[known]).reindex(columns=SENTIMENTS, fill_value=0)
+        return counts.rename_axis(index="semaine", columns=None)
+
+    def _domains(self, user):
+        domains = [c.get("domain") or "Non renseigné" for c in self._contacts.of(user)]
+        return pd.Series(domains, dtype="object").value_counts().rename("Contacts").rename_axis("domaine")
@@ -1,8 +1,9 @@
 # auth.py
 import json
-import hashlib
 from pathlib import Path
 
+from credentials import get_credentials
+
 USERS_FILE = Path("users.json")
 
 def load_users():
@@ -14,7 +15,7 @@ def save_users(users):
     USERS_FILE.write_text(json.dumps(users, indent=2))
 
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    return get_credentials().hash(password)
 
 def register(username, password):
     users = load_users()
@@ -28,6 +29,10 @@ def register(username, password):
 
 def login(username, password):
     users = load_users()
-    if username not in users:
-        return False
-    return users[username]["password"] == hash_password(password)
\ No newline at end of file
+    user = users.get(username)
+    ok, new_hash = get_credentials().verify(password, user["password"] if user else None, legacy="sha256")
+    # Ancienne empreinte SHA-256 : remplacée par scrypt dès la première connexion
+    if ok and new_hash:
+        user["password"] = new_hash
+        save_users(users)
+    return ok
\ No newline at end of file
@@ -0,0 +1,137 @@
+# backfill_sentiment.py
+"""Calcule (ou recalcule) le sentiment de l'historique des messages.
+
+Les messages sont envoyés au modèle par lots (une requête par lot), avec
+au plus ``--concurrency`` requêtes en vol. Un fichier de reprise mémorise
+le dernier identifiant dont tous les lots précédents sont terminés : une
+exécution interrompue reprend là où elle s'était arrêtée.
+
+    python backfill_sentiment.py --batch-size 50 --concurrency 4
+    python backfill_sentiment.py --rescore --restart
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from ai_cache import ResultCache
+from ai_service import AIService
+from store import DATA_DB, Store
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+BATCH_SIZE = 50
+CONCURRENCY = 4
+RETRIES = 3
+CHECKPOINT_FILE = "sentiment_backfill.json"
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["last_id"]
+    return -1
+
+
+def save_checkpoint(path, last_id):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id, "updated_at": datetime.now().isoformat()}, f)
+    os.replace(tmp, path)
+
+
+def score_batch(ai, items):
+    """Analyses à enregistrer pour un lot, avec quelques nouvelles tentatives."""
+    if not items:
+        return []
+    for attempt in range(RETRIES):
+        try:
+            verdicts = ai.analyze_sentiment_batch(items)
+            break
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+    now = str(datetime.now())
+    return [
+        {"message_id": message_id, "sentiment": verdict, "timestamp": now}
+        for message_id, verdict in verdicts.items()
+    ]
+
+
+def backfill(store, ai, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, rescore=False,
+             checkpoint=CHECKPOINT_FILE, restart=False):
+    last_id = -1 if restart else load_checkpoint(checkpoint)
+    # Sans --rescore, les messages déjà analysés (y compris par une exécution
+    # interrompue après le dernier point de reprise) sont ignorés
+    skip = set() if rescore else store.sentiment_message_ids()
+    cursor = last_id
+    in_flight = {}
+    order = deque()
+    finished = set()
+    scored = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            while len(in_flight) < concurrency:
+                page = store.messages_after(cursor, batch_size)
+                if not page:
+                    break
+                cursor = page[-1]["id"]
+                items = [m for m in page if m["id"] not in skip]
+                in_flight[executor.submit(score_batch, ai, items)] = cursor
+                order.append(cursor)
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                end = in_flight.pop(future)
+                analyses = future.result()
+                if analyses and rescore:
+                    # L'analyse précédente est remplacée, pas doublée
+                    store.replace_sentiments(analyses)
+                elif analyses:
+                    store.add_analyses(analyses)
+                scored += len(analyses)
+                finished.add(end)
+
+            # Le point de reprise n'avance que sur une suite continue de lots terminés
+            while order and order[0] in finished:
+                last_id = order.popleft()
+                finished.discard(last_id)
+                save_checkpoint(checkpoint, last_id)
+            print(f"… {scored} messages analysés (reprise après id {last_id})")
+
+    return scored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse de sentiment de l'historique")
+    parser.add_argument("--db", default=DATA_DB)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rescore", action="store_true", help="Réanalyser aussi les messages déjà analysés")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="Ignorer le point de reprise existant")
+    args = parser.parse_args(argv)
+
+    ai = AIService(cache=ResultCache())
+    if not ai.enabled:
+        parser.exit(1, "❌ IA non disponible. Ajoutez une clé API (OPENAI_API_KEY ou ANTHROPIC_API_KEY) ou choisissez LLM_PROVIDER=mock.\n")
+
+    scored = backfill(
+        Store(args.db), ai, args.batch_size, args.concurrency, args.rescore, args.checkpoint, args.restart
+    )
+    print(f"✅ {scored} messages analysés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+# backup.py
+"""Sauvegardes à chaud, incrémentales, et restauration à une date donnée.
+
+Bases SQLite (data.db, collabo.db) :
+
+- instantané complet par l'API de sauvegarde de SQLite, cohérent même si
+  l'application écrit pendant la copie, puis compressé (gzip) ;
+- des déclencheurs notent dans ``change_log`` chaque ligne insérée, modifiée
+  ou supprimée ; une sauvegarde incrémentale n'exporte que ces lignes (leur
+  état courant, lu dans une seule transaction) puis vide le journal. Son coût
+  dépend du nombre de modifications, pas de la taille de la base.
+
+Fichiers JSON (journal de messages, users.json, data.json) : d'un segment
+du journal qui a grandi, seule la suite depuis la sauvegarde précédente est
+copiée, arrêtée à la dernière ligne complète. Le manifeste garde l'inode du
+segment et l'empreinte de la partie déjà sauvegardée : un segment réécrit
+(``crypto.py encrypt``, compactage) est recopié en entier. Les autres
+fichiers sont recopiés s'ils ont changé. Un manifeste par sauvegarde
+indique les morceaux qui reconstituent chaque fichier, sous un chemin
+relatif au dossier courant (un fichier hors de ce dossier perd sa racine,
+comme avec tar) : la restauration n'écrit jamais hors du dossier cible.
+
+``restore --to <date>`` reconstruit dans un dossier à part l'état de la
+dernière sauvegarde antérieure à cette date : instantané complet puis
+sauvegardes incrémentales, dans l'ordre.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+
+from data_access import BUSY_TIMEOUT, DB_FILE
+from store import DATA_DB
+
+BACKUP_DIR = Path(os.getenv("COLLABO_BACKUP_DIR", "backups"))
+DATABASES = (DATA_DB, DB_FILE)
+FILES = (os.getenv("MESSAGES_LOG_DIR", "messages_log"), "users.json", "data.json")
+APPEND_ONLY_SUFFIX = ".jsonl"
+TS_FORMAT = "%Y%m%dT%H%M%S%fZ"
+ROW_BATCH = 500
+READ_BLOCK = 1 << 20
+# Tables non sauvegardées : journal des modifications et événements éphémères
+SKIP_TABLES = {"change_log", "pubsub_events"}
+
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    row_id INTEGER NOT NULL
+);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime(TS_FORMAT)
+
+
+def _parse_ts(value):
+    return datetime.strptime(value, TS_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+    return conn
+
+
+def _write_atomic(path, write):
+    # Fichier temporaire puis renommage : une sauvegarde interrompue ne laisse rien de lisible
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+# ------------------------------
+# Suivi des modifications (déclencheurs)
+# ------------------------------
+def _tables(conn):
+    return [
+        name for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'")
+        if name not in SKIP_TABLES and not name.startswith("sqlite_") and "WITHOUT ROWID" not in sql.upper()
+    ]
+
+
+def install_tracking(conn):
+    """Crée ``change_log`` et les déclencheurs manquants ; renvoie le nombre de tables nouvellement suivies."""
+    conn.executescript(CHANGE_LOG_SCHEMA)
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    added = 0
+    for table in _tables(conn):
+        if f"backup_{table}_delete" in existing:
+            continue
+        conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS "backup_{table}_insert" AFTER INSERT ON "{table}"
+            BEGIN INSERT INTO change_log (tbl, row_id) VALUES ('{table}', NEW.rowid); END;
+            CREATE TRIGGER IF NOT EXISTS "backup_{table}_update" AFTER UPDATE ON "{table}"
+            BEGIN INSERT INTO change_log (tbl, row_id) VALUES ('{table}', NEW.rowid); END;
+            CREATE TRIGGER IF NOT EXISTS "backup_{table}_delete" AFTER DELETE ON "{table}"
+            BEGIN INSERT INTO change_log (tbl, row_id) VALUES ('{table}', OLD.rowid); END;
+        """)
+        added += 1
+    return added
+
+
+def remove_tracking(conn):
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'backup\\_%' ESCAPE '\\'").fetchall():
+        conn.execute(f'DROP TRIGGER "{name}"')
+    conn.execute("DROP TABLE IF EXISTS change_log")
+
+
+def _current_seq(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def _prune(conn, seq):
+    conn.execute("DELETE FROM change_log WHERE seq <= ?", (seq,))
+
+
+# ------------------------------
+# Sauvegarde des bases
+# ------------------------------
+def _encode(value):
+    return {"$b": base64.b64encode(value).decode("ascii")} if isinstance(value, bytes) else value
+
+
+def _decode(value):
+    return base64.b64decode(value["$b"]) if isinstance(value, dict) else value
+
+
+def _db_backups(dest, name):
+    """(horodatage, type, début, fin, chemin) des sauvegardes d'une base, dans l'ordre."""
+    backups = []
+    for path in (dest / "db" / name).glob("*.gz"):
+        ts, kind, seqs = path.name.split(".")[:3]
+        first, _, last = seqs.partition("-")
+        backups.append((ts, kind, int(first), int(last or first), path))
+    return sorted(backups)
+
+
+def snapshot_db(db_path, dest, ts):
+    """Instantané complet de ``db_path`` (API de sauvegarde SQLite)."""
+    name = Path(db_path).name
+    folder = dest / "db" / name
+    folder.mkdir(parents=True, exist_ok=True)
+    tmp = folder / f"{ts}.copy"
+    src, copy = _connect(db_path), sqlite3.connect(tmp)
+    try:
+        src.backup(copy)
+        seq = _current_seq(copy)
+    finally:
+        copy.close()
+    target = folder / f"{ts}.full.{seq}.db.gz"
+    try:
+        with open(tmp, "rb") as f:
+            _write_atomic(target, lambda out: shutil.copyfileobj(f, out))
+        _prune(src, seq)
+    finally:
+        src.close()
+        tmp.unlink()
+    return target
+
+
+def delta_db(db_path, dest, ts, since):
+    """Lignes modifiées depuis la modification ``since`` ; None si rien n'a changé."""
+    name = Path(db_path).name
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN")
+        try:
+            seq = _current_seq(conn)
+            if seq == since:
+                return None
+            changed = {}
+            for table, row_id in conn.execute("SELECT DISTINCT tbl, row_id FROM change_log WHERE seq > ? AND seq <= ?", (since, seq)):
+                changed.setdefault(table, []).append(row_id)
+            target = dest / "db" / name / f"{ts}.delta.{since}-{seq}.jsonl.gz"
+
+            def write(out):
+                for table, ids in changed.items():
+                    for start in range(0, len(ids), ROW_BATCH):
+                        batch = ids[start:start + ROW_BATCH]
+                        cur = conn.execute(
+                            f'SELECT rowid, * FROM "{table}" WHERE rowid IN ({",".join("?" * len(batch))})', batch
+                        )
+                        columns = [d[0] for d in cur.description][1:]
+                        found = set()
+                        for row in cur:
+                            found.add(row[0])
+                            record = {"t": table, "r": row[0], "v": dict(zip(columns, map(_encode, row[1:])))}
+                            out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                        for row_id in set(batch) - found:
+                            out.write((json.dumps({"t": table, "r": row_id}) + "\n").encode("utf-8"))
+
+            _write_atomic(target, write)
+        finally:
+            conn.commit()
+        _prune(conn, seq)
+    finally:
+        conn.close()
+    return target
+
+
+def backup_db(db_path, dest, ts, full=False):
+    """Sauvegarde incrémentale, ou complète s'il n'y a pas encore de point de départ."""
+    conn = _connect(db_path)
+    try:
+        # Une table nouvellement suivie n'a pas d'historique : il faut un instantané
+        full = install_tracking(conn) > 0 or full
+    finally:
+        conn.close()
+    backups = _db_backups(dest, Path(db_path).name)
+    if full or not backups:
+        return snapshot_db(db_path, dest, ts)
+    return delta_db(db_path, dest, ts, backups[-1][3])
+
+
+def _apply_delta(conn, path):
+    upserts = []
+    conn.execute("BEGIN")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        # Suppressions d'abord : une ligne recréée sous un autre rowid ne doit pas disparaître
+        for line in f:
+            record = json.loads(line)
+            if "v" in record:
+                upserts.append(line)
+            else:
+                conn.execute(f'DELETE FROM "{record["t"]}" WHERE rowid = ?', (record["r"],))
+    for line in upserts:
+        record = json.loads(line)
+        columns = list(record["v"])
+        conn.execute(
+            f'INSERT OR REPLACE INTO "{record["t"]}" (rowid, {", ".join(f"[{c}]" for c in columns)}) '
+            f'VALUES (?{", ?" * len(columns)})',
+            (record["r"], *(_decode(v) for v in record["v"].values())),
+        )
+    conn.commit()
+
+
+def restore_db(name, dest, until, output):
+    """Reconstruit la base ``name`` telle qu'à ``until`` dans ``output`` ; renvoie les sauvegardes appliquées."""
+    backups = [b for b in _db_backups(dest, name) if _parse_ts(b[0]) <= until]
+    fulls = [i for i, b in enumerate(backups) if b[1] == "full"]
+    if not fulls:
+        return []
+    chain = [backups[fulls[-1]]]
+    for backup in backups[fulls[-1] + 1:]:
+        if backup[2] != chain[-1][3]:
+            raise RuntimeError(f"Sauvegarde incrémentale manquante avant {backup[4].name}")
+        chain.append(backup)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(chain[0][4], "rb") as f, open(output, "wb") as out:
+        shutil.copyfileobj(f, out)
+    conn = _connect(output)
+    try:
+        # Le suivi reprendra avec un nouvel instantané si la base restaurée est remise en service
+        remove_tracking(conn)
+        for backup in chain[1:]:
+            _apply_delta(conn, backup[4])
+    finally:
+        conn.close()
+    return chain
+
+
+# ------------------------------
+# Sauvegarde des fichiers
+# ------------------------------
+def _tracked_files(paths):
+    for root in map(Path, paths):
+        if root.is_dir():
+            yield from sorted(p for p in root.rglob("*") if p.is_file())
+        elif root.is_file():
+            yield root
+
+
+def _manifests(dest):
+    return sorted((dest / "files").glob("*.manifest.json"))
+
+
+def _file_key(path):
+    # Chemin relatif au dossier courant ; hors de celui-ci, chemin absolu sans sa racine
+    path = path.resolve()
+    try:
+        return path.relative_to(Path.cwd().resolve()).as_posix()
+    except ValueError:
+        return PurePosixPath(*path.parts[1:]).as_posix()
+
+
+def _check_key(key):
+    # Un manifeste modifié (ou d'une ancienne version) ne doit pas faire écrire hors de la cible
+    path = PurePosixPath(key)
+    if not path.parts or path.is_absolute() or ".." in path.parts or "\\" in key or ":" in key:
+        raise ValueError(f"Chemin refusé dans le manifeste : {key!r}")
+
+
+def _read_segment(f, entry, stat):
+    """(début, données, empreinte) de ce qu'il faut copier d'un segment du journal.
+
+    La partie déjà sauvegardée n'est reprise que si le segment est le même
+    fichier et qu'elle n'a pas changé ; sinon tout le segment est copié.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    start = 0
+    if (
+        entry is not None and entry.get("prefix") and entry.get("inode") == stat.st_ino
+        and entry["size"] <= stat.st_size
+    ):
+        remaining = entry["size"]
+        while remaining:
+            block = f.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+        if digest.hexdigest() == entry["prefix"]:
+            start = entry["size"]
+        else:
+            f.seek(0)
+            digest = hashlib.blake2b(digest_size=16)
+    data = f.read(stat.st_size - start)
+    # Ligne en cours d'écriture : elle sera copiée la prochaine fois
+    data = data[:data.rfind(b"\n") + 1]
+    digest.update(data)
+    return start, data, digest.hexdigest()
+
+
+def backup_files(paths, dest, ts):
+    """Copie ce qui a changé depuis le manifeste précédent ; None si rien n'a changé."""
+    previous = _manifests(dest)
+    files = json.loads(previous[-1].read_text()) if previous else {}
+    manifest, pieces, changed = {}, dest / "files" / ts, False
+    for path in _tracked_files(paths):
+        key = _file_key(path)
+        stat = path.stat()
+        entry = files.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            manifest[key] = entry
+            continue
+        extra = {}
+        with open(path, "rb") as f:
+            if key.endswith(APPEND_ONLY_SUFFIX):
+                # Segment du journal : seule la suite est copiée, s'il a seulement grandi
+                start, data, prefix = _read_segment(f, entry, stat)
+                extra = {"inode": stat.st_ino, "prefix": prefix}
+            else:
+                start, data = 0, f.read()
+        size = start + len(data)
+        parts = list(entry["pieces"]) if start else []
+        if data:
+            pieces.mkdir(parents=True, exist_ok=True)
+            piece = pieces / f"{len(os.listdir(pieces)):06d}.gz"
+            _write_atomic(piece, lambda out: out.write(data))
+            parts.append(piece.relative_to(dest).as_posix())
+        manifest[key] = {
+            "size": size, "mtime_ns": stat.st_mtime_ns if size == stat.st_size else 0, "pieces": parts, **extra,
+        }
+        changed = True
+    if not changed and manifest.keys() == files.keys():
+        return None
+    target = dest / "files" / f"{ts}.manifest.json"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, target)
+    return target
+
+
+def restore_files(dest, until, output):
+    manifests = [m for m in _manifests(dest) if _parse_ts(m.name.split(".")[0]) <= until]
+    if not manifests:
+        return None
+    entries = json.loads(manifests[-1].read_text())
+    # Tout le manifeste est vérifié avant la première écriture
+    for key, entry in entries.items():
+        _check_key(key)
+        for piece in entry["pieces"]:
+            _check_key(piece)
+    for key, entry in entries.items():
+        target = output / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "wb") as out:
+            for piece in entry["pieces"]:
+                with gzip.open(dest / piece, "rb") as f:
+                    shutil.copyfileobj(f, out)
+    return manifests[-1]
+
+
+# ------------------------------
+# Ligne de commande
+# ------------------------------
+def _size(path):
+    return f"{path.stat().st_size / 1024:.1f} Kio"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sauvegarde et restauration de Collabo")
+    parser.add_argument("--dest", type=Path, default=BACKUP_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    bk = sub.add_parser("backup", help="Sauvegarde incrémentale (complète la première fois)")
+    bk.add_argument("--full", action="store_true", help="forcer un instantané complet des bases")
+    rs = sub.add_parser("restore", help="Restaurer l'état à une date dans un dossier")
+    rs.add_argument("--to", help="date ISO (heure locale) ; dernière sauvegarde par défaut")
+    rs.add_argument("--output", type=Path)
+    sub.add_parser("list", help="Lister les sauvegardes")
+    args = parser.parse_args(argv)
+
+    if args.command == "backup":
+        ts = _now()
+        for db_path in DATABASES:
+            if not os.path.exists(db_path):
+                continue
+            result = backup_db(db_path, args.dest, ts, args.full)
+            print(f"💾 {db_path} : " + (f"{result.name} ({_size(result)})" if result else "aucune modification"))
+        result = backup_files(FILES, args.dest, ts)
+        print("💾 fichiers : " + (result.name if result else "aucune modification"))
+    elif args.command == "restore":
+        until = datetime.fromisoformat(args.to).astimezone(timezone.utc) if args.to else datetime.now(timezone.utc)
+        output = args.output or Path(f"restore_{until.strftime('%Y%m%d_%H%M%S')}")
+        for db_path in DATABASES:
+            chain = restore_db(Path(db_path).name, args.dest, until, output / Path(db_path).name)
+            if chain:
+                print(f"♻️ {db_path} : {chain[0][4].name} + {len(chain) - 1} incrémentale(s)")
+        try:
+            manifest = restore_files(args.dest, until, output)
+        except ValueError as e:
+            parser.error(str(e))
+        if manifest:
+            print(f"♻️ fichiers : {manifest.name}")
+        print(f"✅ Restauré dans {output}/ (application arrêtée, recopiez les fichiers voulus)")
+    else:
+        for name in map(lambda p: Path(p).name, DATABASES):
+            for ts, kind, first, last, path in _db_backups(args.dest, name):
+                print(f"{name:12s} {_parse_ts(ts):%Y-%m-%d %H:%M:%S} {kind:5s} {first:>8d} → {last:<8d} {_size(path)}")
+        for manifest in _manifests(args.dest):
+            print(f"{'fichiers':12s} {_parse_ts(manifest.name.split('.')[0]):%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# bulk_io.py
+"""Import / export en masse des contacts (CSV, vCard) et des messages (JSON lines).
+
+Les fichiers sont lus comme des flux : chaque enregistrement est validé
+(champs requis, utilisateurs existants) puis mis en tranche, et chaque
+tranche de ``CHUNK_SIZE`` lignes est écrite en une seule transaction. La
+mémoire utilisée ne dépend pas de la taille du fichier, et un réseau de
+100 000 contacts se migre en quelques secondes.
+
+Un message déjà présent (même expéditeur, destinataire, horodatage et
+texte) n'est pas réimporté : chaque tranche est confrontée à l'index
+d'empreintes de la base au moment de son écriture (voir store.py). Rien
+ne s'accumule en mémoire au fil de l'import, quelle que soit la taille de
+la base.
+
+Les exports sont des générateurs de lignes : ils lisent la base par pages
+et s'écrivent au fil de l'eau dans un fichier ou une réponse HTTP.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from qr_cache import qr_payload
+
+CHUNK_SIZE = 5000
+MAX_ERRORS = 20
+CONTACT_FIELDS = ("name", "favorite", "created_at", "domain", "occasion", "notes")
+# En-têtes acceptés pour le nom du contact
+NAME_COLUMNS = ("name", "nom", "contact_name", "username", "utilisateur")
+TRUE_VALUES = {"1", "true", "oui", "yes", "vrai", "x", "⭐"}
+
+
+# ------------------------------
+# Lecture
+# ------------------------------
+def read_contacts_csv(f):
+    """Contacts d'un CSV (en-tête requis), un dict par ligne."""
+    for row in csv.DictReader(f):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        name = next((row[c] for c in NAME_COLUMNS if row.get(c)), "")
+        yield {
+            "name": name,
+            "favorite": row.get("favorite", row.get("favori", "")).lower() in TRUE_VALUES,
+            "created_at": row.get("created_at") or None,
+            "domain": row.get("domain", row.get("domaine")) or None,
+            "occasion": row.get("occasion") or None,
+            "notes": row.get("notes") or None,
+        }
+
+
+def _vcard_lines(f):
+    # Dépliage RFC 6350 : une ligne commençant par une espace prolonge la précédente
+    current = None
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _vcard_unescape(value):
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+def read_vcards(f):
+    """Contacts d'un fichier vCard ; le nom d'utilisateur vient de l'URL collabo://, de NICKNAME ou de FN."""
+    card = None
+    for line in _vcard_lines(f):
+        key, _, value = line.partition(":")
+        prop = key.split(";", 1)[0].upper()
+        if prop == "BEGIN":
+            card = {}
+        elif prop == "END" and card is not None:
+            url = card.get("URL", "")
+            name = url[len(qr_payload("")):] if url.startswith(qr_payload("")) else card.get("NICKNAME") or card.get("FN", "")
+            yield {
+                "name": name.strip(),
+                "favorite": card.get("X-COLLABO-FAVORITE", "").lower() in TRUE_VALUES,
+                "created_at": card.get("X-COLLABO-CREATED") or None,
+                "domain": card.get("ORG") or None,
+                "occasion": card.get("X-COLLABO-OCCASION") or None,
+                "notes": card.get("NOTE") or None,
+            }
+            card = None
+        elif card is not None and prop not in card:
+            card[prop] = _vcard_unescape(value)
+
+
+def read_messages_jsonl(f):
+    """Messages d'une archive JSON lines ; une ligne illisible donne None (comptée invalide)."""
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield record if isinstance(record, dict) else None
+
+
+# ------------------------------
+# Import
+# ------------------------------
+def _chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _report():
+    return {"imported": 0, "duplicates": 0, "invalid": 0, "unknown_users": 0, "errors": []}
+
+
+def _reject(report, kind, line, reason):
+    report[kind] += 1
+    if len(report["errors"]) < MAX_ERRORS:
+        report["errors"].append(f"ligne {line} : {reason}")
+
+
+def import_contacts(records, owner, write_chunk, user_exists, chunk_size=CHUNK_SIZE):
+    """Importe des contacts de ``owner`` ; ``write_chunk(tranche)`` renvoie le nombre de nouveaux.
+
+    ``user_exists(nom)`` valide chaque contact (seuls les utilisateurs inscrits sont acceptés).
+    """
+    report = _report()
+
+    def valid():
+        for line, contact in enumerate(records, start=1):
+            name = contact.get("name")
+            if not name:
+                _reject(report, "invalid", line, "nom manquant")
+            elif name == owner:
+                _reject(report, "invalid", line, "contact identique au propriétaire")
+            elif not user_exists(name):
+                _reject(report, "unknown_users", line, f"utilisateur inconnu « {name} »")
+            else:
+                yield {**{f: contact.get(f) for f in CONTACT_FIELDS}, "owner": owner}
+
+    for chunk in _chunks(valid(), chunk_size):
+        added = write_chunk(chunk)
+        report["imported"] += added
+        report["duplicates"] += len(chunk) - added
+    return report
+
+
+def _valid_timestamp(value):
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def import_messages(records, write_chunk, user_exists, chunk_size=CHUNK_SIZE):
+    """Importe une archive de messages ; les identifiants d'origine sont réattribués.
+
+    ``write_chunk`` renvoie le nombre de messages ajoutés : ceux qu'il
+    ignore (déjà en base) sont comptés comme doublons.
+    """
+    report = _report()
+
+    def valid():
+        for line, record in enumerate(records, start=1):
+            if record is None:
+                _reject(report, "invalid", line, "JSON illisible")
+                continue
+            text = record.get("text", record.get("content"))
+            sender, receiver, timestamp = record.get("sender"), record.get("receiver"), record.get("timestamp")
+            if not sender or not receiver or not isinstance(text, str) or not text.strip():
+                _reject(report, "invalid", line, "expéditeur, destinataire ou texte manquant")
+            elif not _valid_timestamp(timestamp):
+                _reject(report, "invalid", line, f"horodatage invalide « {timestamp} »")
+            elif not user_exists(sender) or not user_exists(receiver):
+                _reject(report, "unknown_users", line, f"utilisateur inconnu ({sender} → {receiver})")
+            else:
+                yield {"sender": sender, "receiver": receiver, "text": text, "timestamp": timestamp}
+
+    for chunk in _chunks(valid(), chunk_size):
+        added = write_chunk(chunk)
+        report["imported"] += added
+        report["duplicates"] += len(chunk) - added
+    return report
+
+
+# ------------------------------
+# Export
+# ------------------------------
+def export_contacts_csv(contacts):
+    """Lignes CSV (en-tête compris) des ``contacts``."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CONTACT_FIELDS)
+    for contact in contacts:
+        writer.writerow([
+            ("1" if contact.get("favorite") else "0") if f == "favorite" else contact.get(f) or ""
+            for f in CONTACT_FIELDS
+        ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _vcard_escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+
+def export_vcards(contacts):
+    for contact in contacts:
+        lines = ["BEGIN:VCARD", "VERSION:4.0", f"FN:{_vcard_escape(contact['name'])}",
+                 f"NICKNAME:{_vcard_escape(contact['name'])}", f"URL:{qr_payload(contact['name'])}"]
+        for prop, field in (("ORG", "domain"), ("NOTE", "notes"), ("X-COLLABO-OCCASION", "occasion"),
+                            ("X-COLLABO-CREATED", "created_at")):
+            if contact.get(field):
+                lines.append(f"{prop}:{_vcard_escape(contact[field])}")
+        if contact.get("favorite"):
+            lines.append("X-COLLABO-FAVORITE:1")
+        lines.append("END:VCARD")
+        yield "\r\n".join(lines) + "\r\n"
+
+
+def export_messages_jsonl(messages):
+    """Une ligne JSON par message."""
+    for m in messages:
+        yield json.dumps(m, ensure_ascii=False) + "\n"
+
+
+CONTACT_READERS = {"csv": read_contacts_csv, "vcf": read_vcards}
+CONTACT_WRITERS = {"csv": export_contacts_csv, "vcf": export_vcards}
+
+
+def contact_format(filename):
+    return "vcf" if filename.lower().endswith((".vcf", ".vcard")) else "csv"
+
+
+# ------------------------------
+# Ligne de commande (data.db)
+# ------------------------------
+def _print_report(report):
+    print(
+        f"✅ {report['imported']} importés, {report['duplicates']} doublons, "
+        f"{report['invalid']} invalides, {report['unknown_users']} utilisateurs inconnus"
+    )
+    for error in report["errors"]:
+        print(f"  ⚠️ {error}")
+
+
+def main(argv=None):
+    from store import DATA_DB, Store
+
+    parser = argparse.ArgumentParser(description="Import / export en masse de Collabo")
+    parser.add_argument("--db", default=DATA_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ic = sub.add_parser("import-contacts", help="Importer des contacts (CSV ou vCard)")
+    ic.add_argument("source")
+    ic.add_argument("--owner", required=True)
+    im = sub.add_parser("import-messages", help="Importer une archive de messages (JSON lines)")
+    im.add_argument("source")
+    ec = sub.add_parser("export-contacts", help="Exporter les contacts d'un utilisateur")
+    ec.add_argument("--owner", required=True)
+    ec.add_argument("--format", choices=sorted(CONTACT_WRITERS), default="csv")
+    ec.add_argument("-o", "--output")
+    em = sub.add_parser("export-messages", help="Exporter les messages (JSON lines)")
+    em.add_argument("--user")
+    em.add_argument("-o", "--output")
+    args = parser.parse_args(argv)
+
+    store = Store(args.db)
+    if args.command.startswith("import"):
+        with open(args.source, encoding="utf-8-sig", newline="") as f:
+            if args.command == "import-contacts":
+                records = CONTACT_READERS[contact_format(args.source)](f)
+                report = import_contacts(records, args.owner, store.add_contacts, store.user_exists)
+            else:
+                report = import_messages(
+                    read_messages_jsonl(f), partial(store.add_messages, skip_existing=True), store.user_exists
+                )
+        _print_report(report)
+        return
+
+    if args.command == "export-contacts":
+        lines = CONTACT_WRITERS[args.format](store.iter_contacts(args.owner))
+    else:
+        lines = export_messages_jsonl(store.iter_messages(args.user))
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        out.writelines(lines)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,44 @@
 # chat_store.py
-import json
+import os
+import warnings
 from datetime import datetime
 from pathlib import Path
 
+from message_log import MessageLog
+
 MESSAGES_FILE = Path("messages.json")
+MESSAGES_LOG_DIR = Path(os.getenv("MESSAGES_LOG_DIR", "messages_log"))
+
+_log = None
+
+def get_log():
+    global _log
+    if _log is None:
+        _log = MessageLog(MESSAGES_LOG_DIR)
+        # Import unique de l'ancien fichier messages.json
+        if MESSAGES_FILE.exists():
+            _log.import_json(MESSAGES_FILE)
+    return _log
 
 def load_messages():
-    if MESSAGES_FILE.exists():
-        return json.loads(MESSAGES_FILE.read_text())
-    return []
+    return get_log().records()
 
 def save_messages(messages):
-    MESSAGES_FILE.write_text(json.dumps(messages, indent=2))
+    """Obsolète : remplace tout l'historique (réécriture complète du journal).
+
+    Conservée pour les anciens appelants ; pour ajouter un message, utiliser
+    ``add_message``, qui n'écrit qu'une ligne.
+    """
+    warnings.warn("save_messages réécrit tout le journal ; utilisez add_message", DeprecationWarning, stacklevel=2)
+    get_log().replace(messages)
 
 def add_message(sender, receiver, content):
-    messages = load_messages()
-    messages.append({
+    get_log().append({
         "sender": sender,
         "receiver": receiver,
         "content": content,
         "timestamp": datetime.utcnow().isoformat()
     })
-    save_messages(messages)
 
 def get_conversation(user1, user2):
-    return [
-        m for m in load_messages()
-        if {m["sender"], m["receiver"]} == {user1, user2}
-    ]
\ No newline at end of file
+    return get_log().conversation(user1, user2)
\ No newline at end of file
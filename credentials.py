@@ -0,0 +1,242 @@
+# credentials.py
+"""Mots de passe : scrypt salé, migration des anciens formats, vérification en pool.
+
+Format stocké : ``scrypt$<log2 N>$<r>$<p>$<sel base64>$<empreinte base64>``.
+Les paramètres se règlent par variables d'environnement (``SCRYPT_LOG_N``,
+``SCRYPT_R``, ``SCRYPT_P``) ; ``python credentials.py --target-ms 250
+--concurrency 8`` choisit le plus grand N qui tient la latence de connexion
+visée à la concurrence visée.
+
+Trois anciens formats sont encore acceptés : SHA-256 non salé (auth.py,
+user_service), texte en clair (data.json / streamlit_app) et scrypt avec
+d'autres paramètres. Une valeur qui n'est pas une empreinte scrypt bien
+formée est lue dans l'ancien format du stockage d'origine (``legacy``),
+que l'appelant indique : 64 chiffres hexadécimaux peuvent aussi bien être
+une empreinte SHA-256 qu'un mot de passe en clair. Une connexion réussie renvoie la nouvelle empreinte à
+enregistrer : la migration se fait d'elle-même, utilisateur par utilisateur.
+
+scrypt libère le GIL : les vérifications passent par un pool de threads
+borné (la mémoire par calcul vaut 128 * r * N octets) et une vérification
+réussie est mémorisée quelques minutes, sans conserver le mot de passe.
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import secrets
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_LOG_N = int(os.getenv("SCRYPT_LOG_N", 14))
+SCRYPT_R = int(os.getenv("SCRYPT_R", 8))
+SCRYPT_P = int(os.getenv("SCRYPT_P", 1))
+SALT_SIZE = 16
+HASH_SIZE = 32
+CREDENTIAL_WORKERS = int(os.getenv("CREDENTIAL_WORKERS", min(4, os.cpu_count() or 1)))
+VERIFY_CACHE_TTL = 300
+VERIFY_CACHE_SIZE = 1024
+PREFIX = "scrypt"
+MAX_LOG_N = 30
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 1 << log_n
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=HASH_SIZE, maxmem=256 * r * n + 1024 * 1024
+    )
+
+
+def hash_password(password, log_n=None, r=None, p=None):
+    log_n, r, p = log_n or SCRYPT_LOG_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(SALT_SIZE)
+    return f"{PREFIX}${log_n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, log_n, r, p))}"
+
+
+def _parse_scrypt(stored):
+    """``(log_n, r, p, sel, empreinte)`` d'une empreinte scrypt, None si elle est mal formée."""
+    fields = stored.split("$")
+    if len(fields) != 6 or fields[0] != PREFIX:
+        return None
+    try:
+        log_n, r, p = (int(v) for v in fields[1:4])
+        salt, digest = _unb64(fields[4]), _unb64(fields[5])
+    except (ValueError, binascii.Error):
+        return None
+    if not (1 <= log_n <= MAX_LOG_N and r >= 1 and p >= 1 and salt and len(digest) == HASH_SIZE):
+        return None
+    return log_n, r, p, salt, digest
+
+
+def identify(stored, legacy=None):
+    """Format d'une empreinte stockée : "scrypt", "sha256" ou "plain".
+
+    Hors scrypt, ``legacy`` (format des anciennes valeurs du stockage) prime ;
+    sans lui, 64 chiffres hexadécimaux sont supposés être un SHA-256.
+    """
+    if _parse_scrypt(stored):
+        return "scrypt"
+    if legacy is not None:
+        return legacy
+    if len(stored) == 64 and all(c in "0123456789abcdef" for c in stored):
+        return "sha256"
+    return "plain"
+
+
+def needs_rehash(stored):
+    params = _parse_scrypt(stored)
+    return params is None or params[:3] != (SCRYPT_LOG_N, SCRYPT_R, SCRYPT_P)
+
+
+def _check(password, stored, legacy=None):
+    kind = identify(stored, legacy)
+    if kind == "scrypt":
+        log_n, r, p, salt, digest = _parse_scrypt(stored)
+        return hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+    if kind == "sha256":
+        return hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).hexdigest(), stored)
+    return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+
+class Credentials:
+    """Vérifications en pool de threads, avec cache des succès récents."""
+
+    def __init__(self, workers=CREDENTIAL_WORKERS, ttl=VERIFY_CACHE_TTL, cache_size=VERIFY_CACHE_SIZE):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+        self.ttl = ttl
+        self.cache_size = cache_size
+        # Clé propre au processus : le cache ne contient que des HMAC, jamais de mot de passe
+        self._key = secrets.token_bytes(32)
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        # Empreinte factice : un utilisateur inconnu coûte autant qu'un mot de passe faux
+        self._dummy = hash_password(secrets.token_urlsafe(16))
+
+    def _cache_key(self, password, stored):
+        return hmac.new(self._key, f"{stored}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def _cached(self, key):
+        with self._lock:
+            expires = self._verified.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._verified[key]
+                return False
+            self._verified.move_to_end(key)
+            return True
+
+    def _remember(self, key):
+        with self._lock:
+            self._verified[key] = time.monotonic() + self.ttl
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def _verify(self, password, stored, legacy=None):
+        if stored is None:
+            _check(password, self._dummy)
+            return False, None
+        key = self._cache_key(password, stored)
+        ok = self._cached(key) or _check(password, stored, legacy)
+        if not ok:
+            return False, None
+        self._remember(key)
+        return True, hash_password(password) if needs_rehash(stored) else None
+
+    def submit(self, password, stored, legacy=None):
+        """Future de ``(valide, nouvelle_empreinte_ou_None)``."""
+        return self._pool.submit(self._verify, password, stored, legacy)
+
+    def verify(self, password, stored, timeout=None, legacy=None):
+        """``(valide, nouvelle_empreinte)`` ; la nouvelle empreinte est à enregistrer si non None.
+
+        ``stored`` vaut None pour un utilisateur inconnu (le temps de réponse reste le même).
+        ``legacy`` : ancien format du stockage ("sha256" ou "plain"), voir ``identify``.
+        L'appelant attend le résultat : sous Streamlit, seul le thread de la session
+        qui se connecte est bloqué ; le pool borne le nombre de calculs simultanés.
+        """
+        return self.submit(password, stored, legacy).result(timeout)
+
+    def hash(self, password):
+        return self._pool.submit(hash_password, password).result()
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+_credentials = None
+_credentials_lock = threading.Lock()
+
+
+def get_credentials():
+    """Pool de vérification du processus."""
+    global _credentials
+    if _credentials is None:
+        with _credentials_lock:
+            if _credentials is None:
+                _credentials = Credentials()
+    return _credentials
+
+
+# ------------------------------
+# Réglage des paramètres
+# ------------------------------
+def _login_latency(log_n, r, p, concurrency, workers, rounds):
+    """Latences (s) de ``concurrency`` connexions simultanées, sur ``rounds`` vagues."""
+    salt = secrets.token_bytes(SALT_SIZE)
+    latencies = []
+
+    def login(start):
+        _scrypt("mot de passe", salt, log_n, r, p)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            latencies.extend(f.result() for f in [pool.submit(login, start) for _ in range(concurrency)])
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Réglage de scrypt pour la latence de connexion visée")
+    parser.add_argument("--target-ms", type=float, default=250, help="latence p95 visée par connexion")
+    parser.add_argument("--concurrency", type=int, default=8, help="connexions simultanées")
+    parser.add_argument("--workers", type=int, default=CREDENTIAL_WORKERS)
+    parser.add_argument("--r", type=int, default=SCRYPT_R)
+    parser.add_argument("--p", type=int, default=SCRYPT_P)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-log-n", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    best = None
+    for log_n in range(10, args.max_log_n + 1):
+        latencies = sorted(_login_latency(log_n, args.r, args.p, args.concurrency, args.workers, args.rounds))
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        memory = 128 * args.r * (1 << log_n) * min(args.workers, args.concurrency) / 2 ** 20
+        print(f"N=2^{log_n:<2d} médiane {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95:7.1f} ms  mémoire {memory:6.0f} Mio")
+        if p95 > args.target_ms:
+            break
+        best = log_n
+
+    if best is None:
+        print(f"⚠️ Même N=2^10 dépasse {args.target_ms:.0f} ms à {args.concurrency} connexions simultanées")
+        return
+    print(f"\n✅ Paramètres retenus pour p95 ≤ {args.target_ms:.0f} ms à {args.concurrency} connexions simultanées :")
+    print(f"SCRYPT_LOG_N={best}\nSCRYPT_R={args.r}\nSCRYPT_P={args.p}\nCREDENTIAL_WORKERS={args.workers}")
+
+
+if __name__ == "__main__":
+    main()
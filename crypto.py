@@ -0,0 +1,314 @@
+# crypto.py
+"""Chiffrement au repos des champs sensibles (AES-256-GCM).
+
+Une clé maîtresse de 32 octets (``COLLABO_MASTER_KEY``, hex ou base64)
+donne par HKDF-SHA256 une sous-clé par usage ("messages", "contacts"...),
+dérivée une seule fois par processus puis gardée avec son contexte AES-GCM.
+Chaque valeur reçoit un nonce aléatoire de 96 bits ; les données associées
+(AAD) lient le chiffré à sa ligne : recopié ailleurs, il ne se déchiffre pas.
+
+En base, un champ chiffré est un BLOB (version, nonce, chiffré + tag) et un
+champ en clair reste un TEXT : les données antérieures se relisent telles
+quelles et ``python crypto.py encrypt`` chiffre l'existant (data.db,
+collabo.db et journal de messages). Dans les fichiers texte (journal de
+messages), le même contenu est encodé en base64 derrière le préfixe ``enc1:``.
+
+Sans clé maîtresse, le chiffrement est désactivé (valeurs stockées en clair).
+"""
+import argparse
+import base64
+import binascii
+import os
+import secrets
+import threading
+import time
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    CRYPTO_AVAILABLE = True
+except ImportError:
+    CRYPTO_AVAILABLE = False
+
+MASTER_KEY_ENV = "COLLABO_MASTER_KEY"
+KEY_SIZE = 32
+NONCE_SIZE = 12
+VERSION = b"\x01"
+TEXT_PREFIX = "enc1:"
+_SEP = "\x1f"
+
+
+class CryptoError(Exception):
+    """Clé absente ou incorrecte, ou donnée chiffrée altérée."""
+
+
+def parse_key(value):
+    """Clé maîtresse de 32 octets, écrite en hex ou en base64."""
+    value = value.strip()
+    for decode in (bytes.fromhex, base64.b64decode, base64.urlsafe_b64decode):
+        try:
+            key = decode(value)
+        except (ValueError, binascii.Error):
+            continue
+        if len(key) == KEY_SIZE:
+            return key
+    raise CryptoError(f"{MASTER_KEY_ENV} doit contenir {KEY_SIZE} octets (hex ou base64)")
+
+
+def aad(*parts):
+    """Données associées : les champs qui identifient la ligne."""
+    return _SEP.join(map(str, parts)).encode("utf-8")
+
+
+class FieldCipher:
+    """Chiffre les valeurs d'un usage avec sa sous-clé (contexte AES-GCM réutilisé)."""
+
+    enabled = True
+
+    def __init__(self, key):
+        self._aead = AESGCM(key)
+
+    def encrypt(self, value, associated=b""):
+        if value is None:
+            return None
+        nonce = os.urandom(NONCE_SIZE)
+        return VERSION + nonce + self._aead.encrypt(nonce, value.encode("utf-8"), associated)
+
+    def decrypt(self, value, associated=b""):
+        # Les valeurs en clair (TEXT) sont celles écrites avant le chiffrement
+        if not isinstance(value, bytes):
+            return value
+        if value[:1] != VERSION:
+            raise CryptoError("Format de donnée chiffrée inconnu")
+        try:
+            return self._aead.decrypt(value[1:1 + NONCE_SIZE], value[1 + NONCE_SIZE:], associated).decode("utf-8")
+        except InvalidTag:
+            raise CryptoError("Donnée chiffrée altérée ou clé incorrecte") from None
+
+    def encrypt_many(self, values, associated):
+        """Chiffre une page de valeurs ; ``associated`` donne l'AAD de chacune."""
+        encrypt = self._aead.encrypt
+        urandom = os.urandom
+        out = []
+        for value, ad in zip(values, associated):
+            if value is None:
+                out.append(None)
+                continue
+            nonce = urandom(NONCE_SIZE)
+            out.append(VERSION + nonce + encrypt(nonce, value.encode("utf-8"), ad))
+        return out
+
+    def decrypt_many(self, values, associated):
+        decrypt = self._aead.decrypt
+        version = VERSION[0]
+        end = 1 + NONCE_SIZE
+        out = []
+        try:
+            for value, ad in zip(values, associated):
+                if type(value) is bytes:
+                    if value[0] != version:
+                        raise CryptoError("Format de donnée chiffrée inconnu")
+                    value = decrypt(value[1:end], value[end:], ad).decode("utf-8")
+                out.append(value)
+        except InvalidTag:
+            raise CryptoError("Donnée chiffrée altérée ou clé incorrecte") from None
+        return out
+
+    def encrypt_text(self, value, associated=b""):
+        """Variante texte (fichiers JSON) : ``enc1:`` + base64."""
+        if value is None:
+            return None
+        return TEXT_PREFIX + base64.b64encode(self.encrypt(value, associated)).decode("ascii")
+
+    def decrypt_text(self, value, associated=b""):
+        if not isinstance(value, str) or not value.startswith(TEXT_PREFIX):
+            return value
+        return self.decrypt(base64.b64decode(value[len(TEXT_PREFIX):]), associated)
+
+
+class PlainCipher:
+    """Chiffrement désactivé : les valeurs passent inchangées (anciennes valeurs chiffrées refusées)."""
+
+    enabled = False
+
+    def encrypt(self, value, associated=b""):
+        return value
+
+    def decrypt(self, value, associated=b""):
+        if isinstance(value, bytes):
+            raise CryptoError(f"Donnée chiffrée : définissez {MASTER_KEY_ENV}")
+        return value
+
+    def encrypt_many(self, values, associated):
+        return list(values)
+
+    def decrypt_many(self, values, associated):
+        values = list(values)
+        if any(isinstance(v, bytes) for v in values):
+            raise CryptoError(f"Donnée chiffrée : définissez {MASTER_KEY_ENV}")
+        return values
+
+    def encrypt_text(self, value, associated=b""):
+        return value
+
+    def decrypt_text(self, value, associated=b""):
+        if isinstance(value, str) and value.startswith(TEXT_PREFIX):
+            raise CryptoError(f"Donnée chiffrée : définissez {MASTER_KEY_ENV}")
+        return value
+
+
+class Keyring:
+    """Sous-clés par usage, dérivées de la clé maîtresse à la première demande."""
+
+    def __init__(self, master_key=None):
+        if master_key is not None and not CRYPTO_AVAILABLE:
+            raise CryptoError("Le paquet cryptography est requis pour le chiffrement")
+        self._master = master_key
+        self._ciphers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._master is not None
+
+    def cipher(self, purpose):
+        cipher = self._ciphers.get(purpose)
+        if cipher is None:
+            with self._lock:
+                cipher = self._ciphers.get(purpose)
+                if cipher is None:
+                    cipher = self._ciphers[purpose] = self._derive(purpose)
+        return cipher
+
+    def secret(self, purpose):
+        """Sous-clé brute de ``purpose`` (empreintes à clé) ; vide sans clé maîtresse."""
+        if self._master is None:
+            return b""
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=None, info=f"collabo:{purpose}".encode())
+        return hkdf.derive(self._master)
+
+    def _derive(self, purpose):
+        if self._master is None:
+            return PlainCipher()
+        return FieldCipher(self.secret(purpose))
+
+
+_keyring = None
+_keyring_lock = threading.Lock()
+
+
+def get_keyring():
+    """Trousseau du processus, construit depuis ``COLLABO_MASTER_KEY``."""
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                value = os.getenv(MASTER_KEY_ENV, "")
+                _keyring = Keyring(parse_key(value) if value else None)
+    return _keyring
+
+
+# ------------------------------
+# Outils en ligne de commande
+# ------------------------------
+def _bench(messages, conversations, rounds):
+    import statistics
+    import tempfile
+
+    from indexes import build_conversation_index
+    from store import Store
+
+    users = [f"user{i}" for i in range(conversations + 1)]
+    data = {
+        "users": [{"username": u, "password": "x"} for u in users],
+        "contacts": [],
+        "messages": [
+            {
+                "id": i + 1,
+                "sender": users[0],
+                "receiver": users[1 + i % conversations],
+                "text": f"Message {i} : point sur le projet, relance prévue la semaine prochaine.",
+                "timestamp": f"2026-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}",
+            }
+            for i in range(messages)
+        ],
+        "ai_analyses": [],
+    }
+
+    def load(store):
+        _, snapshot = store.load_snapshot()
+        return build_conversation_index(snapshot["messages"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Référence : lignes en clair, la disposition réelle d'une base sans clé.
+        # Les pages en clair isolent la part due au seul chiffrement.
+        stores = {
+            "lignes": Store(os.path.join(tmp, "rows.db"), keyring=Keyring(), seal=False),
+            "pages": Store(os.path.join(tmp, "pages.db"), keyring=Keyring(), seal=True),
+            "chiffré": Store(os.path.join(tmp, "enc.db"), keyring=Keyring(secrets.token_bytes(KEY_SIZE))),
+        }
+        timings = {}
+        for name, store in stores.items():
+            store.replace_all(data)
+            load(store)
+            samples = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                load(store)
+                samples.append(time.perf_counter() - start)
+            timings[name] = statistics.median(samples)
+            print(f"{name:8s} : {timings[name] * 1000:8.1f} ms")
+    overhead = timings["chiffré"] / timings["lignes"] - 1
+    print(f"Surcoût du chiffrement sur le chargement des conversations ({messages} messages) : {overhead:+.1%}")
+    print(f"  dont AES-GCM seul (pages chiffrées / pages en clair) : {timings['chiffré'] / timings['pages'] - 1:+.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chiffrement au repos de Collabo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("genkey", help="Générer une clé maîtresse")
+    enc = sub.add_parser("encrypt", help="Chiffrer les données existantes (avec COLLABO_MASTER_KEY)")
+    enc.add_argument("--db", default=None)
+    enc.add_argument("--collabo-db", default=None)
+    enc.add_argument("--log-dir", default=os.getenv("MESSAGES_LOG_DIR", "messages_log"))
+    bench = sub.add_parser("bench", help="Mesurer le surcoût du chiffrement")
+    bench.add_argument("--messages", type=int, default=100000)
+    bench.add_argument("--conversations", type=int, default=200)
+    bench.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "genkey":
+        print(secrets.token_hex(KEY_SIZE))
+    elif args.command == "encrypt":
+        import data_access
+        from message_log import MessageLog
+        from store import DATA_DB, Store
+
+        keyring = get_keyring()
+        if not keyring.enabled:
+            parser.error(f"{MASTER_KEY_ENV} n'est pas défini")
+        # Chaque stockage n'est migré que s'il existe déjà
+        db = args.db or DATA_DB
+        if os.path.exists(db):
+            counts = Store(db, keyring=keyring).encrypt_existing()
+            print(f"✅ {db} : " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+        collabo_db = args.collabo_db or data_access.DB_FILE
+        if os.path.exists(collabo_db):
+            conn = data_access.connect(collabo_db)
+            try:
+                data_access.migrate(conn)
+                counts = data_access.encrypt_existing(conn)
+            finally:
+                conn.close()
+            print(f"✅ {collabo_db} : " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+        if os.path.isdir(args.log_dir):
+            count = MessageLog(args.log_dir, background=False, keyring=keyring).encrypt_existing()
+            print(f"✅ {args.log_dir} : {count} messages")
+    else:
+        _bench(args.messages, args.conversations, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# data_access.py
+"""Accès aux données SQLite de user_service (collabo.db).
+
+- schéma versionné via ``PRAGMA user_version`` et une liste de migrations ;
+- index composites pour le fil de discussion et la liste des contacts ;
+- pagination par curseur (timestamp, id) : la page la plus récente coûte
+  le même temps quelle que soit la taille de la table ;
+- requêtes SQL constantes, réutilisées par le cache de requêtes préparées
+  de chaque connexion sqlite3 (``cached_statements``) ;
+- un pool de connexions : une connexion d'écriture sérialisée et plusieurs
+  connexions de lecture, jamais partagées entre deux threads à la fois ;
+- contenu des messages et notes des contacts chiffrés au repos si une clé
+  maîtresse est configurée (crypto.py), page par page à la lecture.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from crypto import aad, get_keyring
+
+DB_FILE = "collabo.db"
+FEED_PAGE_SIZE = 50
+POOL_READERS = 8
+BUSY_TIMEOUT = 5.0
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Chaque entrée fait passer le schéma à la version suivante
+MIGRATIONS = [
+    # 1 : schéma d'origine
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender TEXT,
+        receiver TEXT,
+        content TEXT,
+        timestamp TEXT
+    );
+    CREATE TABLE IF NOT EXISTS contacts (
+        owner TEXT,
+        name TEXT,
+        domain TEXT,
+        occasion TEXT,
+        notes TEXT
+    );
+    """,
+    # 2 : index du fil de discussion et des contacts
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_sender_ts ON messages (sender, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_messages_receiver_ts ON messages (receiver, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_contacts_owner ON contacts (owner);
+    """,
+]
+
+SQL_INSERT_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+SQL_SELECT_USER = "SELECT username, password FROM users WHERE username = ?"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE username = ?"
+SQL_INSERT_MESSAGE = "INSERT INTO messages (sender, receiver, content, timestamp) VALUES (?, ?, ?, ?)"
+SQL_INSERT_CONTACT = "INSERT INTO contacts (owner, name, domain, occasion, notes) VALUES (?, ?, ?, ?, ?)"
+SQL_SELECT_CONTACTS = "SELECT name, domain, occasion FROM contacts WHERE owner = ?"
+SQL_ALL_MESSAGES = "SELECT id, sender, receiver, content, timestamp FROM messages"
+SQL_ALL_CONTACTS = "SELECT rowid, owner, name, domain, occasion, notes FROM contacts"
+
+# Chaque branche parcourt son index dans l'ordre et s'arrête après ``limit``
+# lignes ; la fusion ne trie donc jamais plus de 2 * limit lignes. Le filtre
+# sender != ? évite de compter deux fois les messages envoyés à soi-même.
+SQL_FEED = """
+SELECT id, sender, receiver, content, timestamp FROM (
+    SELECT * FROM (
+        SELECT id, sender, receiver, content, timestamp FROM messages
+        WHERE sender = :user AND (timestamp, id) < (:ts, :id)
+        ORDER BY timestamp DESC, id DESC LIMIT :limit
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT id, sender, receiver, content, timestamp FROM messages
+        WHERE receiver = :user AND sender != :user AND (timestamp, id) < (:ts, :id)
+        ORDER BY timestamp DESC, id DESC LIMIT :limit
+    )
+)
+ORDER BY timestamp DESC, id DESC LIMIT :limit
+"""
+
+# Messages de l'utilisateur depuis ``(:ts, :id)`` inclus, du plus récent au plus ancien
+SQL_FEED_SINCE = """
+SELECT id, sender, receiver, content, timestamp FROM (
+    SELECT id, sender, receiver, content, timestamp FROM messages
+    WHERE sender = :user AND (timestamp, id) >= (:ts, :id)
+    UNION ALL
+    SELECT id, sender, receiver, content, timestamp FROM messages
+    WHERE receiver = :user AND sender != :user AND (timestamp, id) >= (:ts, :id)
+)
+ORDER BY timestamp DESC, id DESC
+"""
+
+# Plus grand que tout couple (horodatage ISO, id) : curseur de la première page
+_FEED_START = ("\uffff", 2 ** 63 - 1)
+
+
+def connect(path=DB_FILE, **kwargs):
+    conn = sqlite3.connect(path, cached_statements=256, **kwargs)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Pool SQLite : un écrivain, plusieurs lecteurs.
+
+    En mode WAL les lectures ne bloquent pas l'écriture ; chaque lecteur a
+    sa propre connexion, empruntée le temps d'une requête. Les écritures
+    passent par une unique connexion protégée par un verrou (la file des
+    écrivains) et chaque ``write()`` forme une unité de travail : COMMIT à
+    la sortie du bloc, ROLLBACK en cas d'exception.
+    """
+
+    def __init__(self, path=DB_FILE, readers=POOL_READERS, busy_timeout=BUSY_TIMEOUT, row_factory=None):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.row_factory = row_factory
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(readers)
+        self._write_lock = threading.Lock()
+        self._writer = self._open()
+
+    def _open(self):
+        # timeout = busy_timeout : attente du verrou SQLite tenu par un autre processus
+        conn = connect(self.path, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+        conn.row_factory = self.row_factory
+        return conn
+
+    @contextmanager
+    def read(self):
+        self._reader_slots.acquire()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+            self._reader_slots.release()
+
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            conn = self._writer
+            # IMMEDIATE prend le verrou d'écriture dès le début : pas d'échec
+            # tardif lors de la promotion d'une transaction de lecture
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    @contextmanager
+    def exclusive(self):
+        """Connexion d'écriture hors transaction, pour les scripts de schéma."""
+        with self._write_lock:
+            yield self._writer
+
+
+def migrate(conn):
+    """Applique les migrations manquantes ; renvoie la version du schéma."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Script et numéro de version appliqués dans la même transaction
+        conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;")
+    return len(MIGRATIONS)
+
+
+# ==============================
+# CHIFFREMENT
+# ==============================
+def _decrypt_messages(rows):
+    # (id, sender, receiver, content, timestamp) : une page déchiffrée d'un coup
+    contents = get_keyring().cipher("messages").decrypt_many(
+        [r[3] for r in rows], [aad(r[1], r[2], r[4]) for r in rows]
+    )
+    return [(r[0], r[1], r[2], content, r[4]) for r, content in zip(rows, contents)]
+
+
+def _contact_fields(owner, name, fields, decrypt=False):
+    cipher = get_keyring().cipher("contacts")
+    ad = aad(owner, name)
+    convert = cipher.decrypt if decrypt else cipher.encrypt
+    return [convert(value, ad) for value in fields]
+
+
+def encrypt_existing(conn, batch=1000):
+    """Chiffre les messages et champs de contacts encore en clair ; renvoie leur nombre par table.
+
+    Les lignes sont traitées par tranches d'une transaction ; une ligne déjà
+    chiffrée (BLOB) n'est pas relue, la migration peut donc être reprise.
+    """
+    counts = {"messages": 0, "contacts": 0}
+    while True:
+        rows = conn.execute(
+            "SELECT id, sender, receiver, content, timestamp FROM messages WHERE typeof(content) = 'text' LIMIT ?",
+            (batch,),
+        ).fetchall()
+        if not rows:
+            break
+        contents = get_keyring().cipher("messages").encrypt_many(
+            [r[3] for r in rows], [aad(r[1], r[2], r[4]) for r in rows]
+        )
+        with conn:
+            conn.executemany("UPDATE messages SET content = ? WHERE id = ?", [(c, r[0]) for r, c in zip(rows, contents)])
+        counts["messages"] += len(rows)
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, owner, name, domain, occasion, notes FROM contacts "
+            "WHERE 'text' IN (typeof(domain), typeof(occasion), typeof(notes)) LIMIT ?",
+            (batch,),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, owner, name, *fields in rows:
+            sealed = _contact_fields(owner, name, [None if isinstance(v, bytes) else v for v in fields])
+            # Une valeur déjà chiffrée est conservée telle quelle
+            updates.append((*(v if isinstance(v, bytes) else e for v, e in zip(fields, sealed)), rowid))
+        with conn:
+            conn.executemany("UPDATE contacts SET domain = ?, occasion = ?, notes = ? WHERE rowid = ?", updates)
+        counts["contacts"] += len(rows)
+    return counts
+
+
+# ==============================
+# UTILISATEURS
+# ==============================
+def insert_user(conn, username, password_hash):
+    try:
+        conn.execute(SQL_INSERT_USER, (username, password_hash))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def fetch_user(conn, username):
+    return conn.execute(SQL_SELECT_USER, (username,)).fetchone()
+
+
+def update_password(conn, username, password_hash):
+    conn.execute(SQL_UPDATE_PASSWORD, (password_hash, username))
+
+
+# ==============================
+# MESSAGES
+# ==============================
+def insert_message(conn, sender, receiver, content, timestamp):
+    content = get_keyring().cipher("messages").encrypt(content, aad(sender, receiver, timestamp))
+    cur = conn.execute(SQL_INSERT_MESSAGE, (sender, receiver, content, timestamp))
+    return cur.lastrowid
+
+
+def fetch_feed(conn, user, limit=FEED_PAGE_SIZE, before=None):
+    """Messages de ``user``, du plus récent au plus ancien.
+
+    ``before`` est le curseur renvoyé par l'appel précédent ; renvoie
+    ``(lignes, curseur_suivant)``, le curseur valant None en fin d'historique.
+    """
+    ts, msg_id = before or _FEED_START
+    rows = conn.execute(SQL_FEED, {"user": user, "ts": ts, "id": msg_id, "limit": limit}).fetchall()
+    cursor = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+    return _decrypt_messages(rows), cursor
+
+
+def fetch_feed_since(conn, user, since):
+    """Messages de ``user`` depuis le curseur ``since`` (inclus), du plus récent au plus ancien."""
+    ts, msg_id = since
+    return _decrypt_messages(conn.execute(SQL_FEED_SINCE, {"user": user, "ts": ts, "id": msg_id}).fetchall())
+
+
+def iter_messages(conn):
+    """Tous les messages, pour construire l'index de recherche."""
+    cur = conn.execute(SQL_ALL_MESSAGES)
+    while True:
+        rows = cur.fetchmany(FEED_PAGE_SIZE * 20)
+        if not rows:
+            return
+        yield from _decrypt_messages(rows)
+
+
+# ==============================
+# CONTACTS
+# ==============================
+def insert_contact(conn, owner, name, domain, occasion, notes):
+    domain, occasion, notes = _contact_fields(owner, name, (domain, occasion, notes))
+    cur = conn.execute(SQL_INSERT_CONTACT, (owner, name, domain, occasion, notes))
+    return cur.lastrowid
+
+
+def fetch_contacts(conn, owner):
+    return [
+        (name, *_contact_fields(owner, name, (domain, occasion), decrypt=True))
+        for name, domain, occasion in conn.execute(SQL_SELECT_CONTACTS, (owner,))
+    ]
+
+
+def iter_contacts(conn):
+    for rowid, owner, name, *fields in conn.execute(SQL_ALL_CONTACTS):
+        yield (rowid, owner, name, *_contact_fields(owner, name, fields, decrypt=True))
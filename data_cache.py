@@ -0,0 +1,170 @@
+# data_cache.py
+"""Cache de données partagé par toutes les sessions Streamlit du processus.
+
+Une seule copie des données (et des index dérivés) vit en mémoire, quel que
+soit le nombre de sessions. Les écritures passent par le cache : elles sont
+persistées dans le store puis appliquées sur place, et la version augmente.
+Si un autre processus écrit dans la base, la version du store ne correspond
+plus à celle du cache et un nouvel instantané est chargé.
+
+Chaque nouveau message est aussi publié sur ``pubsub`` (s'il est fourni),
+pour que les sessions qui affichent le fil le redessinent.
+"""
+import threading
+from datetime import datetime
+
+from analytics import Analytics
+from indexes import build_activity_index, build_contact_index, build_conversation_index, build_user_index
+from pubsub import message_event
+from search import build_search_index, index_analysis, index_contact, index_message
+
+
+class DataCache:
+    """Instantané versionné des données du store, partagé entre sessions."""
+
+    def __init__(self, store, pubsub=None):
+        self.store = store
+        self.pubsub = pubsub
+        self._lock = threading.RLock()
+        self._reload()
+
+    def _reload(self):
+        version, data = self.store.load_snapshot()
+        self.data = data
+        self.users = build_user_index(data["users"])
+        self.contacts = build_contact_index(data["contacts"])
+        self.conversations = build_conversation_index(data["messages"])
+        self.activity = build_activity_index(data["messages"], data["contacts"], self.contacts, data["read_cursors"])
+        self._read_cursors = {(r["user"], r["contact"]): r for r in data["read_cursors"]}
+        self.sentiments = {
+            a["message_id"]: a["sentiment"] for a in data["ai_analyses"] if "sentiment" in a
+        }
+        # Index plein texte construit à la première recherche, pas à chaque rechargement
+        self._search = None
+        self._analytics = None
+        self.version = version
+
+    def search_index(self):
+        if self._search is None:
+            with self._lock:
+                if self._search is None:
+                    self._search = build_search_index(self.data)
+        return self._search
+
+    def search(self, user, query, kinds=None, limit=20):
+        return self.search_index().search(user, query, kinds, limit)
+
+    def analytics(self):
+        # Colonnes construites au premier affichage des statistiques
+        if self._analytics is None:
+            with self._lock:
+                if self._analytics is None:
+                    self._analytics = Analytics(self.data, self.sentiments, self.contacts)
+        return self._analytics
+
+    def refresh(self):
+        """Recharge l'instantané si la base a été modifiée ailleurs."""
+        if self.store.version() != self.version:
+            with self._lock:
+                if self.store.version() != self.version:
+                    self._reload()
+
+    def _written(self, before):
+        # Une seule écriture attendue depuis ``before`` ; sinon un autre
+        # processus a écrit entre-temps et l'instantané est invalidé
+        after = self.store.version()
+        if after == before + 1:
+            self.version = after
+        else:
+            self._reload()
+
+    # ------------------------------
+    # Écritures
+    # ------------------------------
+    def add_user(self, user):
+        with self._lock:
+            before = self.version
+            if not self.store.add_user(user):
+                return False
+            self.data["users"].append(user)
+            self.users[user["username"]] = user
+            self._written(before)
+            return True
+
+    def set_password(self, user, password_hash):
+        with self._lock:
+            before = self.version
+            self.store.set_password(user["username"], password_hash)
+            user["password"] = password_hash
+            self._written(before)
+
+    def add_contact(self, contact):
+        with self._lock:
+            before = self.version
+            if not self.store.add_contact(contact):
+                return False
+            self.data["contacts"].append(contact)
+            self.contacts.add(contact)
+            self.activity.add_contact(contact)
+            if self._analytics is not None:
+                self._analytics.touch(contact["owner"])
+            if self._search is not None:
+                index_contact(self._search, contact)
+            self._written(before)
+            return True
+
+    def set_favorite(self, contact, favorite):
+        with self._lock:
+            before = self.version
+            self.store.set_favorite(contact["owner"], contact["name"], favorite)
+            self.activity.set_favorite(contact["owner"], contact.get("favorite"), favorite)
+            contact["favorite"] = favorite
+            self._written(before)
+
+    def add_message(self, message, source=None):
+        """Enregistre ``message`` ; ``source`` est l'abonnement de la session qui l'envoie."""
+        with self._lock:
+            before = self.version
+            message["id"] = self.store.add_message(message)
+            self.data["messages"].append(message)
+            self.conversations.add(message["sender"], message["receiver"], message["timestamp"], message)
+            self.activity.add_message(message)
+            if self._analytics is not None:
+                self._analytics.touch(message["sender"], message["receiver"])
+            if self._search is not None:
+                index_message(self._search, message)
+            self._written(before)
+        if self.pubsub is not None:
+            self.pubsub.publish(*message_event(message), source=source)
+        return message["id"]
+
+    def mark_read(self, user, contact):
+        """Marque comme lue la conversation de ``user`` avec ``contact`` (sans écriture si rien n'est à lire)."""
+        with self._lock:
+            last_id = self.activity.last_message_id(user, contact)
+            if last_id is None or not self.activity.unread(user, contact):
+                return
+            before = self.version
+            read_at = str(datetime.now())
+            self.store.mark_read(user, contact, last_id, read_at)
+            cursor = self._read_cursors.get((user, contact))
+            if cursor is None:
+                cursor = self._read_cursors[(user, contact)] = {"user": user, "contact": contact}
+                self.data["read_cursors"].append(cursor)
+            cursor.update(last_read_id=last_id, read_at=read_at)
+            self.activity.mark_read(user, contact, last_id)
+            self._written(before)
+
+    def add_analysis(self, analysis):
+        with self._lock:
+            before = self.version
+            analysis["id"] = self.store.add_analysis(analysis)
+            self.data["ai_analyses"].append(analysis)
+            if "sentiment" in analysis:
+                self.sentiments[analysis["message_id"]] = analysis["sentiment"]
+                if self._analytics is not None:
+                    self._analytics.sentiment_added(analysis["message_id"])
+            if self._search is not None:
+                index_analysis(self._search, analysis)
+            self._written(before)
+            return analysis["id"]
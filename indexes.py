@@ -0,0 +1,209 @@
+# indexes.py
+"""Index en mémoire maintenus de façon incrémentale."""
+import heapq
+import itertools
+from bisect import bisect_right
+
+RECENT_ACTIVITY = 20
+
+
+def pair_key(user1, user2):
+    """Clé non ordonnée d'une conversation entre deux utilisateurs."""
+    return (user1, user2) if user1 <= user2 else (user2, user1)
+
+
+class ConversationIndex:
+    """Fils de discussion indexés par paire d'utilisateurs, triés par horodatage.
+
+    Les éléments stockés sont libres : des messages complets pour l'app
+    Streamlit, des positions (segment, offset) pour le journal de messages.
+    """
+
+    def __init__(self):
+        self._stamps = {}
+        self._items = {}
+
+    def add(self, user1, user2, timestamp, item):
+        key = pair_key(user1, user2)
+        stamps = self._stamps.setdefault(key, [])
+        items = self._items.setdefault(key, [])
+        if not stamps or stamps[-1] <= timestamp:
+            # Cas courant : le message le plus récent arrive en dernier
+            stamps.append(timestamp)
+            items.append(item)
+        else:
+            pos = bisect_right(stamps, timestamp)
+            stamps.insert(pos, timestamp)
+            items.insert(pos, item)
+
+    def get(self, user1, user2):
+        return list(self._items.get(pair_key(user1, user2), ()))
+
+    def count(self, user1, user2):
+        return len(self._items.get(pair_key(user1, user2), ()))
+
+    def slice(self, user1, user2, start, end=None):
+        """Éléments ``start:end`` d'un fil ; les positions restent valables quand
+        de nouveaux messages arrivent en fin de fil."""
+        return self._items.get(pair_key(user1, user2), [])[start:end]
+
+    def remap(self, keys, fn):
+        """Remplace chaque élément des fils ``keys`` par ``fn(élément)``."""
+        for key in keys:
+            self._items[key] = [fn(item) for item in self._items[key]]
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+
+def build_conversation_index(messages):
+    index = ConversationIndex()
+    for m in messages:
+        index.add(m["sender"], m["receiver"], m["timestamp"], m)
+    return index
+
+
+class ContactIndex:
+    """Contacts par propriétaire (dans l'ordre d'ajout) et par (propriétaire, nom)."""
+
+    def __init__(self):
+        self._by_owner = {}
+        self._by_key = {}
+
+    def add(self, contact):
+        """Ajoute ``contact`` ; False si le propriétaire l'a déjà."""
+        key = (contact["owner"], contact["name"])
+        if key in self._by_key:
+            return False
+        self._by_key[key] = contact
+        self._by_owner.setdefault(contact["owner"], []).append(contact)
+        return True
+
+    def get(self, owner, name):
+        return self._by_key.get((owner, name))
+
+    def of(self, owner):
+        return list(self._by_owner.get(owner, ()))
+
+    def __len__(self):
+        return len(self._by_key)
+
+
+def build_user_index(users):
+    """Utilisateurs par nom."""
+    return {u["username"]: u for u in users}
+
+
+def build_contact_index(contacts):
+    index = ContactIndex()
+    for c in contacts:
+        index.add(c)
+    return index
+
+
+class ActivityIndex:
+    """Compteurs par utilisateur et activité récente bornée, tenus à jour à l'écriture.
+
+    Les non-lus se comptent par conversation à partir d'un curseur de lecture
+    (identifiant du dernier message lu) ; ``counts()["unread"]`` additionne
+    ceux des contacts de l'utilisateur.
+    """
+
+    def __init__(self, contacts, recent=RECENT_ACTIVITY):
+        self._contacts = contacts
+        self._recent_size = recent
+        self._counts = {}
+        self._received_from = {}
+        self._read = {}
+        self._unread = {}
+        self._last_id = {}
+        self._recent = {}
+        self._seq = itertools.count()
+
+    def _user(self, user):
+        counts = self._counts.get(user)
+        if counts is None:
+            counts = self._counts[user] = {"sent": 0, "received": 0, "favorites": 0, "unread": 0}
+        return counts
+
+    def _push_recent(self, user, entry):
+        # Tas min borné : la racine est la plus ancienne des activités retenues
+        heap = self._recent.setdefault(user, [])
+        if len(heap) < self._recent_size:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def add_message(self, message):
+        sender, receiver = message["sender"], message["receiver"]
+        msg_id = message.get("id")
+        self._user(sender)["sent"] += 1
+        received = self._user(receiver)
+        received["received"] += 1
+        key = (receiver, sender)
+        self._received_from[key] = self._received_from.get(key, 0) + 1
+        if msg_id is None or msg_id > self._read.get(key, -1):
+            self._unread[key] = self._unread.get(key, 0) + 1
+            if self._contacts.get(receiver, sender) is not None:
+                received["unread"] += 1
+        if msg_id is not None:
+            pair = pair_key(sender, receiver)
+            self._last_id[pair] = max(self._last_id.get(pair, msg_id), msg_id)
+
+        entry = (message["timestamp"], next(self._seq), message)
+        self._push_recent(sender, entry)
+        if receiver != sender:
+            self._push_recent(receiver, entry)
+
+    def add_contact(self, contact):
+        counts = self._user(contact["owner"])
+        counts["unread"] += self._unread.get((contact["owner"], contact["name"]), 0)
+        if contact.get("favorite"):
+            counts["favorites"] += 1
+
+    def set_cursor(self, user, other, last_read_id):
+        """Curseur chargé depuis le store, avant les messages."""
+        self._read[(user, other)] = last_read_id
+
+    def mark_read(self, user, other, last_read_id):
+        """Lit toute la conversation : ``last_read_id`` est son dernier message."""
+        key = (user, other)
+        if last_read_id <= self._read.get(key, -1):
+            return
+        self._read[key] = last_read_id
+        unread = self._unread.pop(key, 0)
+        if unread and self._contacts.get(user, other) is not None:
+            self._user(user)["unread"] -= unread
+
+    def set_favorite(self, owner, was_favorite, favorite):
+        if bool(was_favorite) != bool(favorite):
+            self._user(owner)["favorites"] += 1 if favorite else -1
+
+    def counts(self, user):
+        return dict(self._counts.get(user) or {"sent": 0, "received": 0, "favorites": 0, "unread": 0})
+
+    def received_from(self, user, other):
+        return self._received_from.get((user, other), 0)
+
+    def unread(self, user, other):
+        return self._unread.get((user, other), 0)
+
+    def last_message_id(self, user, other):
+        return self._last_id.get(pair_key(user, other))
+
+    def recent(self, user, limit=RECENT_ACTIVITY):
+        """Derniers messages envoyés ou reçus, du plus récent au plus ancien."""
+        entries = sorted(self._recent.get(user, ()), reverse=True)
+        return [entry[2] for entry in entries[:limit]]
+
+
+def build_activity_index(messages, contacts, contact_index, read_cursors=()):
+    index = ActivityIndex(contact_index)
+    # Curseurs et contacts d'abord : les non-lus sont ensuite comptés message par message
+    for r in read_cursors:
+        index.set_cursor(r["user"], r["contact"], r["last_read_id"])
+    for c in contacts:
+        index.add_contact(c)
+    for m in messages:
+        index.add_message(m)
+    return index
@@ -0,0 +1,394 @@
+# llm.py
+"""Fournisseurs de modèles de langage et client partagé.
+
+Les fournisseurs sont asynchrones (un client HTTP à connexions réutilisées
+chacun) et interchangeables : OpenAI, Anthropic, ou un fournisseur local
+qui simule la latence pour mesurer le débit hors ligne.
+
+``LLMClient`` fait tourner le fournisseur sur une boucle asyncio dédiée et
+applique à chaque appel :
+
+- un sémaphore qui borne le nombre de requêtes en attente de réponse ;
+- une échéance (``timeout``) qui couvre toutes les tentatives ;
+- de nouvelles tentatives, avec attente exponentielle aléatoire, sur les
+  erreurs transitoires (réseau, 408/429/5xx).
+
+Le fournisseur est choisi par ``LLM_PROVIDER`` (openai, anthropic, mock) ;
+sans réglage, celui dont la clé API est présente dans l'environnement.
+"""
+import abc
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+LLM_MOCK_LATENCY = float(os.getenv("LLM_MOCK_LATENCY", 0.5))
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+_DONE = object()
+
+
+class LLMError(Exception):
+    """Échec d'un appel au modèle ; ``retryable`` si l'erreur est transitoire."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+async def _check(response):
+    if response.status_code >= 400:
+        await response.aread()
+        raise LLMError(
+            f"HTTP {response.status_code}: {response.text[:300]}",
+            retryable=response.status_code in RETRY_STATUS,
+        )
+
+
+async def _sse_data(response):
+    """Champs ``data:`` d'un flux server-sent events."""
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            yield line[5:].strip()
+
+
+class Provider(abc.ABC):
+    """Interface commune : ``complete`` renvoie le texte, ``stream`` le produit par morceaux.
+
+    ``messages`` suit le format chat [{"role", "content"}] ; les rôles
+    ``system`` sont adaptés par chaque fournisseur.
+    """
+    name = None
+    models = {}
+
+    def __init__(self):
+        self.models = {
+            "chat": os.getenv("LLM_CHAT_MODEL") or self.models["chat"],
+            "analysis": os.getenv("LLM_ANALYSIS_MODEL") or self.models["analysis"],
+        }
+
+    @abc.abstractmethod
+    async def complete(self, model, messages, max_tokens):
+        """Texte complet de la réponse."""
+
+    @abc.abstractmethod
+    def stream(self, model, messages, max_tokens):
+        """Générateur asynchrone des morceaux de texte de la réponse."""
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+    models = {"chat": "gpt-3.5-turbo", "analysis": "gpt-4"}
+
+    def __init__(self, api_key, base_url="https://api.openai.com/v1", connections=LLM_CONCURRENCY):
+        super().__init__()
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=None,
+        )
+
+    async def complete(self, model, messages, max_tokens):
+        response = await self.http.post(
+            "/chat/completions", json={"model": model, "messages": messages, "max_tokens": max_tokens}
+        )
+        await _check(response)
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, model, messages, max_tokens):
+        body = {"model": model, "messages": messages, "max_tokens": max_tokens, "stream": True}
+        async with self.http.stream("POST", "/chat/completions", json=body) as response:
+            await _check(response)
+            async for data in _sse_data(response):
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices")
+                if choices and choices[0]["delta"].get("content"):
+                    yield choices[0]["delta"]["content"]
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+    models = {"chat": "claude-3-5-haiku-latest", "analysis": "claude-3-5-sonnet-latest"}
+
+    def __init__(self, api_key, base_url="https://api.anthropic.com/v1", connections=LLM_CONCURRENCY):
+        super().__init__()
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"x-api-key": api_key, "anthropic-version": "2023-06-01"},
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=None,
+        )
+
+    def _body(self, model, messages, max_tokens):
+        body = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [m for m in messages if m["role"] != "system"],
+        }
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        if system:
+            body["system"] = system
+        return body
+
+    async def complete(self, model, messages, max_tokens):
+        response = await self.http.post("/messages", json=self._body(model, messages, max_tokens))
+        await _check(response)
+        return "".join(block["text"] for block in response.json()["content"] if block["type"] == "text")
+
+    async def stream(self, model, messages, max_tokens):
+        body = dict(self._body(model, messages, max_tokens), stream=True)
+        async with self.http.stream("POST", "/messages", json=body) as response:
+            await _check(response)
+            async for data in _sse_data(response):
+                event = json.loads(data)
+                if event["type"] == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                    yield event["delta"]["text"]
+                elif event["type"] == "message_stop":
+                    return
+                elif event["type"] == "error":
+                    error = event["error"]
+                    raise LLMError(error.get("message", "erreur"), retryable=error.get("type") == "overloaded_error")
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class MockProvider(Provider):
+    """Fournisseur local, sans réseau : latence et échecs simulés."""
+    name = "mock"
+    models = {"chat": "mock-chat", "analysis": "mock-analysis"}
+
+    def __init__(self, latency=LLM_MOCK_LATENCY, jitter=0.5, failure_rate=0.0, tokens_per_second=50):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.tokens_per_second = tokens_per_second
+
+    async def _wait(self):
+        await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        if random.random() < self.failure_rate:
+            raise LLMError("mock: échec simulé", retryable=True)
+
+    def _reply(self, messages):
+        system = " ".join(m["content"] for m in messages if m["role"] == "system").lower()
+        text = messages[-1]["content"]
+        if "sentiment" in system:
+            # Lot JSON {id: texte} ou message seul
+            try:
+                items = json.loads(text)
+            except ValueError:
+                return "neutre"
+            return json.dumps({key: "neutre" for key in items}) if isinstance(items, dict) else "neutre"
+        return f"Réponse simulée ({len(text)} caractères reçus)."
+
+    async def complete(self, model, messages, max_tokens):
+        await self._wait()
+        return self._reply(messages)
+
+    async def stream(self, model, messages, max_tokens):
+        await self._wait()
+        for word in self._reply(messages).split(" "):
+            yield word + " "
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+def _api_key(variable):
+    # Une valeur d'exemple non ASCII (« votre_clé_api_ici ») ne passerait pas
+    # dans un en-tête HTTP : elle compte comme absente
+    value = os.getenv(variable, "").strip()
+    return value if value and all(ord(c) < 128 for c in value) else None
+
+
+def make_provider(name=None):
+    """Fournisseur configuré, ou None si aucun n'est utilisable."""
+    # Lu à l'appel : le .env est chargé après l'import de ce module
+    name = (name or os.getenv("LLM_PROVIDER", "")).lower()
+    if not name:
+        if _api_key("OPENAI_API_KEY"):
+            name = "openai"
+        elif _api_key("ANTHROPIC_API_KEY"):
+            name = "anthropic"
+        else:
+            return None
+    if name == "mock":
+        return MockProvider()
+    if name not in ("openai", "anthropic"):
+        raise ValueError(f"Fournisseur IA inconnu : {name}")
+    if not HTTPX_AVAILABLE:
+        return None
+    if name == "openai":
+        api_key = _api_key("OPENAI_API_KEY")
+        return OpenAIProvider(api_key) if api_key else None
+    api_key = _api_key("ANTHROPIC_API_KEY")
+    return AnthropicProvider(api_key) if api_key else None
+
+
+class LLMClient:
+    """Exécute un fournisseur sur une boucle dédiée ; API synchrone et asynchrone."""
+
+    def __init__(self, provider, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, concurrency=LLM_CONCURRENCY):
+        self.provider = provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True).start()
+        self._semaphore = self._run(self._make_semaphore())
+
+    async def _make_semaphore(self):
+        # Créé sur la boucle du client (Python < 3.10 lie le sémaphore à la boucle courante)
+        return asyncio.Semaphore(self.concurrency)
+
+    @property
+    def models(self):
+        return self.provider.models
+
+    # ------------------------------
+    # Tentatives
+    # ------------------------------
+    def _failure(self, exc):
+        if isinstance(exc, LLMError):
+            return exc
+        if isinstance(exc, asyncio.TimeoutError):
+            return LLMError(f"{self.provider.name}: délai dépassé", retryable=True)
+        if HTTPX_AVAILABLE and isinstance(exc, httpx.TransportError):
+            return LLMError(f"{self.provider.name}: {exc!r}", retryable=True)
+        return None
+
+    async def _backoff(self, error, attempt, deadline):
+        """Attend avant la tentative suivante, ou relève ``error`` s'il n'y en a plus."""
+        if not error.retryable or attempt >= self.max_retries:
+            raise error
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise error
+        await asyncio.sleep(delay)
+
+    async def acomplete(self, model, messages, max_tokens, timeout=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(
+                        self.provider.complete(model, messages, max_tokens), deadline - time.monotonic()
+                    )
+            except Exception as exc:
+                error = self._failure(exc)
+                if error is None:
+                    raise
+            await self._backoff(error, attempt, deadline)
+            attempt += 1
+
+    async def astream(self, model, messages, max_tokens, timeout=None):
+        """Texte par morceaux.
+
+        L'échéance porte sur le premier morceau (tentatives comprises) ; ensuite
+        ``timeout`` borne l'attente entre deux morceaux. Une fois le premier
+        morceau produit, une erreur n'est plus retentée.
+
+        Le sémaphore n'est tenu que jusqu'au premier morceau : un flux lu
+        lentement (ou abandonné sans être fermé) ne bloque pas les autres
+        appels.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            parts = self.provider.stream(model, messages, max_tokens)
+            try:
+                async with self._semaphore:
+                    first = await asyncio.wait_for(parts.__anext__(), deadline - time.monotonic())
+                break
+            except StopAsyncIteration:
+                return
+            except Exception as exc:
+                await parts.aclose()
+                error = self._failure(exc)
+                if error is None:
+                    raise
+            await self._backoff(error, attempt, deadline)
+            attempt += 1
+
+        try:
+            yield first
+            while True:
+                try:
+                    part = await asyncio.wait_for(parts.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                except Exception as exc:
+                    raise self._failure(exc) or exc
+                yield part
+        finally:
+            await parts.aclose()
+
+    # ------------------------------
+    # Façade synchrone (threads Streamlit, workers)
+    # ------------------------------
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def complete(self, model, messages, max_tokens, timeout=None):
+        return self._run(self.acomplete(model, messages, max_tokens, timeout))
+
+    def stream(self, model, messages, max_tokens, timeout=None):
+        parts = self.astream(model, messages, max_tokens, timeout)
+
+        async def step():
+            try:
+                return await parts.__anext__()
+            except StopAsyncIteration:
+                return _DONE
+
+        try:
+            while True:
+                part = self._run(step())
+                if part is _DONE:
+                    return
+                yield part
+        finally:
+            # Fermer le générateur ferme aussi la réponse HTTP en cours
+            self._run(parts.aclose())
+
+    def close(self):
+        self._run(self.provider.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client partagé par tout le processus, ou None si l'IA n'est pas configurée."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            provider = make_provider()
+            if provider is not None:
+                _client = LLMClient(provider)
+        return _client
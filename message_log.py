@@ -0,0 +1,378 @@
+# message_log.py
+"""Journal de messages append-only, découpé en segments JSON lines.
+
+Chaque message est une ligne JSON ajoutée au segment actif puis fsync'ée :
+un envoi coûte une écriture, quelle que soit la taille de l'historique.
+Un index en mémoire (paire d'utilisateurs -> positions dans les segments,
+triées par horodatage) permet de relire une conversation sans parcourir
+tout le journal.
+
+Quand le segment actif dépasse ``segment_max_bytes`` il est scellé et un
+thread de fond le compacte : les lignes sont regroupées par conversation
+pour que la lecture d'un fil soit séquentielle sur le disque.
+
+Avec une clé maîtresse (crypto.py), le champ ``content`` est chiffré avant
+l'écriture ; la compaction recopie les lignes sans les déchiffrer.
+"""
+import argparse
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from crypto import TEXT_PREFIX, aad, get_keyring
+from indexes import ConversationIndex, pair_key
+
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+SEGMENT_SUFFIX = ".jsonl"
+COMPACT_SUFFIX = ".compact.jsonl"
+
+
+def _fsync_dir(directory):
+    # Rend durables les créations / renommages de fichiers (POSIX uniquement)
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _record_key(record):
+    return record.get("sender"), record.get("receiver"), record.get("timestamp"), record.get("content")
+
+
+def _is_plain(record):
+    content = record.get("content")
+    return isinstance(content, str) and not content.startswith(TEXT_PREFIX)
+
+
+class MessageLog:
+    """Journal segmenté avec index des offsets par conversation."""
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES, background=True, keyring=None):
+        self.directory = Path(directory)
+        self._cipher = (keyring if keyring is not None else get_keyring()).cipher("messages")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.background = background
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._segments = {}   # id -> chemin du fichier
+        self._index = ConversationIndex()  # paire -> [(segment_id, offset), ...]
+        self._scan()
+
+    # ------------------------------
+    # Ouverture / index
+    # ------------------------------
+    def _segment_path(self, seg_id, compacted=False):
+        suffix = COMPACT_SUFFIX if compacted else SEGMENT_SUFFIX
+        return self.directory / f"{seg_id:08d}{suffix}"
+
+    def _scan(self):
+        for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            seg_id = int(path.name.split(".", 1)[0])
+            if path.name.endswith(COMPACT_SUFFIX):
+                # Une compaction interrompue peut laisser les deux versions
+                raw = self._segment_path(seg_id)
+                if raw.exists():
+                    raw.unlink()
+                self._segments[seg_id] = path
+            elif seg_id not in self._segments:
+                self._segments[seg_id] = path
+
+        for seg_id in sorted(self._segments):
+            for offset, record in self._read_segment(seg_id, repair=True):
+                self._index_record(seg_id, offset, record)
+
+        if not self._segments:
+            self._segments[1] = self._segment_path(1)
+            self._segments[1].touch()
+            _fsync_dir(self.directory)
+        self._active = max(self._segments)
+
+        # Segments scellés mais jamais compactés (arrêt avant la fin du thread)
+        for seg_id in sorted(self._segments):
+            if seg_id != self._active and not self._segments[seg_id].name.endswith(COMPACT_SUFFIX):
+                self._schedule_compaction()
+                break
+
+    def _read_segment(self, seg_id, repair=False):
+        path = self._segments[seg_id]
+        good = 0
+        with open(path, "rb") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # Dernière ligne incomplète : écriture interrompue
+                    break
+                good = f.tell()
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    continue
+        if repair and good < path.stat().st_size:
+            with open(path, "r+b") as f:
+                f.truncate(good)
+                os.fsync(f.fileno())
+
+    def _seal(self, record):
+        if not self._cipher.enabled or "content" not in record:
+            return record
+        ad = aad(record["sender"], record["receiver"], record.get("timestamp", ""))
+        return {**record, "content": self._cipher.encrypt_text(record["content"], ad)}
+
+    def _open(self, record):
+        if "content" not in record:
+            return record
+        ad = aad(record["sender"], record["receiver"], record.get("timestamp", ""))
+        record["content"] = self._cipher.decrypt_text(record["content"], ad)
+        return record
+
+    def _index_record(self, seg_id, offset, record):
+        self._index.add(record["sender"], record["receiver"], record.get("timestamp", ""), (seg_id, offset))
+
+    # ------------------------------
+    # Écriture
+    # ------------------------------
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        """Ajoute des messages au segment actif avec un seul fsync."""
+        with self._lock:
+            f = open(self._segments[self._active], "ab")
+            try:
+                for record in records:
+                    line = (json.dumps(self._seal(record), ensure_ascii=False) + "\n").encode("utf-8")
+                    if f.tell() > 0 and f.tell() + len(line) > self.segment_max_bytes:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        self._roll()
+                        f = open(self._segments[self._active], "ab")
+                    offset = f.tell()
+                    f.write(line)
+                    self._index_record(self._active, offset, record)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+
+    def _roll(self):
+        self._active += 1
+        self._segments[self._active] = self._segment_path(self._active)
+        self._segments[self._active].touch()
+        _fsync_dir(self.directory)
+        self._schedule_compaction()
+
+    # ------------------------------
+    # Lecture
+    # ------------------------------
+    def conversation(self, user1, user2):
+        """Messages échangés entre deux utilisateurs, triés par horodatage."""
+        with self._lock:
+            entries = self._index.get(user1, user2)
+            result = []
+            f, current = None, None
+            try:
+                for seg_id, offset in entries:
+                    if seg_id != current:
+                        if f:
+                            f.close()
+                        f, current = open(self._segments[seg_id], "rb"), seg_id
+                    f.seek(offset)
+                    result.append(self._open(json.loads(f.readline())))
+            finally:
+                if f:
+                    f.close()
+            return result
+
+    def records(self):
+        """Tous les messages, dans l'ordre d'envoi."""
+        with self._lock:
+            segments = sorted(self._segments)
+            result = []
+            for seg_id in segments:
+                records = [self._open(record) for _, record in self._read_segment(seg_id)]
+                if self._segments[seg_id].name.endswith(COMPACT_SUFFIX):
+                    # Segment compacté : lignes groupées par conversation, l'horodatage
+                    # rétablit l'ordre d'envoi (tri stable, l'ordre d'un fil est conservé)
+                    records.sort(key=lambda r: r.get("timestamp", ""))
+                result.extend(records)
+            return result
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    # ------------------------------
+    # Compaction
+    # ------------------------------
+    def _schedule_compaction(self):
+        if not self.background:
+            self.compact()
+            return
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name="message-log-compactor", daemon=True)
+        self._compactor.start()
+
+    def compact(self):
+        """Regroupe par conversation les lignes des segments scellés."""
+        while True:
+            with self._lock:
+                pending = [
+                    seg_id for seg_id in sorted(self._segments)
+                    if seg_id != self._active and not self._segments[seg_id].name.endswith(COMPACT_SUFFIX)
+                ]
+            if not pending:
+                return
+            self._compact_segment(pending[0])
+
+    def _compact_segment(self, seg_id):
+        # Le segment est scellé : on peut le lire sans bloquer les envois
+        groups = {}
+        for offset, record in self._read_segment(seg_id):
+            groups.setdefault(pair_key(record["sender"], record["receiver"]), []).append((offset, record))
+
+        target = self._segment_path(seg_id, compacted=True)
+        tmp = target.with_name(target.name + ".tmp")
+        moved = {}
+        with open(tmp, "wb") as f:
+            for records in groups.values():
+                for offset, record in records:
+                    moved[offset] = f.tell()
+                    f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            os.replace(tmp, target)
+            _fsync_dir(self.directory)
+            raw = self._segments[seg_id]
+            self._segments[seg_id] = target
+            self._index.remap(
+                groups.keys(),
+                lambda entry: (seg_id, moved[entry[1]]) if entry[0] == seg_id else entry,
+            )
+            raw.unlink()
+
+    @contextmanager
+    def _exclusive(self):
+        # Verrou pris sans compaction en cours : elle réécrirait un segment d'après son ancien contenu
+        while True:
+            if self._compactor:
+                self._compactor.join()
+            self._lock.acquire()
+            if not (self._compactor and self._compactor.is_alive()):
+                break
+            self._lock.release()
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    # ------------------------------
+    # Chiffrement de l'existant
+    # ------------------------------
+    def encrypt_existing(self):
+        """Réécrit les segments dont des messages sont en clair ; renvoie le nombre de messages chiffrés."""
+        if not self._cipher.enabled:
+            return 0
+        count = 0
+        with self._exclusive():
+            for seg_id in sorted(self._segments):
+                records = [record for _, record in self._read_segment(seg_id)]
+                plain = sum(1 for r in records if _is_plain(r))
+                if not plain:
+                    continue
+                path = self._segments[seg_id]
+                tmp = path.with_name(path.name + ".tmp")
+                with open(tmp, "wb") as f:
+                    for record in records:
+                        if _is_plain(record):
+                            record = self._seal(record)
+                        f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+                _fsync_dir(self.directory)
+                count += plain
+            if count:
+                # Les lignes ont changé de longueur : offsets à recalculer
+                self._index = ConversationIndex()
+                for seg_id in sorted(self._segments):
+                    for offset, record in self._read_segment(seg_id):
+                        self._index_record(seg_id, offset, record)
+        return count
+
+    # ------------------------------
+    # Import / réécriture
+    # ------------------------------
+    def import_json(self, path):
+        """Importe un ancien fichier messages.json (liste JSON) dans le journal ; renvoie le nombre ajouté.
+
+        Les messages déjà présents (import interrompu avant le renommage du
+        fichier) ne sont pas ajoutés une seconde fois.
+        """
+        path = Path(path)
+        messages = json.loads(path.read_text())
+        present = Counter(map(_record_key, self.records()))
+        added = []
+        for message in messages:
+            key = _record_key(message)
+            if present[key]:
+                present[key] -= 1
+            else:
+                added.append(message)
+        self.extend(added)
+        path.rename(path.with_name(path.name + ".imported"))
+        return len(added)
+
+    def replace(self, records):
+        """Remplace tout le journal par ``records`` (réécriture complète, usage exceptionnel).
+
+        Les nouveaux segments sont écrits avant la suppression des anciens : un
+        arrêt entre les deux laisse les deux versions, jamais aucune.
+        """
+        with self._exclusive():
+            old = list(self._segments.values())
+            self._active = max(self._segments) + 1
+            self._segments = {self._active: self._segment_path(self._active)}
+            self._segments[self._active].touch()
+            self._index = ConversationIndex()
+            self.extend(records)
+            _fsync_dir(self.directory)
+            for path in old:
+                path.unlink()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Journal de messages Collabo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Importer un fichier messages.json")
+    imp.add_argument("source")
+    imp.add_argument("--dir", default=os.getenv("MESSAGES_LOG_DIR", "messages_log"))
+    sub.add_parser("compact", help="Compacter les segments scellés").add_argument(
+        "--dir", default=os.getenv("MESSAGES_LOG_DIR", "messages_log")
+    )
+    args = parser.parse_args(argv)
+
+    log = MessageLog(args.dir, background=False)
+    if args.command == "import":
+        count = log.import_json(args.source)
+        print(f"✅ {count} messages importés dans {args.dir}")
+    else:
+        log.compact()
+        print("✅ Compaction terminée")
+
+
+if __name__ == "__main__":
+    main()
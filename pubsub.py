@@ -0,0 +1,213 @@
+# pubsub.py
+"""Diffusion des nouveaux messages aux sessions ouvertes.
+
+Chaque session s'abonne aux canaux qui la concernent (son fil ouvert, sa
+boîte de réception) ; une écriture publie un petit événement sur ces canaux
+et seules les sessions abonnées le reçoivent, dans une file en mémoire. La
+page n'a plus qu'à lire sa file pour savoir si le fil affiché doit être
+redessiné, sans interroger la base.
+
+Entre plusieurs processus, un courtier optionnel (``PUBSUB_BROKER=sqlite``)
+relaie les événements par une table de la base partagée : un seul thread par
+processus la lit, quel que soit le nombre de sessions.
+"""
+import json
+import os
+import threading
+import uuid
+import weakref
+from collections import deque
+
+from indexes import pair_key
+
+PUBSUB_BROKER = os.getenv("PUBSUB_BROKER", "")
+BROKER_POLL_INTERVAL = float(os.getenv("PUBSUB_POLL_INTERVAL", 0.5))
+# Événements conservés dans la table du courtier (les plus anciens sont purgés)
+BROKER_KEEP = 10000
+SUBSCRIPTION_BUFFER = 200
+
+BROKER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pubsub_events (
+    id INTEGER PRIMARY KEY,
+    origin TEXT NOT NULL,
+    channels TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+
+def thread_channel(u1, u2):
+    return "thread:" + "|".join(pair_key(u1, u2))
+
+
+def user_channel(user):
+    return f"user:{user}"
+
+
+def message_event(message):
+    """Événement publié pour un message : ses deux participants et le fil."""
+    event = {
+        "type": "message",
+        "id": message.get("id"),
+        "sender": message["sender"],
+        "receiver": message["receiver"],
+        "timestamp": message["timestamp"],
+    }
+    channels = [thread_channel(message["sender"], message["receiver"]), user_channel(message["receiver"])]
+    return channels, event
+
+
+class Subscription:
+    """File d'événements d'une session ; libérée avec elle (références faibles)."""
+
+    def __init__(self, pubsub, maxlen=SUBSCRIPTION_BUFFER):
+        self._pubsub = pubsub
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.channels = frozenset()
+
+    def listen(self, *channels):
+        """Remplace les canaux écoutés ; ne fait rien s'ils n'ont pas changé."""
+        channels = frozenset(channels)
+        if channels != self.channels:
+            self._pubsub._rebind(self, channels)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            self._events.append((channel, event))
+
+    def poll(self):
+        """Événements reçus depuis le dernier appel, sous forme de (canal, événement)."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def close(self):
+        self._pubsub._rebind(self, frozenset())
+
+
+class PubSub:
+    """Canaux en mémoire du processus, relayés par ``broker`` s'il est fourni.
+
+    ``on_remote`` est appelé avant la distribution de chaque lot d'événements
+    venus d'un autre processus (par exemple pour recharger un cache).
+    """
+
+    def __init__(self, broker=None, on_remote=None):
+        self._lock = threading.Lock()
+        self._channels = {}   # canal -> WeakSet des abonnements
+        self.broker = broker
+        self.on_remote = on_remote
+        if broker is not None:
+            broker.start(self._receive)
+
+    def subscribe(self, *channels):
+        subscription = Subscription(self)
+        subscription.listen(*channels)
+        return subscription
+
+    def _rebind(self, subscription, channels):
+        with self._lock:
+            for channel in subscription.channels - channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+            for channel in channels - subscription.channels:
+                self._channels.setdefault(channel, weakref.WeakSet()).add(subscription)
+            subscription.channels = channels
+
+    def subscribers(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+    def publish(self, channels, event, source=None):
+        """Diffuse ``event`` ; l'abonnement ``source`` (la session qui écrit) ne le reçoit pas."""
+        self._dispatch(channels, event, source)
+        if self.broker is not None:
+            self.broker.publish(channels, event)
+
+    def _dispatch(self, channels, event, source=None):
+        # Un abonnement présent sur plusieurs canaux ne reçoit l'événement qu'une fois
+        with self._lock:
+            targets = {}
+            for channel in channels:
+                for subscription in self._channels.get(channel, ()):
+                    if subscription is not source:
+                        targets.setdefault(subscription, channel)
+        for subscription, channel in targets.items():
+            subscription._deliver(channel, event)
+
+    def _receive(self, batch):
+        if self.on_remote is not None:
+            self.on_remote()
+        for channels, event in batch:
+            self._dispatch(channels, event)
+
+    def close(self):
+        if self.broker is not None:
+            self.broker.close()
+
+
+class SQLiteBroker:
+    """Courtier local : table d'événements partagée, lue par un thread par processus."""
+
+    def __init__(self, pool, interval=BROKER_POLL_INTERVAL, keep=BROKER_KEEP):
+        self.pool = pool
+        self.interval = interval
+        self.keep = keep
+        self.origin = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._thread = None
+        with pool.exclusive() as conn:
+            conn.executescript(BROKER_SCHEMA)
+        # Seuls les événements publiés après le démarrage sont relayés
+        with pool.read() as conn:
+            self._last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM pubsub_events").fetchone()[0]
+
+    def publish(self, channels, event):
+        with self.pool.write() as conn:
+            cur = conn.execute(
+                "INSERT INTO pubsub_events (origin, channels, payload) VALUES (?,?,?)",
+                (self.origin, json.dumps(list(channels)), json.dumps(event, ensure_ascii=False)),
+            )
+            conn.execute("DELETE FROM pubsub_events WHERE id <= ?", (cur.lastrowid - self.keep,))
+
+    def start(self, receive):
+        self._thread = threading.Thread(target=self._run, args=(receive,), name="pubsub-broker", daemon=True)
+        self._thread.start()
+
+    def _run(self, receive):
+        while not self._stop.wait(self.interval):
+            try:
+                batch = self.poll()
+            except Exception:
+                # Base momentanément verrouillée : nouvel essai au prochain tour
+                continue
+            if batch:
+                receive(batch)
+
+    def poll(self):
+        """Événements publiés par les autres processus depuis la dernière lecture."""
+        with self.pool.read() as conn:
+            rows = conn.execute(
+                "SELECT id, origin, channels, payload FROM pubsub_events WHERE id > ? ORDER BY id",
+                (self._last,),
+            ).fetchall()
+        if not rows:
+            return []
+        self._last = rows[-1][0]
+        return [(json.loads(r[2]), json.loads(r[3])) for r in rows if r[1] != self.origin]
+
+    def close(self):
+        self._stop.set()
+
+
+def make_pubsub(pool=None, on_remote=None, broker=None):
+    """PubSub du processus ; relayé par la base si ``PUBSUB_BROKER=sqlite``."""
+    broker = PUBSUB_BROKER if broker is None else broker
+    if broker == "sqlite" and pool is not None:
+        return PubSub(SQLiteBroker(pool), on_remote=on_remote)
+    return PubSub(on_remote=on_remote)
@@ -0,0 +1,101 @@
+# qr_cache.py
+"""Images QR des contacts, mises en cache.
+
+La clé est la charge utile ``collabo://add/<username>`` : un même contact
+n'est encodé qu'une fois. Les PNG récemment servis restent en mémoire
+(LRU borné en octets) ; si ``QR_CACHE_DIR`` est défini, ils sont aussi
+écrits sur disque et survivent aux redémarrages.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+try:
+    import qrcode
+    QRCODE_AVAILABLE = True
+except ImportError:
+    QRCODE_AVAILABLE = False
+
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", "")
+QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+
+
+def qr_payload(username):
+    return f"collabo://add/{username}"
+
+
+def render_qr(payload):
+    """PNG du QR code de ``payload``."""
+    qr = qrcode.QRCode(version=1, box_size=6, border=2)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="#667eea", back_color="white")
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class QRCache:
+    """PNG par charge utile : LRU en mémoire, puis disque (optionnel), puis rendu."""
+
+    def __init__(self, directory=QR_CACHE_DIR, max_bytes=QR_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, payload):
+        return os.path.join(self.directory, hashlib.sha256(payload.encode("utf-8")).hexdigest() + ".png")
+
+    def get(self, payload):
+        """PNG de ``payload``, ou None si qrcode n'est pas installé."""
+        with self._lock:
+            png = self._items.get(payload)
+            if png is not None:
+                self._items.move_to_end(payload)
+                return png
+
+        png = self._load(payload)
+        if png is None:
+            if not QRCODE_AVAILABLE:
+                return None
+            png = render_qr(payload)
+            self._save(payload, png)
+        self._remember(payload, png)
+        return png
+
+    def _load(self, payload):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(payload), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _save(self, payload, png):
+        if not self.directory:
+            return
+        path = self._path(payload)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+
+    def _remember(self, payload, png):
+        with self._lock:
+            if payload in self._items:
+                return
+            self._items[payload] = png
+            self._bytes += len(png)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,238 @@
+# search.py
+"""Recherche plein texte : index inversé en mémoire, classement BM25.
+
+Chaque document (message, contact, points clés d'une analyse IA) est
+visible par un ou plusieurs utilisateurs, et les listes de postings sont
+partitionnées par utilisateur : une requête ne parcourt que les documents
+de celui qui cherche, quel que soit le volume total de l'instance.
+
+Les mots sont comparés en minuscules et sans accents ; le dernier mot de
+la requête est aussi cherché comme préfixe (recherche au fil de la frappe).
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_EXPANSION = 20
+# Réécriture des postings d'un utilisateur quand ses documents supprimés
+# dépassent cette part de ses documents vivants
+COMPACT_RATIO = 0.25
+COMPACT_MIN = 64
+
+_WORD = re.compile(r"\w+")
+# Un posting tient sur un entier : numéro de document << 16 | fréquence du terme.
+# La plupart des termes d'un utilisateur n'apparaissent que dans un document :
+# la liste est alors cet entier seul, et devient un array au second document.
+_TF_BITS = 16
+_TF_MASK = (1 << _TF_BITS) - 1
+
+
+def tokenize(text):
+    """Mots en minuscules, sans accents."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _WORD.findall(text)
+
+
+class _Partition:
+    """Postings d'un utilisateur, avec les statistiques BM25 de sa collection."""
+    __slots__ = ("postings", "count", "total_length", "dead", "_vocabulary")
+
+    def __init__(self):
+        self.postings = {}
+        self.count = 0
+        self.total_length = 0
+        self.dead = 0              # documents supprimés encore présents dans les postings
+        self._vocabulary = None
+
+    def vocabulary(self):
+        # Termes triés pour la recherche par préfixe, recalculés après ajout de termes
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+
+class SearchIndex:
+    """Index inversé incrémental ; les documents sont identifiés par (kind, key)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = []            # numéro -> (kind, item, users)
+        self._lengths = array("I")
+        self._keys = {}            # (kind, key) -> numéro
+        self._deleted = set()
+        self._partitions = {}      # utilisateur -> _Partition
+        self._terms = {}           # une seule copie de chaque terme pour toutes les partitions
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, kind, key, text, users, item):
+        """Indexe ``text`` pour ``users`` ; remplace un document de même (kind, key)."""
+        terms = Counter(tokenize(text))
+        users = tuple(set(users))
+        with self._lock:
+            old = self._keys.pop((kind, key), None)
+            if old is not None:
+                self._remove(old)
+            if not terms:
+                return
+            num = len(self._docs)
+            length = sum(terms.values())
+            self._docs.append((kind, item, users))
+            self._lengths.append(length)
+            self._keys[(kind, key)] = num
+            terms = {self._terms.setdefault(term, term): tf for term, tf in terms.items()}
+            for user in users:
+                partition = self._partitions.get(user)
+                if partition is None:
+                    partition = self._partitions[user] = _Partition()
+                partition.count += 1
+                partition.total_length += length
+                postings = partition.postings
+                for term, tf in terms.items():
+                    posting = num << _TF_BITS | min(tf, _TF_MASK)
+                    current = postings.get(term)
+                    if current is None:
+                        postings[term] = posting
+                        partition._vocabulary = None
+                    elif type(current) is int:
+                        postings[term] = array("Q", (current, posting))
+                    else:
+                        current.append(posting)
+
+    def remove(self, kind, key):
+        with self._lock:
+            num = self._keys.pop((kind, key), None)
+            if num is not None:
+                self._remove(num)
+
+    def _remove(self, num):
+        # Suppression logique : les postings sont ignorés à la lecture, puis
+        # retirés quand la partition en accumule trop
+        self._deleted.add(num)
+        for user in self._docs[num][2]:
+            partition = self._partitions[user]
+            partition.count -= 1
+            partition.total_length -= self._lengths[num]
+            partition.dead += 1
+            if partition.dead >= max(COMPACT_MIN, partition.count * COMPACT_RATIO):
+                self._compact(partition)
+
+    def _compact(self, partition):
+        deleted = self._deleted
+        postings = {}
+        for term, current in partition.postings.items():
+            if type(current) is int:
+                if current >> _TF_BITS not in deleted:
+                    postings[term] = current
+                continue
+            live = [p for p in current if p >> _TF_BITS not in deleted]
+            if len(live) > 1:
+                postings[term] = array("Q", live)
+            elif live:
+                postings[term] = live[0]
+        partition.postings = postings
+        partition.dead = 0
+        partition._vocabulary = None
+
+    def _expand(self, partition, prefix):
+        vocabulary = partition.vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        terms = []
+        for term in vocabulary[start:start + PREFIX_EXPANSION]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, user, query, kinds=None, limit=20):
+        """Documents visibles par ``user``, du plus pertinent au moins pertinent.
+
+        Renvoie une liste de dicts {"kind", "item", "score"}.
+        """
+        words = tokenize(query)
+        partition = self._partitions.get(user)
+        if not words or partition is None or partition.count <= 0:
+            return []
+
+        terms = set(words[:-1])
+        terms.update(self._expand(partition, words[-1]) or [words[-1]])
+
+        avgdl = partition.total_length / partition.count
+        lengths = self._lengths
+        deleted = self._deleted
+        k1 = BM25_K1
+        scores = {}
+        for term in terms:
+            postings = partition.postings.get(term)
+            if postings is None:
+                continue
+            if type(postings) is int:
+                postings = (postings,)
+            if partition.dead:
+                # df ne compte que les documents vivants : l'idf ne dérive pas
+                # au fil des modifications et suppressions
+                postings = [p for p in postings if p >> _TF_BITS not in deleted]
+                if not postings:
+                    continue
+            df = len(postings)
+            idf = math.log(1 + (partition.count - df + 0.5) / (df + 0.5))
+            for posting in postings:
+                num = posting >> _TF_BITS
+                tf = posting & _TF_MASK
+                norm = k1 * (1 - BM25_B + BM25_B * lengths[num] / avgdl)
+                scores[num] = scores.get(num, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        docs = self._docs
+        best = heapq.nlargest(limit, (
+            (score, num) for num, score in scores.items()
+            if kinds is None or docs[num][0] in kinds
+        ))
+        return [{"kind": docs[num][0], "item": docs[num][1], "score": score} for score, num in best]
+
+
+# ------------------------------
+# Documents de l'application
+# ------------------------------
+def index_message(index, message):
+    index.add("message", message["id"], message["text"], (message["sender"], message["receiver"]), message)
+
+
+def index_contact(index, contact, key=None):
+    text = " ".join(contact.get(field) or "" for field in ("name", "domain", "occasion", "notes"))
+    key = key if key is not None else (contact["owner"], contact["name"])
+    index.add("contact", key, text, (contact["owner"],), contact)
+
+
+def analysis_text(analysis):
+    """Points clés d'une analyse de conversation, ou texte d'un résumé."""
+    result = analysis.get("result")
+    if isinstance(result, dict):
+        return " · ".join(str(point) for point in result.get("key_points", []))
+    return result if isinstance(result, str) else ""
+
+
+def index_analysis(index, analysis):
+    # Les analyses de sentiment (sans propriétaire ni texte) ne sont pas indexées
+    if "owner" in analysis:
+        index.add("analysis", analysis["id"], analysis_text(analysis), (analysis["owner"],), analysis)
+
+
+def build_search_index(data):
+    index = SearchIndex()
+    for message in data["messages"]:
+        index_message(index, message)
+    for contact in data["contacts"]:
+        index_contact(index, contact)
+    for analysis in data["ai_analyses"]:
+        index_analysis(index, analysis)
+    return index
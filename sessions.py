@@ -0,0 +1,169 @@
+# sessions.py
+"""Sessions de connexion : jeton signé, stockage côté serveur, révocation.
+
+Après une connexion réussie, un jeton ``<id>.<expiration>.<signature>``
+(HMAC-SHA256) est placé dans l'URL (``?session=...``). Un rafraîchissement
+du navigateur le présente de nouveau : il suffit de vérifier la signature et
+de retrouver la session, sans refaire le calcul scrypt du mot de passe.
+
+Le jeton de l'URL ne sert qu'une fois : à la reprise, ``rotate`` le révoque
+et en émet un nouveau. Une URL recopiée (historique, lien partagé) ne vaut
+donc plus rien dès que son titulaire a rafraîchi la page, et au plus tard
+après ``SESSION_TTL`` secondes (12 heures par défaut).
+
+La table ``sessions`` fait foi (expiration, révocation à la déconnexion).
+Les exécutions suivantes du script contrôlent le jeton courant avec
+``validate``, sans écriture : un cache en mémoire évite de relire la table
+à chaque fois, et une révocation faite par un autre processus (déconnexion
+dans un autre onglet) est vue au plus tard après ``SESSION_CACHE_TTL``
+secondes.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 12 * 3600))
+SESSION_CACHE_TTL = 30
+SESSION_CACHE_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    revoked INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username);
+CREATE TABLE IF NOT EXISTS session_secret (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    secret BLOB NOT NULL
+);
+"""
+
+
+class SessionManager:
+    """Création, validation et révocation des jetons de session."""
+
+    def __init__(self, pool, secret=None, ttl=SESSION_TTL, cache_ttl=SESSION_CACHE_TTL, cache_size=SESSION_CACHE_SIZE):
+        self.pool = pool
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # id -> (username, expiration, revérification)
+        self._lock = threading.Lock()
+        with pool.exclusive() as conn:
+            conn.executescript(SCHEMA)
+        self._secret = secret or os.getenv("COLLABO_SESSION_SECRET", "").encode("utf-8") or self._stored_secret()
+
+    def _stored_secret(self):
+        # Clé tirée au premier lancement et partagée par tous les processus de la base
+        with self.pool.write() as conn:
+            conn.execute("INSERT OR IGNORE INTO session_secret (id, secret) VALUES (1, ?)", (secrets.token_bytes(32),))
+            return conn.execute("SELECT secret FROM session_secret WHERE id = 1").fetchone()[0]
+
+    def _sign(self, session_id, expires):
+        digest = hmac.new(self._secret, f"{session_id}.{expires}".encode("ascii"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+    def create(self, username):
+        """Ouvre une session pour ``username`` et renvoie son jeton."""
+        with self.pool.write() as conn:
+            return self._open(conn, username)
+
+    def _open(self, conn, username):
+        session_id = secrets.token_urlsafe(18)
+        now = time.time()
+        expires = int(now + self.ttl)
+        conn.execute(
+            "INSERT INTO sessions (id, username, created_at, expires_at) VALUES (?,?,?,?)",
+            (session_id, username, now, expires),
+        )
+        self._remember(session_id, username, expires)
+        return f"{session_id}.{expires}.{self._sign(session_id, expires)}"
+
+    def rotate(self, token):
+        """Échange un jeton valide contre un nouveau : ``(utilisateur, jeton)``, ou None.
+
+        L'ancien jeton est révoqué dans la même transaction : présenté deux
+        fois, il n'ouvre qu'une seule session.
+        """
+        session_id = self._parse(token)
+        if session_id is None:
+            return None
+        with self._lock:
+            self._cache.pop(session_id, None)
+        with self.pool.write() as conn:
+            cur = conn.execute(
+                "UPDATE sessions SET revoked = 1 WHERE id = ? AND revoked = 0 AND expires_at >= ?",
+                (session_id, time.time()),
+            )
+            if not cur.rowcount:
+                return None
+            username = conn.execute("SELECT username FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+            return username, self._open(conn, username)
+
+    def _parse(self, token):
+        # Signature et expiration vérifiées avant toute lecture : un jeton forgé ne coûte qu'un HMAC.
+        # Un jeton non ASCII (UnicodeEncodeError est une ValueError) est refusé avant
+        # l'encodage de _sign et la comparaison, qui n'acceptent que l'ASCII
+        try:
+            token.encode("ascii")
+            session_id, expires, signature = token.split(".")
+            expires = int(expires)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(session_id, expires)) or expires < time.time():
+            return None
+        return session_id
+
+    def validate(self, token):
+        """Utilisateur de la session, ou None si le jeton est invalide, expiré ou révoqué."""
+        session_id = self._parse(token)
+        if session_id is None:
+            return None
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[2] > now:
+                self._cache.move_to_end(session_id)
+                return cached[0] if cached[1] > now else None
+
+        with self.pool.read() as conn:
+            row = conn.execute(
+                "SELECT username, expires_at FROM sessions WHERE id = ? AND revoked = 0", (session_id,)
+            ).fetchone()
+        if row is None or row[1] < now:
+            with self._lock:
+                self._cache.pop(session_id, None)
+            return None
+        self._remember(session_id, row[0], row[1])
+        return row[0]
+
+    def _remember(self, session_id, username, expires):
+        with self._lock:
+            self._cache[session_id] = (username, expires, time.time() + self.cache_ttl)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def revoke(self, token):
+        """Ferme la session du jeton (déconnexion)."""
+        session_id = self._parse(token)
+        if session_id is None:
+            return
+        with self._lock:
+            self._cache.pop(session_id, None)
+        with self.pool.write() as conn:
+            conn.execute("UPDATE sessions SET revoked = 1 WHERE id = ?", (session_id,))
+
+    def purge(self):
+        """Supprime les sessions expirées ou révoquées ; renvoie leur nombre."""
+        with self.pool.write() as conn:
+            cur = conn.execute("DELETE FROM sessions WHERE revoked = 1 OR expires_at < ?", (time.time(),))
+        return cur.rowcount
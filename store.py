@@ -0,0 +1,612 @@
+# store.py
+"""Stockage transactionnel (SQLite, mode WAL) des données de streamlit_app.
+
+Remplace la réécriture complète de data.json : chaque action de l'interface
+(inscription, ajout de contact, favori, envoi de message) devient une
+écriture ciblée d'une ligne, et plusieurs sessions peuvent écrire en même
+temps sans écraser les modifications des autres.
+
+Si une clé maîtresse est configurée (voir crypto.py), messages et analyses
+IA sont chiffrés au repos. Les lignes récentes le sont une à une ; dès
+qu'il y en a ``SEAL_PAGE_SIZE``, elles sont scellées en une page chiffrée
+d'un seul bloc (table ``sealed_pages``). Le coût fixe d'AES-GCM est ainsi
+payé une fois par page et non par message au chargement. Une page de
+messages garde en clair ses participants (colonne ``users``, déjà visibles
+dans l'AAD des lignes) : les lectures d'un utilisateur ne déchiffrent que
+ses pages.
+
+Chaque message a aussi une empreinte (BLAKE2b, à clé dérivée de la clé
+maîtresse si elle existe) dans ``message_digests`` : un import repère les
+messages déjà présents par une recherche dans cet index, sans relire ni
+garder en mémoire les messages existants.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+
+from crypto import aad, get_keyring
+from data_access import ConnectionPool
+
+DATA_DB = os.getenv("COLLABO_DATA_DB", "data.db")
+SEAL_PAGE_SIZE = 256
+# Séparateur de la liste des participants d'une page (``\x1falice\x1fbob\x1f``)
+USERS_SEP = "\x1f"
+
+# Colonnes des tables scellables : la 4e est chiffrée, les autres forment son AAD
+SEALED_COLUMNS = {
+    "messages": ("id", "sender", "receiver", "text", "timestamp"),
+    "ai_analyses": ("id", "message_id", "timestamp", "payload"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT,
+    online INTEGER NOT NULL DEFAULT 0,
+    bio TEXT
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    favorite INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    domain,
+    occasion,
+    notes,
+    PRIMARY KEY (owner, name)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    sender TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ai_analyses (
+    id INTEGER PRIMARY KEY,
+    message_id INTEGER,
+    timestamp TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_analyses_message ON ai_analyses (message_id);
+CREATE TABLE IF NOT EXISTS read_cursors (
+    user TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    last_read_id INTEGER NOT NULL,
+    read_at TEXT,
+    PRIMARY KEY (user, contact)
+);
+CREATE TABLE IF NOT EXISTS sealed_pages (
+    kind TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    users TEXT,
+    PRIMARY KEY (kind, first_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+-- Table à rowid : suivie par les sauvegardes incrémentales (backup.py)
+CREATE TABLE IF NOT EXISTS message_digests (
+    digest BLOB PRIMARY KEY
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+# Colonnes ajoutées après la création du schéma : ALTER TABLE sur les bases existantes
+ADDED_COLUMNS = {"contacts": ("domain", "occasion", "notes"), "sealed_pages": ("users",)}
+# Champs descriptifs des contacts, chiffrés comme dans collabo.db (AAD : propriétaire, nom)
+CONTACT_DETAILS = ("domain", "occasion", "notes")
+CONTACT_COLUMNS = ("owner", "name", "favorite", "created_at", *CONTACT_DETAILS)
+SQL_INSERT_CONTACT = f"INTO contacts ({', '.join(CONTACT_COLUMNS)}) VALUES ({', '.join('?' * len(CONTACT_COLUMNS))})"
+# Paramètres par requête IN (...) : sous la limite des anciennes versions de SQLite
+SQL_MAX_PARAMS = 500
+
+
+class Store:
+    """Accès SQLite via un pool (un écrivain, plusieurs lecteurs)."""
+
+    def __init__(self, path=DATA_DB, keyring=None, seal=None):
+        self.path = path
+        self.pool = ConnectionPool(path, row_factory=sqlite3.Row)
+        keyring = keyring if keyring is not None else get_keyring()
+        self._ciphers = {"messages": keyring.cipher("messages"), "ai_analyses": keyring.cipher("analyses")}
+        self._pages = keyring.cipher("pages")
+        # Pages scellées par défaut seulement avec le chiffrement ; ``seal`` le force (mesures)
+        self._sealing = self._pages.enabled if seal is None else seal
+        self._contacts = keyring.cipher("contacts")
+        self._digest_key = keyring.secret("message_digests")
+        with self.pool.exclusive() as conn:
+            conn.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        self._index_digests()
+
+    def _index_digests(self):
+        # Empreintes calculées avec une autre clé (ou absentes : base antérieure) :
+        # l'index est reconstruit page par page, sans charger tous les messages
+        marker = int.from_bytes(hashlib.blake2b(self._digest_key, digest_size=7).digest(), "big")
+        with self.transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'message_digests'").fetchone()
+            if row is not None and row[0] == marker:
+                return
+            conn.execute("DELETE FROM message_digests")
+            after = -1
+            while rows := self._rows(conn, "messages", after, SEAL_PAGE_SIZE * 4):
+                self._add_digests(conn, rows)
+                after = rows[-1][0]
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('message_digests', ?)", (marker,))
+
+    def transaction(self):
+        # Unité de travail : COMMIT à la sortie du bloc, ROLLBACK sur exception
+        return self.pool.write()
+
+    def _bump(self, conn):
+        # Chaque écriture incrémente la version : les caches détectent ainsi
+        # les modifications faites par un autre processus
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    # ------------------------------
+    # Lecture
+    # ------------------------------
+    def is_empty(self):
+        with self.pool.read() as conn:
+            row = conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        return row[0] == 0
+
+    def version(self):
+        with self.pool.read() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def load(self):
+        """Reconstitue le dictionnaire de données attendu par l'application."""
+        return self.load_snapshot()[1]
+
+    def load_snapshot(self):
+        """(version, données) lus dans une même transaction."""
+        with self.pool.read() as conn:
+            conn.execute("BEGIN")
+            try:
+                version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+                data = self._read_all(conn)
+            finally:
+                conn.commit()
+        return version, data
+
+    def _read_all(self, conn):
+        users = []
+        for r in conn.execute("SELECT * FROM users ORDER BY rowid"):
+            user = {"username": r["username"], "password": r["password"], "online": bool(r["online"]), "bio": r["bio"] or ""}
+            if r["email"] is not None:
+                user["email"] = r["email"]
+            users.append(user)
+        contacts = [self._contact_from_row(r) for r in conn.execute("SELECT * FROM contacts ORDER BY rowid")]
+        messages = [_message_from_row(r) for r in self._rows(conn, "messages")]
+        analyses = [_analysis_from_row(r) for r in self._rows(conn, "ai_analyses")]
+        read_cursors = [dict(r) for r in conn.execute("SELECT * FROM read_cursors")]
+        return {
+            "users": users, "contacts": contacts, "messages": messages, "ai_analyses": analyses,
+            "read_cursors": read_cursors,
+        }
+
+    def messages_after(self, after_id, limit):
+        """Page de messages (id, text) d'identifiant supérieur à ``after_id``."""
+        with self.pool.read() as conn:
+            return [{"id": r[0], "text": r[3]} for r in self._rows(conn, "messages", after_id, limit)]
+
+    def user_exists(self, username):
+        with self.pool.read() as conn:
+            return conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def iter_contacts(self, owner, batch=1000):
+        """Contacts de ``owner`` par ordre de nom, lus page par page (export)."""
+        after = ""
+        while True:
+            with self.pool.read() as conn:
+                rows = conn.execute(
+                    "SELECT * FROM contacts WHERE owner = ? AND name > ? ORDER BY name LIMIT ?", (owner, after, batch)
+                ).fetchall()
+            if not rows:
+                return
+            yield from map(self._contact_from_row, rows)
+            after = rows[-1]["name"]
+
+    def iter_messages(self, user=None, batch=SEAL_PAGE_SIZE * 4):
+        """Messages (de ``user`` seulement si précisé) par ordre d'identifiant, lus page par page (export)."""
+        after = -1
+        while True:
+            with self.pool.read() as conn:
+                rows = self._rows(conn, "messages", after, batch, user)
+            if not rows:
+                return
+            yield from map(_message_from_row, rows)
+            after = rows[-1][0]
+
+    def sentiment_message_ids(self):
+        with self.pool.read() as conn:
+            if not self._sealing:
+                return {
+                    r[0] for r in conn.execute(
+                        "SELECT message_id FROM ai_analyses WHERE json_extract(payload, '$.sentiment') IS NOT NULL"
+                    )
+                }
+            # Contenu chiffré : le filtre ne peut se faire qu'après déchiffrement
+            return {a["message_id"] for a in map(_analysis_from_row, self._rows(conn, "ai_analyses")) if "sentiment" in a}
+
+    # ------------------------------
+    # Lignes chiffrées et pages scellées
+    # ------------------------------
+    def _rows(self, conn, table, after_id=-1, limit=None, user=None):
+        """Lignes de ``table`` en clair (tuples triés par id) : pages scellées puis lignes récentes.
+
+        ``user`` (messages seulement) ne garde que ses messages : seules les pages
+        où il figure sont déchiffrées.
+        """
+        rows = []
+        sql = "SELECT first_id, last_id, payload FROM sealed_pages WHERE kind = ? AND last_id > ?"
+        params = (table, after_id)
+        if user is not None:
+            # Pages antérieures à la colonne users : participants inconnus, à déchiffrer
+            sql += " AND (users IS NULL OR instr(users, ?) > 0)"
+            params += (f"{USERS_SEP}{user}{USERS_SEP}",)
+        for first, last, payload in conn.execute(sql + " ORDER BY first_id", params):
+            page = json.loads(self._pages.decrypt(payload, aad(table, first, last)))
+            if user is not None:
+                page = [r for r in page if user in (r[1], r[2])]
+            rows.extend(page if first > after_id else [r for r in page if r[0] > after_id])
+            if limit is not None and len(rows) >= limit:
+                return rows[:limit]
+        where, params = "id > ?", (after_id,)
+        if user is not None:
+            where, params = "id > ? AND (sender = ? OR receiver = ?)", (after_id, user, user)
+        sql = f"SELECT {', '.join(SEALED_COLUMNS[table])} FROM {table} WHERE {where} ORDER BY id"
+        live = conn.execute(sql + " LIMIT ?", (*params, limit - len(rows))) if limit is not None else conn.execute(sql, params)
+        live = live.fetchall()
+        values = self._ciphers[table].decrypt_many([r[3] for r in live], [aad(*r[:3], *r[4:]) for r in live])
+        rows.extend((*r[:3], value, *r[4:]) for r, value in zip(live, values))
+        return rows
+
+    def _message_digest(self, row):
+        fields = json.dumps(row[1:], ensure_ascii=False).encode("utf-8")
+        return hashlib.blake2b(fields, key=self._digest_key, digest_size=16).digest()
+
+    def _add_digests(self, conn, rows):
+        conn.executemany(
+            "INSERT OR IGNORE INTO message_digests (digest) VALUES (?)", [(self._message_digest(r),) for r in rows]
+        )
+
+    def _insert(self, conn, table, rows):
+        """Insère des lignes en clair : pages complètes scellées directement, reste chiffré ligne à ligne."""
+        rows = sorted(rows, key=lambda r: r[0])
+        if table == "messages":
+            self._add_digests(conn, rows)
+        if self._sealing and len(rows) >= SEAL_PAGE_SIZE:
+            # Les lignes récentes pas encore scellées précèdent celles-ci : elles
+            # rejoignent les nouvelles pages pour que les pages restent ordonnées
+            sealed_until = self._sealed_until(conn, table)
+            pending = self._rows(conn, table, sealed_until)
+            if pending:
+                conn.execute(f"DELETE FROM {table} WHERE id > ?", (sealed_until,))
+                rows = pending + rows
+            full = len(rows) - len(rows) % SEAL_PAGE_SIZE
+            self._write_pages(conn, table, rows[:full])
+            rows = rows[full:]
+        cipher = self._ciphers[table]
+        values = cipher.encrypt_many([r[3] for r in rows], [aad(*r[:3], *r[4:]) for r in rows])
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(SEALED_COLUMNS[table])}) VALUES (?,?,?,?{',?' * (len(SEALED_COLUMNS[table]) - 4)})",
+            [(*r[:3], value, *r[4:]) for r, value in zip(rows, values)],
+        )
+
+    def _write_pages(self, conn, table, rows):
+        pages = []
+        for start in range(0, len(rows), SEAL_PAGE_SIZE):
+            page = rows[start:start + SEAL_PAGE_SIZE]
+            first, last = page[0][0], page[-1][0]
+            pages.append((table, first, last, *self._page(table, first, last, page)))
+        conn.executemany("INSERT INTO sealed_pages (kind, first_id, last_id, payload, users) VALUES (?,?,?,?,?)", pages)
+
+    def _page(self, table, first, last, page):
+        """(payload chiffré, colonne users) d'une page de lignes en clair."""
+        payload = json.dumps([list(r) for r in page], ensure_ascii=False)
+        users = None
+        if table == "messages":
+            users = USERS_SEP + USERS_SEP.join(sorted({u for r in page for u in r[1:3]})) + USERS_SEP
+        elif table == "ai_analyses":
+            # Messages analysés (message_id, en clair dans l'AAD des lignes) :
+            # une réanalyse ne déchiffre que les pages qui les contiennent
+            users = USERS_SEP + USERS_SEP.join(str(r[1]) for r in page if r[1] is not None) + USERS_SEP
+        return self._pages.encrypt(payload, aad(table, first, last)), users
+
+    def _seal(self, conn, table):
+        # Les lignes récentes deviennent des pages dès qu'elles en remplissent une
+        if not self._sealing:
+            return
+        if conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] < SEAL_PAGE_SIZE:
+            return
+        rows = self._rows(conn, table, self._sealed_until(conn, table))
+        rows = rows[:len(rows) - len(rows) % SEAL_PAGE_SIZE]
+        self._write_pages(conn, table, rows)
+        conn.execute(f"DELETE FROM {table} WHERE id <= ?", (rows[-1][0],))
+
+    def _sealed_until(self, conn, table):
+        return conn.execute(
+            "SELECT COALESCE(MAX(last_id), -1) FROM sealed_pages WHERE kind = ?", (table,)
+        ).fetchone()[0]
+
+    def _next_id(self, conn, table):
+        # Les lignes scellées ont quitté la table : leurs ids ne doivent pas être réutilisés
+        live = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        return max(live, self._sealed_until(conn, table)) + 1
+
+    # ------------------------------
+    # Contacts (champs descriptifs chiffrés)
+    # ------------------------------
+    def _contact_row(self, c):
+        ad = aad(c["owner"], c["name"])
+        details = [self._contacts.encrypt(c.get(field) or None, ad) for field in CONTACT_DETAILS]
+        return (c["owner"], c["name"], int(bool(c.get("favorite"))), c.get("created_at"), *details)
+
+    def _contact_from_row(self, r):
+        contact = {"owner": r["owner"], "name": r["name"], "favorite": bool(r["favorite"])}
+        if r["created_at"] is not None:
+            contact["created_at"] = r["created_at"]
+        ad = aad(r["owner"], r["name"])
+        for field in CONTACT_DETAILS:
+            if r[field] is not None:
+                contact[field] = self._contacts.decrypt(r[field], ad)
+        return contact
+
+    # ------------------------------
+    # Écritures unitaires
+    # ------------------------------
+    def add_user(self, user):
+        """Crée un utilisateur ; False s'il existe déjà."""
+        try:
+            with self.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password, email, online, bio) VALUES (?,?,?,?,?)",
+                    (user["username"], user["password"], user.get("email"), int(user.get("online", False)), user.get("bio", "")),
+                )
+                self._bump(conn)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def set_password(self, username, password_hash):
+        with self.transaction() as conn:
+            conn.execute("UPDATE users SET password=? WHERE username=?", (password_hash, username))
+            self._bump(conn)
+
+    def add_contact(self, contact):
+        """Ajoute un contact ; False s'il existe déjà pour ce propriétaire."""
+        with self.transaction() as conn:
+            cur = conn.execute(f"INSERT OR IGNORE {SQL_INSERT_CONTACT}", self._contact_row(contact))
+            if cur.rowcount == 1:
+                self._bump(conn)
+        return cur.rowcount == 1
+
+    def set_favorite(self, owner, name, favorite):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE contacts SET favorite=? WHERE owner=? AND name=?",
+                (int(favorite), owner, name),
+            )
+            self._bump(conn)
+
+    def add_message(self, message):
+        """Enregistre un message et renvoie son identifiant."""
+        with self.transaction() as conn:
+            msg_id = message.get("id")
+            if msg_id is None:
+                msg_id = self._next_id(conn, "messages")
+            self._insert(conn, "messages", [_message_row(msg_id, message)])
+            self._seal(conn, "messages")
+            self._bump(conn)
+        return msg_id
+
+    def mark_read(self, user, contact, last_read_id, read_at=None):
+        """Avance le curseur de lecture de ``user`` dans sa conversation avec ``contact``."""
+        with self.transaction() as conn:
+            # Le curseur ne recule jamais, même si deux sessions marquent en désordre
+            conn.execute(
+                "INSERT INTO read_cursors (user, contact, last_read_id, read_at) VALUES (?,?,?,?) "
+                "ON CONFLICT (user, contact) DO UPDATE SET "
+                "last_read_id = MAX(last_read_id, excluded.last_read_id), read_at = excluded.read_at",
+                (user, contact, last_read_id, read_at),
+            )
+            self._bump(conn)
+
+    def add_analysis(self, analysis):
+        with self.transaction() as conn:
+            analysis_id = self._next_id(conn, "ai_analyses")
+            self._insert(conn, "ai_analyses", [_analysis_to_row(analysis_id, analysis)])
+            self._seal(conn, "ai_analyses")
+            self._bump(conn)
+        return analysis_id
+
+    def add_analyses(self, analyses):
+        """Insère plusieurs analyses dans une seule transaction."""
+        with self.transaction() as conn:
+            first = self._next_id(conn, "ai_analyses")
+            self._insert(conn, "ai_analyses", [_analysis_to_row(i, a) for i, a in enumerate(analyses, start=first)])
+            self._seal(conn, "ai_analyses")
+            self._bump(conn)
+
+    def replace_sentiments(self, analyses):
+        """Remplace, dans une seule transaction, les analyses de sentiment des messages concernés."""
+        message_ids = {a["message_id"] for a in analyses}
+        with self.transaction() as conn:
+            self._delete_analyses(conn, message_ids)
+            first = self._next_id(conn, "ai_analyses")
+            self._insert(conn, "ai_analyses", [_analysis_to_row(i, a) for i, a in enumerate(analyses, start=first)])
+            self._seal(conn, "ai_analyses")
+            self._bump(conn)
+
+    def _delete_analyses(self, conn, message_ids):
+        # Seules les analyses de sentiment portent un message_id
+        if not message_ids:
+            return
+        params = list(message_ids)
+        marks = ", ".join("?" * len(params))
+        conn.execute(f"DELETE FROM ai_analyses WHERE message_id IN ({marks})", params)
+        # Pages scellées : réécrites sans ces lignes, bornes conservées (les ids ne sont pas réutilisés)
+        keys = [f"{USERS_SEP}{i}{USERS_SEP}" for i in params]
+        pages = conn.execute(
+            "SELECT first_id, last_id, payload FROM sealed_pages WHERE kind = 'ai_analyses' AND (users IS NULL OR "
+            + " OR ".join("instr(users, ?) > 0" for _ in keys) + ")",
+            keys,
+        ).fetchall()
+        for first, last, payload in pages:
+            page = json.loads(self._pages.decrypt(payload, aad("ai_analyses", first, last)))
+            kept = [r for r in page if r[1] not in message_ids]
+            if len(kept) < len(page):
+                conn.execute(
+                    "UPDATE sealed_pages SET payload = ?, users = ? WHERE kind = 'ai_analyses' AND first_id = ?",
+                    (*self._page("ai_analyses", first, last, kept), first),
+                )
+
+    # ------------------------------
+    # Écritures en masse (import)
+    # ------------------------------
+    def add_contacts(self, contacts):
+        """Ajoute une tranche de contacts en une transaction ; renvoie le nombre de nouveaux."""
+        with self.transaction() as conn:
+            cur = conn.executemany(f"INSERT OR IGNORE {SQL_INSERT_CONTACT}", map(self._contact_row, contacts))
+            if cur.rowcount:
+                self._bump(conn)
+        return cur.rowcount
+
+    def add_messages(self, messages, skip_existing=False):
+        """Ajoute une tranche de messages (nouveaux identifiants) en une transaction ; renvoie leur nombre.
+
+        ``skip_existing`` : les messages déjà en base (même expéditeur,
+        destinataire, texte et horodatage) et les doublons de la tranche sont ignorés.
+        """
+        with self.transaction() as conn:
+            if skip_existing:
+                messages = self._new_messages(conn, messages)
+                if not messages:
+                    return 0
+            first = self._next_id(conn, "messages")
+            self._insert(conn, "messages", [_message_row(i, m) for i, m in enumerate(messages, start=first)])
+            self._seal(conn, "messages")
+            self._bump(conn)
+        return len(messages)
+
+    def _new_messages(self, conn, messages):
+        digests = [self._message_digest(_message_row(None, m)) for m in messages]
+        known = set()
+        for start in range(0, len(digests), SQL_MAX_PARAMS):
+            batch = digests[start:start + SQL_MAX_PARAMS]
+            known.update(r[0] for r in conn.execute(
+                f"SELECT digest FROM message_digests WHERE digest IN ({', '.join('?' * len(batch))})", batch
+            ))
+        fresh = []
+        for digest, message in zip(digests, messages):
+            if digest not in known:
+                known.add(digest)
+                fresh.append(message)
+        return fresh
+
+    # ------------------------------
+    # Synchronisation complète
+    # ------------------------------
+    def replace_all(self, data):
+        """Remplace tout le contenu en une transaction (migration, restauration)."""
+        with self.transaction() as conn:
+            for table in ("users", "contacts", "messages", "ai_analyses", "read_cursors", "sealed_pages", "message_digests"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, password, email, online, bio) VALUES (?,?,?,?,?)",
+                [
+                    (u["username"], u["password"], u.get("email"), int(u.get("online", False)), u.get("bio", ""))
+                    for u in data.get("users", [])
+                ],
+            )
+            conn.executemany(
+                f"INSERT OR REPLACE {SQL_INSERT_CONTACT}",
+                [
+                    # Les anciens fichiers utilisent parfois "contact_name"
+                    self._contact_row({**c, "name": c.get("name", c.get("contact_name"))})
+                    for c in data.get("contacts", [])
+                ],
+            )
+            # Sans identifiant, un message garde sa position dans la liste,
+            # qui est la référence utilisée par ai_analyses.message_id
+            self._insert(conn, "messages", [_message_row(m.get("id", i), m) for i, m in enumerate(data.get("messages", []))])
+            self._insert(conn, "ai_analyses", [_analysis_to_row(i, a) for i, a in enumerate(data.get("ai_analyses", []), start=1)])
+            conn.executemany(
+                "INSERT OR REPLACE INTO read_cursors (user, contact, last_read_id, read_at) VALUES (?,?,?,?)",
+                [(r["user"], r["contact"], r["last_read_id"], r.get("read_at")) for r in data.get("read_cursors", [])],
+            )
+            self._bump(conn)
+
+    def encrypt_existing(self):
+        """Chiffre et scelle messages et analyses, chiffre les champs de contacts encore en clair."""
+        counts = {}
+        with self.transaction() as conn:
+            for table, columns in SEALED_COLUMNS.items():
+                counts[table] = conn.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE typeof({columns[3]}) = 'text'"
+                ).fetchone()[0]
+                rows = self._rows(conn, table, self._sealed_until(conn, table))
+                conn.execute(f"DELETE FROM {table}")
+                self._insert(conn, table, rows)
+            plain = " OR ".join(f"typeof({field}) = 'text'" for field in CONTACT_DETAILS)
+            rows = conn.execute(f"SELECT * FROM contacts WHERE {plain}").fetchall()
+            conn.executemany(
+                f"UPDATE contacts SET {', '.join(f'{field} = ?' for field in CONTACT_DETAILS)} WHERE owner = ? AND name = ?",
+                [(*self._contact_row(self._contact_from_row(r))[4:], r["owner"], r["name"]) for r in rows],
+            )
+            counts["contacts"] = len(rows)
+            self._bump(conn)
+        return counts
+
+
+def _message_from_row(r):
+    return {"id": r[0], "sender": r[1], "receiver": r[2], "text": r[3], "timestamp": r[4]}
+
+
+def _message_row(message_id, m):
+    return message_id, m["sender"], m["receiver"], m["text"], m["timestamp"]
+
+
+def _analysis_to_row(analysis_id, analysis):
+    payload = {k: v for k, v in analysis.items() if k not in ("id", "message_id", "timestamp")}
+    return analysis_id, analysis.get("message_id"), analysis.get("timestamp"), json.dumps(payload, ensure_ascii=False)
+
+
+def _analysis_from_row(row):
+    analysis = {"id": row[0], "message_id": row[1], "timestamp": row[2]}
+    analysis.update(json.loads(row[3]))
+    return analysis
+
+
+def migrate_json(json_path, store):
+    """Importe un fichier data.json existant dans le store."""
+    with open(json_path) as f:
+        data = json.load(f)
+    store.replace_all(data)
+    return {k: len(data.get(k, [])) for k in ("users", "contacts", "messages", "ai_analyses")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migration de data.json vers SQLite")
+    parser.add_argument("source", nargs="?", default="data.json")
+    parser.add_argument("--db", default=DATA_DB)
+    args = parser.parse_args(argv)
+
+    counts = migrate_json(args.source, Store(args.db))
+    print(f"✅ Migration terminée vers {args.db} : " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
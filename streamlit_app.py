@@ -1,28 +1,28 @@
 # streamlit_app.py
-import os, json
+import io, os, html, threading
+from collections import Counter
 import streamlit as st
 from datetime import datetime, timedelta
-from io import BytesIO
 import time
 
-# Import conditionnel
-try:
-    import qrcode
-    QRCODE_AVAILABLE = True
-except ImportError:
-    QRCODE_AVAILABLE = False
-
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
     pass
 
-try:
-    from openai import OpenAI
-    AI_AVAILABLE = True
-except ImportError:
-    AI_AVAILABLE = False
+from ai_cache import ResultCache
+from ai_jobs import JobQueue
+from ai_service import AIService
+from bulk_io import CONTACT_READERS, contact_format, export_contacts_csv, export_messages_jsonl, export_vcards, import_contacts
+from credentials import get_credentials
+from data_cache import DataCache
+from pubsub import make_pubsub, thread_channel, user_channel
+from qr_cache import QRCache, qr_payload
+from search import analysis_text
+from sessions import SessionManager
+from store import DATA_DB, Store, migrate_json
+from summaries import RollingSummarizer
 
 # =============================
 # CONFIG PAGE
@@ -145,142 +145,176 @@ for k, v in DEFAULT_STATE.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
+# Toute nouvelle exécution du script (navigation, clic) interrompt les générations IA en cours
+if "ai_cancel" in st.session_state:
+    st.session_state.ai_cancel.set()
+st.session_state.ai_cancel = threading.Event()
+
 # =============================
 # DATA
 # =============================
 DATA_FILE = "data.json"
 
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, "w") as f:
-        json.dump({
-            "users": [
-                {"username": "alice", "password": "123", "online": True, "bio": "Développeuse passionnée"},
-                {"username": "bob", "password": "123", "online": False, "bio": "Designer créatif"}
-            ],
-            "contacts": [
-                {"owner": "alice", "name": "bob", "favorite": True}
-            ],
-            "messages": [],
-            "ai_analyses": []
-        }, f, indent=4)
-
-def load_data(): 
-    with open(DATA_FILE) as f: 
-        return json.load(f)
-
-def save_data(d): 
-    with open(DATA_FILE, "w") as f: 
-        json.dump(d, f, indent=4)
-
-if "data" not in st.session_state:
-    st.session_state.data = load_data()
-
-data = st.session_state.data
+DEFAULT_DATA = {
+    "users": [
+        {"username": "alice", "password": "123", "online": True, "bio": "Développeuse passionnée"},
+        {"username": "bob", "password": "123", "online": False, "bio": "Designer créatif"}
+    ],
+    "contacts": [
+        {"owner": "alice", "name": "bob", "favorite": True}
+    ],
+    "messages": [],
+    "ai_analyses": []
+}
+
+@st.cache_resource
+def get_data_cache():
+    """Copie unique des données, partagée par toutes les sessions du processus."""
+    store = Store(DATA_DB)
+    # Premier lancement : reprise de l'ancien data.json s'il existe
+    if store.is_empty():
+        if os.path.exists(DATA_FILE):
+            migrate_json(DATA_FILE, store)
+        else:
+            # Insertions ligne à ligne : un autre processus qui démarre en même temps n'est pas écrasé
+            for user in DEFAULT_DATA["users"]:
+                store.add_user(user)
+            for contact in DEFAULT_DATA["contacts"]:
+                store.add_contact(contact)
+    cache = DataCache(store)
+    # Messages écrits par un autre processus : rechargement avant de prévenir les sessions
+    cache.pubsub = make_pubsub(store.pool, on_remote=cache.refresh)
+    return cache
+
+cache = get_data_cache()
+store = cache.store
+
+# Les écritures des autres processus invalident l'instantané partagé
+cache.refresh()
+data = cache.data
+conversations = cache.conversations
 
 # =============================
 # AI SERVICE
 # =============================
-class AIService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if AI_AVAILABLE and self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-            self.enabled = True
-        else:
-            self.enabled = False
-    
-    def analyze_sentiment(self, text):
-        if not self.enabled:
-            return {"sentiment": "neutral", "emoji": "😐", "color": "#667eea"}
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Tu es un expert en analyse de sentiment. Réponds uniquement avec: 'positif', 'négatif' ou 'neutre'."},
-                    {"role": "user", "content": f"Analyse le sentiment de ce message: {text}"}
-                ],
-                max_tokens=50
-            )
-            result = response.choices[0].message.content.lower()
-            
-            if "positif" in result:
-                return {"sentiment": "positif", "emoji": "😊", "color": "#11998e"}
-            elif "négatif" in result:
-                return {"sentiment": "négatif", "emoji": "😔", "color": "#eb3349"}
-            else:
-                return {"sentiment": "neutre", "emoji": "😐", "color": "#667eea"}
-                
-        except Exception as e:
-            return {"sentiment": "erreur", "emoji": "⚠️", "color": "#ffa500", "error": str(e)}
-    
-    def suggest_response(self, conversation_history):
-        if not self.enabled:
-            return "IA non disponible. Ajoutez votre clé OpenAI."
-        
-        try:
-            messages_text = "\n".join([f"{m['sender']}: {m['text']}" for m in conversation_history[-5:]])
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Tu es un assistant qui suggère des réponses amicales et professionnelles."},
-                    {"role": "user", "content": f"Basé sur cette conversation, suggère une réponse appropriée:\n\n{messages_text}"}
-                ],
-                max_tokens=100
-            )
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"Erreur: {str(e)}"
-    
-    def summarize_conversation(self, messages):
-        if not self.enabled:
-            return "IA non disponible. Ajoutez votre clé OpenAI."
-        
-        try:
-            messages_text = "\n".join([f"{m['sender']}: {m['text']}" for m in messages])
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Tu résumes des conversations de manière concise et claire."},
-                    {"role": "user", "content": f"Résume cette conversation en 2-3 phrases:\n\n{messages_text}"}
-                ],
-                max_tokens=150
-            )
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"Erreur: {str(e)}"
+@st.cache_resource
+def get_ai_service():
+    return AIService(cache=ResultCache())
+
+def store_ai_result(job, result):
+    """Enregistre dans ai_analyses le résultat d'une tâche IA terminée."""
+    payload = job["payload"]
+    analysis = {"message_id": payload.get("message_id"), "timestamp": str(datetime.now())}
+    if job["kind"] == "sentiment":
+        analysis["sentiment"] = result
+    else:
+        analysis.update({"kind": job["kind"], "owner": payload["owner"], "contact": payload["contact"], "result": result})
+    get_data_cache().add_analysis(analysis)
+
+def message_text(message_id):
+    # Les tâches ne portent que l'identifiant : le texte est relu (et déchiffré) au traitement
+    page = get_data_cache().store.messages_after(message_id - 1, 1)
+    if not page or page[0]["id"] != message_id:
+        raise KeyError(f"Message {message_id} introuvable")
+    return page[0]["text"]
+
+def conversation_text(owner, contact):
+    return "\n".join(f"{m['sender']}: {m['text']}" for m in get_data_cache().conversations.get(owner, contact))
+
+@st.cache_resource
+def get_summarizer():
+    # Résumé incrémental : seuls les messages postérieurs au dernier résumé partent au modèle
+    return RollingSummarizer(get_data_cache().store.pool, get_ai_service())
+
+@st.cache_resource
+def get_job_queue():
+    """Pool de workers IA, partagé par toutes les sessions."""
+    ai = get_ai_service()
+    pool = get_data_cache().store.pool
+    summarizer = get_summarizer()
+    conversations = lambda p: get_data_cache().conversations.get(p["owner"], p["contact"])
+    handlers = {
+        # Variantes qui lèvent : une erreur d'API est retentée puis marquée "failed",
+        # au lieu d'enregistrer un verdict d'erreur ou une analyse fictive
+        "sentiment": lambda p: ai.sentiment(message_text(p["message_id"])),
+        "summary": lambda p: summarizer.summarize(p["owner"], p["contact"], conversations(p)),
+        "conversation_analysis": lambda p: ai.conversation_analysis(conversation_text(p["owner"], p["contact"]), p["contact"]),
+    }
+    return JobQueue(pool, handlers, store_ai_result)
 
-ai_service = AIService()
+ai_service = get_ai_service()
+job_queue = get_job_queue()
+
+@st.cache_resource
+def get_sessions():
+    sessions = SessionManager(get_data_cache().store.pool)
+    sessions.purge()
+    return sessions
+
+sessions = get_sessions()
+
+# Rafraîchissement du navigateur : la session reprend depuis le jeton de l'URL, sans mot de passe ;
+# le jeton présenté est aussitôt remplacé par un nouveau
+if not st.session_state.logged_in and "session" in st.query_params:
+    restored = sessions.rotate(st.query_params["session"])
+    if restored and cache.users.get(restored[0]):
+        st.session_state.logged_in = True
+        st.session_state.username = restored[0]
+        st.query_params["session"] = restored[1]
+    else:
+        if restored:
+            sessions.revoke(restored[1])
+        del st.query_params["session"]
 
 # =============================
 # UTILITIES
 # =============================
+CONTACTS_PAGE_SIZE = 20
+HISTORY_PAGE_SIZE = 10
+# Intervalle de lecture de la file d'événements de la session (secondes)
+THREAD_REFRESH = 1.0
+# Clés de session liées à l'utilisateur connecté, effacées à la déconnexion
+USER_STATE_PREFIXES = ("history_start_", "analysis_job_", "import_report")
+
+def paginate(items, key, page_size=CONTACTS_PAGE_SIZE):
+    """Tranche de ``items`` à afficher, avec la navigation entre pages."""
+    pages = max(1, -(-len(items) // page_size))
+    page = min(st.session_state.get(key, 0), pages - 1)
+    if pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("◀ Précédent", key=f"{key}_prev", disabled=page == 0):
+                page -= 1
+        with col3:
+            if st.button("Suivant ▶", key=f"{key}_next", disabled=page >= pages - 1):
+                page += 1
+        with col2:
+            st.caption(f"Page {page + 1} / {pages} · {len(items)} contacts")
+    st.session_state[key] = page
+    return items[page * page_size:(page + 1) * page_size]
+
 def get_user(u):
-    return next((x for x in data["users"] if x["username"] == u), None)
+    return cache.users.get(u)
 
 def get_contacts(u):
-    return [c for c in data["contacts"] if c["owner"] == u]
+    return cache.contacts.of(u)
 
 def get_messages(u1, u2):
-    return sorted(
-        [m for m in data["messages"] if (m["sender"]==u1 and m["receiver"]==u2) or (m["sender"]==u2 and m["receiver"]==u1)],
-        key=lambda x: x["timestamp"]
-    )
+    return conversations.get(u1, u2)
 
-def toggle_fav(idx):
-    contacts = get_contacts(st.session_state.username)
-    if idx < len(contacts):
-        contact_to_toggle = contacts[idx]
-        for c in data["contacts"]:
-            if c["owner"] == st.session_state.username and c["name"] == contact_to_toggle["name"]:
-                c["favorite"] = not c.get("favorite", False)
-                break
-        save_data(data)
-        st.session_state.data = load_data()
+def get_inbox():
+    """Abonnement de la session aux nouveaux messages."""
+    if "inbox" not in st.session_state:
+        st.session_state.inbox = cache.pubsub.subscribe()
+    return st.session_state.inbox
+
+def load_older(start_key, start):
+    st.session_state[start_key] = max(0, start - HISTORY_PAGE_SIZE)
+
+def toggle_fav(name):
+    contact_to_toggle = cache.contacts.get(st.session_state.username, name)
+    if contact_to_toggle:
+        cache.set_favorite(contact_to_toggle, not contact_to_toggle.get("favorite", False))
 
 def login():
     u = st.session_state.get("input_user", "").strip()
@@ -291,9 +325,15 @@ def login():
         return
     
     user = get_user(u)
-    if user and user["password"] == p:
+    # Vérification dans le pool de credentials ; un utilisateur inconnu coûte le même temps
+    ok, new_hash = get_credentials().verify(p, user["password"] if user else None, legacy="plain")
+    if ok:
+        # Mot de passe en clair ou ancien format : remplacé par scrypt à la connexion
+        if new_hash:
+            cache.set_password(user, new_hash)
         st.session_state.logged_in = True
         st.session_state.username = u
+        st.query_params["session"] = sessions.create(u)
         st.sidebar.success(f"✅ Bienvenue {u} !")
         time.sleep(0.5)
         st.rerun()
@@ -313,26 +353,40 @@ def register():
         st.sidebar.error("⚠️ Le mot de passe doit contenir au moins 3 caractères")
         return
     
-    if get_user(u):
-        st.sidebar.error("❌ Ce nom d'utilisateur existe déjà")
-        return
-    
-    data["users"].append({
+    new_user = {
         "username": u,
-        "password": p,
+        "password": get_credentials().hash(p),
         "email": e,
         "online": False,
         "bio": ""
-    })
-    save_data(data)
-    st.session_state.data = load_data()
+    }
+    # La contrainte d'unicité de la base tranche aussi entre deux sessions concurrentes
+    if get_user(u) or not cache.add_user(new_user):
+        st.sidebar.error("❌ Ce nom d'utilisateur existe déjà")
+        return
+    
     st.sidebar.success(f"✅ Compte créé ! Vous pouvez vous connecter.")
 
 def logout():
+    if "session" in st.query_params:
+        sessions.revoke(st.query_params["session"])
+        del st.query_params["session"]
     st.session_state.logged_in = False
     st.session_state.username = ""
+    # État propre à l'utilisateur (fil, historique chargé, tâches IA) : rien pour le suivant
+    inbox = st.session_state.pop("inbox", None)
+    if inbox is not None:
+        inbox.close()
+    for key in list(st.session_state.keys()):
+        if key.startswith(USER_STATE_PREFIXES):
+            del st.session_state[key]
     st.rerun()
 
+# Exécutions suivantes : contrôle du jeton courant, sans écriture (cache de validate).
+# Session révoquée ailleurs (déconnexion d'un autre onglet) ou expirée : fin de la session
+if st.session_state.logged_in and sessions.validate(st.query_params.get("session")) != st.session_state.username:
+    logout()
+
 def send_message(to_user, text):
     if text.strip() == "":
         return
@@ -343,34 +397,107 @@ def send_message(to_user, text):
         "text": text,
         "timestamp": str(datetime.now())
     }
-    data["messages"].append(msg_data)
+    # Déjà affiché par la page : pas d'événement pour la session qui envoie
+    cache.add_message(msg_data, source=get_inbox())
+    # Répondre vaut lecture de la conversation
+    cache.mark_read(st.session_state.username, to_user)
     
+    # Analyse en arrière-plan : l'envoi rend la main dès l'écriture locale
     if ai_service.enabled:
-        sentiment = ai_service.analyze_sentiment(text)
-        data["ai_analyses"].append({
-            "message_id": len(data["messages"]) - 1,
-            "sentiment": sentiment,
-            "timestamp": str(datetime.now())
-        })
-    
-    save_data(data)
-    st.session_state.data = load_data()
+        job_queue.enqueue("sentiment", {"message_id": msg_data["id"]})
+
+def show_inbox_toasts(others):
+    # File accumulée hors de la page Messages : un seul toast récapitulatif
+    if len(others) == 1:
+        (sender, count), = others.items()
+        st.toast(f"💬 {count} nouveaux messages de {sender}" if count > 1 else f"💬 Nouveau message de {sender}")
+    elif others:
+        st.toast(f"💬 {sum(others.values())} nouveaux messages de {', '.join(sorted(others))}")
+
+@st.fragment(run_every=THREAD_REFRESH)
+def show_thread(contact_name):
+    """Historique du fil ouvert (curseur de pagination propre à la session).
+
+    Fragment relancé seul : il relève la file d'événements de la session et
+    redessine le fil sans réexécuter la page, donc sans interrompre une
+    génération IA en cours.
+    """
+    username = st.session_state.username
+    inbox = get_inbox()
+    inbox.listen(thread_channel(username, contact_name), user_channel(username))
+    others = Counter()
+    for channel, event in inbox.poll():
+        if channel == thread_channel(username, contact_name):
+            # Arrivé dans le fil affiché : lu
+            cache.mark_read(username, contact_name)
+        elif event["sender"] != username:
+            others[event["sender"]] += 1
+    show_inbox_toasts(others)
+
+    total = cache.conversations.count(username, contact_name)
+    # Curseur : position du plus ancien message affiché, stable quand le fil s'allonge
+    start_key = f"history_start_{contact_name}"
+    start = st.session_state.get(start_key)
+    if start is None:
+        start = max(0, total - HISTORY_PAGE_SIZE)
+    
+    if total:
+        st.markdown("#### 📜 Historique")
+        if start > 0:
+            st.button(
+                f"⬆️ Charger les messages plus anciens ({start})",
+                key=f"older_{contact_name}",
+                on_click=load_older,
+                args=(start_key, start)
+            )
+        for msg in cache.conversations.slice(username, contact_name, start):
+            css = "message-sent" if msg["sender"] == username else "message-received"
+            sentiment = cache.sentiments.get(msg.get("id"))
+            emoji = f" {sentiment['emoji']}" if sentiment else ""
+            st.markdown(f'<div class="{css}">{html.escape(msg["text"])}{emoji}</div>', unsafe_allow_html=True)
+
+@st.fragment(run_every=2)
+def wait_for_job(job_id):
+    job = job_queue.get(job_id)
+    if job and job["status"] in ("done", "failed"):
+        st.rerun()
+    st.caption("⏳ Analyse IA en cours...")
+
+def show_job(job_id, render):
+    """Affiche le résultat d'une tâche IA, ou patiente jusqu'à sa fin."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return
+    if job["status"] == "done":
+        render(job["result"])
+    elif job["status"] == "failed":
+        st.error(f"❌ Analyse IA impossible : {job['error']}")
+    else:
+        wait_for_job(job_id)
+
+def stream_or_error(parts):
+    try:
+        yield from parts
+    except Exception as e:
+        yield f"Erreur: {str(e)}"
+
+@st.cache_resource
+def get_qr_cache():
+    return QRCache()
 
 def generate_qr(username):
-    if not QRCODE_AVAILABLE:
-        return None
     try:
-        qr = qrcode.QRCode(version=1, box_size=6, border=2)
-        qr.add_data(f"collabo://add/{username}")
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="#667eea", back_color="white")
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return buf
+        return get_qr_cache().get(qr_payload(username))
     except:
         return None
 
+def show_qr(contact):
+    # Rendu à la demande : aucun QR n'est encodé pour les contacts repliés
+    if st.toggle("🔳 QR", key=f"qr_{contact['name']}"):
+        qr_img = generate_qr(contact["name"])
+        if qr_img:
+            st.image(qr_img, width=100)
+
 def add_contact():
     new_contact = st.session_state.get("new_contact_name", "").strip()
     if not new_contact:
@@ -384,22 +511,47 @@ def add_contact():
         st.error("❌ Vous ne pouvez pas vous ajouter vous-même")
         return
     
-    existing = [c for c in data["contacts"] if c["owner"] == st.session_state.username and c["name"] == new_contact]
-    if existing:
-        st.warning("⚠️ Ce contact existe déjà")
-        return
-    
-    data["contacts"].append({
+    contact = {
         "owner": st.session_state.username,
         "name": new_contact,
         "favorite": False
-    })
-    save_data(data)
-    st.session_state.data = load_data()
+    }
+    domain = st.session_state.get("new_contact_domain", "").strip()
+    if domain:
+        contact["domain"] = domain
+    if cache.contacts.get(st.session_state.username, new_contact) or not cache.add_contact(contact):
+        st.warning("⚠️ Ce contact existe déjà")
+        return
+    
     st.success(f"✅ {new_contact} ajouté à vos contacts !")
     time.sleep(1)
     st.rerun()
 
+def import_contacts_file():
+    uploaded = st.session_state.get("contacts_file")
+    if uploaded is None:
+        return
+    # Lecture en flux : le fichier n'est jamais converti en liste de contacts
+    records = CONTACT_READERS[contact_format(uploaded.name)](io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline=""))
+    report = import_contacts(records, st.session_state.username, store.add_contacts, lambda u: get_user(u) is not None)
+    if report["imported"]:
+        cache.refresh()
+    st.session_state.import_report = report
+
+def show_import_report():
+    report = st.session_state.pop("import_report", None)
+    if report is None:
+        return
+    st.success(f"✅ {report['imported']} contacts importés")
+    skipped = report["duplicates"] + report["invalid"] + report["unknown_users"]
+    if skipped:
+        st.warning(
+            f"⚠️ {report['duplicates']} déjà présents, {report['invalid']} invalides, "
+            f"{report['unknown_users']} utilisateurs inconnus"
+        )
+        for error in report["errors"]:
+            st.caption(error)
+
 # =============================
 # SIDEBAR
 # =============================
@@ -433,7 +585,7 @@ else:
     
     page = st.sidebar.radio(
         "Navigation",
-        ["🏠 Dashboard", "👥 Contacts", "💬 Messages", "🤖 IA Assistant", "📊 Statistiques"],
+        ["🏠 Dashboard", "👥 Contacts", "💬 Messages", "🔎 Recherche", "🤖 IA Assistant", "📊 Statistiques"],
         label_visibility="collapsed"
     )
     st.session_state.page = page.split(" ", 1)[1]
@@ -476,18 +628,16 @@ if st.session_state.page == "Dashboard":
     col1, col2, col3, col4 = st.columns(4)
     
     contacts = get_contacts(st.session_state.username)
-    total_sent = len([m for m in data["messages"] if m["sender"]==st.session_state.username])
-    total_received = len([m for m in data["messages"] if m["receiver"]==st.session_state.username])
-    fav_contacts = len([c for c in contacts if c.get("favorite")])
+    counts = cache.activity.counts(st.session_state.username)
     
     with col1:
         st.metric("👥 Contacts", len(contacts))
     with col2:
-        st.metric("📤 Envoyés", total_sent)
+        st.metric("📤 Envoyés", counts["sent"])
     with col3:
-        st.metric("📥 Reçus", total_received)
+        st.metric("📥 Reçus", counts["received"])
     with col4:
-        st.metric("⭐ Favoris", fav_contacts)
+        st.metric("⭐ Favoris", counts["favorites"])
     
     st.divider()
     
@@ -495,11 +645,7 @@ if st.session_state.page == "Dashboard":
     
     with col1:
         st.markdown("### 📈 Activité récente")
-        recent_msgs = sorted(
-            [m for m in data["messages"] if m["sender"]==st.session_state.username or m["receiver"]==st.session_state.username],
-            key=lambda x: x["timestamp"],
-            reverse=True
-        )[:5]
+        recent_msgs = cache.activity.recent(st.session_state.username, 5)
         
         if recent_msgs:
             for msg in recent_msgs:
@@ -525,12 +671,40 @@ elif st.session_state.page == "Contacts":
     st.markdown("### 👥 Mes Contacts")
     
     with st.expander("➕ Ajouter un nouveau contact", expanded=False):
-        col1, col2 = st.columns([3, 1])
+        col1, col2, col3 = st.columns([2, 2, 1])
         with col1:
             st.text_input("Nom d'utilisateur", key="new_contact_name", placeholder="Ex: alice", label_visibility="collapsed")
         with col2:
+            st.text_input("Domaine", key="new_contact_domain", placeholder="Domaine (optionnel)", label_visibility="collapsed")
+        with col3:
             st.button("➕ Ajouter", on_click=add_contact, use_container_width=True)
     
+    with st.expander("📥 Importer / 📤 Exporter", expanded=False):
+        show_import_report()
+        st.file_uploader("Fichier de contacts (CSV ou vCard)", type=["csv", "vcf"], key="contacts_file")
+        st.button("📥 Importer", on_click=import_contacts_file, use_container_width=True)
+        owner = st.session_state.username
+        # Exports générés au clic seulement, en lisant la base page par page
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button(
+                "📤 Contacts (CSV)",
+                data=lambda: "".join(export_contacts_csv(store.iter_contacts(owner))),
+                file_name=f"contacts_{owner}.csv", mime="text/csv", use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                "📤 Contacts (vCard)",
+                data=lambda: "".join(export_vcards(store.iter_contacts(owner))),
+                file_name=f"contacts_{owner}.vcf", mime="text/vcard", use_container_width=True
+            )
+        with col3:
+            st.download_button(
+                "📤 Messages (JSONL)",
+                data=lambda: "".join(export_messages_jsonl(store.iter_messages(owner))),
+                file_name=f"messages_{owner}.jsonl", mime="application/jsonl", use_container_width=True
+            )
+    
     st.divider()
     
     contacts = get_contacts(st.session_state.username)
@@ -543,7 +717,7 @@ elif st.session_state.page == "Contacts":
         
         if favorites:
             st.markdown("#### ⭐ Favoris")
-            for i, contact in enumerate(favorites):
+            for i, contact in enumerate(paginate(favorites, "favorites_page")):
                 col1, col2, col3 = st.columns([0.5, 0.1, 0.4])
                 with col1:
                     st.markdown(f"### {contact['name']}")
@@ -552,18 +726,16 @@ elif st.session_state.page == "Contacts":
                         "⭐",
                         key=f"fav_{contact['name']}_{i}",
                         on_click=toggle_fav,
-                        args=(contacts.index(contact),),
+                        args=(contact["name"],),
                         help="Retirer des favoris"
                     )
                 with col3:
-                    qr_img = generate_qr(contact["name"])
-                    if qr_img:
-                        st.image(qr_img, width=100)
+                    show_qr(contact)
                 st.divider()
         
         if others:
             st.markdown("#### 📋 Tous les contacts")
-            for i, contact in enumerate(others):
+            for i, contact in enumerate(paginate(others, "contacts_page")):
                 col1, col2, col3 = st.columns([0.5, 0.1, 0.4])
                 with col1:
                     st.markdown(f"### {contact['name']}")
@@ -572,49 +744,202 @@ elif st.session_state.page == "Contacts":
                         "☆",
                         key=f"unfav_{contact['name']}_{i}",
                         on_click=toggle_fav,
-                        args=(contacts.index(contact),),
+                        args=(contact["name"],),
                         help="Ajouter aux favoris"
                     )
                 with col3:
-                    qr_img = generate_qr(contact["name"])
-                    if qr_img:
-                        st.image(qr_img, width=100)
+                    show_qr(contact)
                 st.divider()
 
 # =============================
 # MESSAGES
 # =============================
- elif st.session_state.page == "Messages":contacts = get_contacts(st.session_state.username)
+elif st.session_state.page == "Messages":
+    st.markdown("### 💬 Messages")
     
-    for i, contact in enumerate(contacts):
-        messages = get_messages(st.session_state.username, contact["name"])
-        unread = len([m for m in messages if m["receiver"] == st.session_state.username])
-        
-        badge = f" 🔴 {unread}" if unread > 0 else ""
+    contacts = get_contacts(st.session_state.username)
+    
+    if not contacts:
+        st.info("📭 Aucun contact. Ajoutez-en un depuis la page Contacts !")
+    else:
+        # Un seul fil est chargé et affiché par exécution, quelle que soit la taille du réseau
+        username = st.session_state.username
+        names = [c["name"] for c in contacts]
+        # Le fil ouvert est marqué lu avant le calcul des pastilles
+        opened = st.session_state.get("thread_contact")
+        cache.mark_read(username, opened if opened in names else names[0])
+        unread = lambda name: cache.activity.unread(username, name)
+        contact_name = st.selectbox(
+            "Conversation",
+            names,
+            format_func=lambda name: f"💬 {name}" + (f" 🔴 {unread(name)}" if unread(name) else ""),
+            key="thread_contact"
+        )
+        show_thread(contact_name)
+        total = conversations.count(st.session_state.username, contact_name)
         
-        with st.expander(f"💬 {contact['name']}{badge}", expanded=(i==0)):
-            # Affichage + historique + résumé IA + suggestion + formulaire
-            if messages:
-                st.markdown("#### 📜 Historique")
-                for msg in messages[-10:]:
-                    # Affichage...
-                
-                # Bouton résumé IA
-                if ai_service.enabled and len(messages) > 3:
-                    if st.button(f"🤖 Résumer la conversation", key=f"summary_{i}"):
-                        summary = ai_service.summarize_conversation(messages)
-                        st.markdown(f'<div class="ai-analysis">📝 **Résumé**: {summary}</div>')
-                
-                # Bouton suggestion
-                if st.button(f"💡 Suggestion de réponse", key=f"suggest_{i}"):
-                    suggestion = ai_service.suggest_response(messages)
-                    st.markdown(f'<div class="ai-analysis">💡 {suggestion}</div>')
+        if total:
+            # Bouton résumé IA
+            if ai_service.enabled and total > 3:
+                summary_key = f"summary_text_{contact_name}"
+                if st.button(f"🤖 Résumer la conversation", key=f"summary_{contact_name}"):
+                    # Affichage au fil des tokens ; conservé pour les exécutions suivantes
+                    st.markdown("📝 **Résumé**")
+                    st.session_state[summary_key] = st.write_stream(stream_or_error(
+                        get_summarizer().stream(
+                            st.session_state.username, contact_name,
+                            get_messages(st.session_state.username, contact_name), st.session_state.ai_cancel
+                        )
+                    ))
+                elif st.session_state.get(summary_key):
+                    st.markdown(f'<div class="ai-analysis">📝 **Résumé**: {html.escape(st.session_state[summary_key])}</div>', unsafe_allow_html=True)
             
-            # Formulaire avec validation
-            with st.form(key=f"form_{contact['name']}_{i}"):
-                msg_input = st.text_area("✍️ Votre message", height=100)
-                submit = st.form_submit_button("📤 Envoyer")
-                if submit and msg_input.strip():
-                    send_message(contact["name"], msg_input)
-                    st.success("✅ Message envoyé !")
-                    st.rerun()
\ No newline at end of file
+            # Bouton suggestion
+            if st.button(f"💡 Suggestion de réponse", key=f"suggest_{contact_name}"):
+                st.markdown("💡 **Suggestion**")
+                recent = conversations.slice(st.session_state.username, contact_name, -5)
+                st.write_stream(ai_service.stream_suggest_response(recent, st.session_state.ai_cancel))
+        
+        # Formulaire avec validation
+        with st.form(key=f"form_{contact_name}"):
+            msg_input = st.text_area("✍️ Votre message", height=100)
+            submit = st.form_submit_button("📤 Envoyer")
+            if submit and msg_input.strip():
+                send_message(contact_name, msg_input)
+                st.success("✅ Message envoyé !")
+                st.rerun()
+
+# =============================
+# RECHERCHE
+# =============================
+elif st.session_state.page == "Recherche":
+    st.markdown("### 🔎 Recherche")
+    
+    query = st.text_input("Rechercher", key="search_query", placeholder="Messages, contacts, points clés IA...", label_visibility="collapsed")
+    kinds = st.multiselect(
+        "Filtrer",
+        ["message", "contact", "analysis"],
+        format_func={"message": "💬 Messages", "contact": "👥 Contacts", "analysis": "🤖 Analyses IA"}.get,
+        label_visibility="collapsed",
+        placeholder="Tous les types"
+    )
+    
+    if query.strip():
+        results = cache.search(st.session_state.username, query, kinds=set(kinds) or None)
+        if not results:
+            st.info("Aucun résultat")
+        for result in results:
+            item = result["item"]
+            if result["kind"] == "message":
+                sender = "Vous" if item["sender"] == st.session_state.username else item["sender"]
+                receiver = "Vous" if item["receiver"] == st.session_state.username else item["receiver"]
+                st.markdown(f"💬 **{sender}** → **{receiver}** · {item['timestamp'][:16]}")
+                st.markdown(f'<div class="message-received">{html.escape(item["text"])}</div>', unsafe_allow_html=True)
+            elif result["kind"] == "contact":
+                st.markdown(f"👥 **{item['name']}**" + (" ⭐" if item.get("favorite") else ""))
+            else:
+                label = "📝 Résumé" if item.get("kind") == "summary" else "🤖 Analyse IA"
+                st.markdown(f"{label} — **{item['contact']}**")
+                st.markdown(f'<div class="ai-analysis">{html.escape(analysis_text(item))}</div>', unsafe_allow_html=True)
+
+# =============================
+# IA ASSISTANT
+# =============================
+elif st.session_state.page == "IA Assistant":
+    st.markdown("### 🤖 IA Assistant")
+    
+    contacts = get_contacts(st.session_state.username)
+    if not contacts:
+        st.info("📭 Aucun contact à analyser")
+    else:
+        contact_name = st.selectbox("Contact", [c["name"] for c in contacts])
+        if st.button("🧠 Analyser la conversation"):
+            st.session_state[f"analysis_job_{contact_name}"] = job_queue.enqueue(
+                "conversation_analysis", {"owner": st.session_state.username, "contact": contact_name}
+            )
+        analysis_job = st.session_state.get(f"analysis_job_{contact_name}")
+        if analysis_job:
+            show_job(analysis_job, st.json)
+    
+    if ai_service.cache:
+        stats = ai_service.cache.stats()
+        st.caption(f"🗄️ Cache IA : {stats['hits']} hits / {stats['misses']} misses ({stats['bytes'] // 1024} Ko)")
+
+# =============================
+# STATISTIQUES
+# =============================
+elif st.session_state.page == "Statistiques":
+    st.markdown("### 📊 Statistiques")
+    
+    counts = cache.activity.counts(st.session_state.username)
+    contacts = get_contacts(st.session_state.username)
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("👥 Contacts", len(contacts))
+    with col2:
+        st.metric("📤 Envoyés", counts["sent"])
+    with col3:
+        st.metric("📥 Reçus", counts["received"])
+    with col4:
+        st.metric("🔴 Non lus", counts["unread"])
+    with col5:
+        st.metric("⭐ Favoris", counts["favorites"])
+    
+    st.divider()
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("### 📥 Reçus par contact")
+        received = sorted(
+            ((c["name"], cache.activity.received_from(st.session_state.username, c["name"])) for c in contacts),
+            key=lambda x: x[1],
+            reverse=True
+        )
+        if received:
+            for name, count in received:
+                st.markdown(f"**{name}** : {count}")
+        else:
+            st.info("Aucun contact")
+    
+    with col2:
+        st.markdown("### 📈 Activité récente")
+        recent_msgs = cache.activity.recent(st.session_state.username)
+        if recent_msgs:
+            for msg in recent_msgs:
+                sender = "Vous" if msg["sender"] == st.session_state.username else msg["sender"]
+                receiver = "Vous" if msg["receiver"] == st.session_state.username else msg["receiver"]
+                st.markdown(f"`{msg['timestamp'][:16]}` **{sender}** → **{receiver}**: {msg['text'][:50]}")
+        else:
+            st.info("Aucune activité récente")
+    
+    st.divider()
+    
+    stats = cache.analytics().for_user(st.session_state.username)
+    if stats["per_day"].empty:
+        st.info("📭 Pas encore assez d'activité pour des statistiques détaillées")
+    else:
+        st.markdown("### 📅 Messages par jour")
+        st.line_chart(stats["per_day"])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("### 🕐 Par heure")
+            st.bar_chart(stats["per_hour"])
+        with col2:
+            st.markdown("### 😊 Sentiment par semaine")
+            if stats["sentiment"].empty:
+                st.info("Aucun sentiment analysé")
+            else:
+                st.area_chart(stats["sentiment"], color=["#11998e", "#667eea", "#eb3349"])
+        
+        st.markdown("### ⏱️ Délais de réponse")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            st.dataframe(stats["response_times"], use_container_width=True)
+        with col2:
+            st.bar_chart(stats["response_distribution"])
+        
+        st.markdown("### 🏷️ Contacts par domaine")
+        st.bar_chart(stats["domains"])
@@ -0,0 +1,153 @@
+# summaries.py
+"""Résumés de conversation incrémentaux.
+
+Pour chaque conversation on conserve un résumé courant et un filigrane
+(timestamp, id) du dernier message intégré. Une nouvelle demande ne
+soumet au modèle que les messages postérieurs au filigrane : le coût
+d'un résumé dépend du nombre de nouveaux messages, pas de la longueur
+de l'historique.
+
+Un long arriéré (premier résumé d'un vieux fil) est traité de façon
+hiérarchique : chaque tranche de ``chunk_size`` messages est résumée
+séparément, puis les résumés sont fusionnés par groupes de ``fan_in``
+jusqu'à n'en garder qu'un.
+
+Le résumé, tiré des messages, est chiffré comme eux (voir crypto.py) ;
+l'AAD est la paire de participants.
+"""
+from datetime import datetime
+
+from crypto import aad, get_keyring
+from indexes import pair_key
+
+SUMMARY_CHUNK = 40
+SUMMARY_FAN_IN = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    user_a TEXT NOT NULL,
+    user_b TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    watermark_ts TEXT NOT NULL,
+    watermark_id INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_a, user_b)
+);
+"""
+
+
+def _position(message):
+    return message["timestamp"], message.get("id") or 0
+
+
+class RollingSummarizer:
+    """Résumé courant + filigrane par conversation, stockés dans la base."""
+
+    def __init__(self, pool, ai, chunk_size=SUMMARY_CHUNK, fan_in=SUMMARY_FAN_IN, keyring=None):
+        self.pool = pool
+        self.ai = ai
+        self.chunk_size = chunk_size
+        self.fan_in = fan_in
+        self._cipher = (keyring if keyring is not None else get_keyring()).cipher("summaries")
+        with pool.exclusive() as conn:
+            conn.executescript(SCHEMA)
+        if self._cipher.enabled:
+            # Résumés enregistrés avant le chiffrement
+            with pool.write() as conn:
+                rows = conn.execute(
+                    "SELECT user_a, user_b, summary FROM conversation_summaries WHERE typeof(summary) = 'text'"
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE conversation_summaries SET summary = ? WHERE user_a = ? AND user_b = ?",
+                    [(self._cipher.encrypt(summary, aad(a, b)), a, b) for a, b, summary in rows],
+                )
+
+    def get(self, user1, user2):
+        with self.pool.read() as conn:
+            row = conn.execute(
+                "SELECT summary, watermark_ts, watermark_id, message_count FROM conversation_summaries "
+                "WHERE user_a = ? AND user_b = ?",
+                pair_key(user1, user2),
+            ).fetchone()
+        if row is None:
+            return None
+        summary = self._cipher.decrypt(row[0], aad(*pair_key(user1, user2)))
+        return {"summary": summary, "watermark": (row[1], row[2]), "message_count": row[3]}
+
+    def _pending(self, user1, user2, messages):
+        state = self.get(user1, user2)
+        if state is None:
+            return state, messages
+        # Parcours depuis la fin : seuls les messages postérieurs au filigrane sont lus
+        start = len(messages)
+        while start > 0 and _position(messages[start - 1]) > state["watermark"]:
+            start -= 1
+        return state, messages[start:]
+
+    def summarize(self, user1, user2, messages):
+        """Résumé à jour de ``messages`` (triés par horodatage)."""
+        state, new = self._pending(user1, user2, messages)
+        previous = state["summary"] if state else None
+        if not new:
+            return previous
+
+        if len(new) <= self.chunk_size:
+            summary = self.ai.fold_summary(previous, new)
+        else:
+            summary = self._summarize_long(new)
+            if previous:
+                summary = self.ai.merge_summaries([previous, summary])
+
+        self._save(user1, user2, summary, state, new)
+        return summary
+
+    def stream(self, user1, user2, messages, cancel=None):
+        """Comme ``summarize``, mais l'étape finale est produite token par token.
+
+        Le résumé n'est enregistré que si la génération va jusqu'au bout.
+        """
+        state, new = self._pending(user1, user2, messages)
+        previous = state["summary"] if state else None
+        if not new:
+            if previous:
+                yield previous
+            return
+
+        if len(new) <= self.chunk_size:
+            parts = self.ai.stream_fold_summary(previous, new, cancel)
+        else:
+            long_summary = self._summarize_long(new)
+            parts = self.ai.stream_merge_summaries([previous, long_summary], cancel) if previous else iter([long_summary])
+
+        summary = []
+        for part in parts:
+            summary.append(part)
+            yield part
+        if cancel is None or not cancel.is_set():
+            self._save(user1, user2, "".join(summary), state, new)
+
+    def _summarize_long(self, messages):
+        summaries = [
+            self.ai.fold_summary(None, messages[i:i + self.chunk_size])
+            for i in range(0, len(messages), self.chunk_size)
+        ]
+        while len(summaries) > 1:
+            summaries = [
+                self.ai.merge_summaries(summaries[i:i + self.fan_in]) if len(summaries[i:i + self.fan_in]) > 1
+                else summaries[i]
+                for i in range(0, len(summaries), self.fan_in)
+            ]
+        return summaries[0]
+
+    def _save(self, user1, user2, summary, state, new):
+        watermark = _position(new[-1])
+        count = (state["message_count"] if state else 0) + len(new)
+        summary = self._cipher.encrypt(summary, aad(*pair_key(user1, user2)))
+        with self.pool.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_summaries "
+                "(user_a, user_b, summary, watermark_ts, watermark_id, message_count, updated_at) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (*pair_key(user1, user2), summary, watermark[0], watermark[1], count, datetime.now().isoformat()),
+            )
@@ -0,0 +1,73 @@
+# tests/test_ai_cache.py
+import secrets
+import time
+
+import pytest
+
+from ai_cache import ResultCache, cache_key
+from crypto import KEY_SIZE, Keyring
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "ai_cache.db"))
+
+
+def test_cache_key_depends_on_every_part():
+    key = cache_key("sentiment", "m1", "p", "texte")
+    assert key == cache_key("sentiment", "m1", "p", "texte")
+    assert len({key, cache_key("summary", "m1", "p", "texte"), cache_key("sentiment", "m2", "p", "texte"),
+                cache_key("sentiment", "m1", "p", "autre")}) == 4
+
+
+def test_get_or_compute_calls_the_model_once(cache):
+    calls = []
+    compute = lambda: calls.append(1) or {"label": "positif", "score": 0.9}
+    assert cache.get_or_compute("k", compute) == {"label": "positif", "score": 0.9}
+    assert cache.get_or_compute("k", compute) == {"label": "positif", "score": 0.9}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_entries_survive_reopen(cache, tmp_path):
+    cache.put("k", "résumé")
+    reopened = ResultCache(str(tmp_path / "ai_cache.db"))
+    assert reopened.get("k") == "résumé"
+    assert reopened.stats()["bytes"] == cache.stats()["bytes"]
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path / "ai_cache.db"), ttl=60)
+    cache.put("k", "v")
+    with cache.pool.write() as conn:
+        conn.execute("UPDATE ai_cache SET created_at = ?", (time.time() - 120,))
+    assert cache.get("k") is None
+    cache.evict()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_least_recently_read_entries_are_evicted_first(tmp_path):
+    cache = ResultCache(str(tmp_path / "ai_cache.db"), max_bytes=100)
+    for key in "abc":
+        cache.put(key, "x" * 28)
+    with cache.pool.write() as conn:
+        for key, accessed in (("a", 3), ("b", 1), ("c", 2)):
+            conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (accessed, key))
+    # Dépassement : les moins récemment lues partent jusqu'à 90 % de max_bytes
+    cache.put("d", "x" * 28)
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == cache.get("d") == "x" * 28
+    assert cache.stats()["bytes"] == 90
+
+
+def test_values_are_encrypted_and_plaintext_entries_dropped(tmp_path):
+    path = str(tmp_path / "ai_cache.db")
+    ResultCache(path, keyring=Keyring()).put("ancien", "résumé en clair")
+    cache = ResultCache(path, keyring=Keyring(secrets.token_bytes(KEY_SIZE)))
+    assert cache.get("ancien") is None
+    cache.put("k", {"summary": "secret"})
+    with cache.pool.read() as conn:
+        assert isinstance(conn.execute("SELECT value FROM ai_cache").fetchone()[0], bytes)
+    assert cache.get("k") == {"summary": "secret"}
+    assert cache.stats()["bytes"] > 0
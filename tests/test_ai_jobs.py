@@ -0,0 +1,150 @@
+# tests/test_ai_jobs.py
+import json
+import secrets
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from ai_jobs import JobQueue
+from crypto import KEY_SIZE, Keyring
+from data_access import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return ConnectionPool(str(tmp_path / "jobs.db"))
+
+
+def _queue(pool, handlers=None, results=None, **kw):
+    # workers=0 : pas de threads, les tests pilotent _claim / _run eux-mêmes
+    handlers = handlers or {"echo": lambda p: p["text"].upper()}
+    on_result = (lambda job, result: results.append(result)) if results is not None else (lambda job, result: None)
+    return JobQueue(pool, handlers, on_result, workers=0, **kw)
+
+
+def _row(pool, job_id, columns="status, attempts, owner, lease_until, not_before"):
+    with pool.read() as conn:
+        return conn.execute(f"SELECT {columns} FROM ai_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_claim_and_success(pool):
+    results = []
+    queue = _queue(pool, results=results)
+    job_id = queue.enqueue("echo", {"text": "é"})
+    job = queue._claim()
+    assert job == {"id": job_id, "kind": "echo", "payload": {"text": "é"}, "attempts": 1}
+    status, attempts, owner, lease_until, _ = _row(pool, job_id)
+    assert (status, attempts, owner) == ("running", 1, queue.owner)
+    assert lease_until > time.time()
+    # Tâche louée : pas prise une seconde fois
+    assert queue._claim() is None
+    queue._run(job)
+    assert queue.get(job_id) == {"id": job_id, "kind": "echo", "status": "done", "result": "É", "error": None}
+    assert results == ["É"]
+    assert queue.pending_count() == 0
+
+
+def test_failure_is_retried_with_exponential_delay(pool):
+    def fail(payload):
+        raise RuntimeError("API indisponible")
+
+    queue = _queue(pool, {"echo": fail}, retry_delay=10, retry_max_delay=15)
+    job_id = queue.enqueue("echo", {"text": "x"})
+    delays = []
+    for _ in range(2):
+        before = time.time()
+        queue._run(queue._claim())
+        status, _, owner, _, not_before = _row(pool, job_id)
+        assert (status, owner) == ("pending", None)
+        delays.append(not_before - before)
+        # Pas encore prête : ignorée jusqu'à not_before
+        assert queue._claim() is None
+        with pool.write() as conn:
+            conn.execute("UPDATE ai_jobs SET not_before = 0 WHERE id = ?", (job_id,))
+    assert 10 <= delays[0] < 11
+    assert 15 <= delays[1] < 16
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "API indisponible")
+
+
+def test_live_lease_of_another_process_is_kept(pool):
+    first = _queue(pool)
+    job_id = first.enqueue("echo", {"text": "a"})
+    first._claim()
+    # Redémarrage d'un autre processus : la tâche en cours n'est pas remise en attente
+    second = _queue(pool)
+    assert _row(pool, job_id)[:3] == ("running", 1, first.owner)
+    assert second._claim() is None
+
+
+def test_expired_lease_is_reclaimed(pool):
+    first = _queue(pool)
+    job_id = first.enqueue("echo", {"text": "a"})
+    stale = first._claim()
+    with pool.write() as conn:
+        conn.execute("UPDATE ai_jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+    second = _queue(pool)
+    job = second._claim()
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+    second._run(job)
+    # Le premier worker se réveille : son bail a été repris, il n'écrase rien
+    first._finish(stale["id"], "failed", error="trop tard")
+    assert second.get(job_id)["status"] == "done"
+
+
+def test_expired_lease_on_last_attempt_fails(pool):
+    queue = _queue(pool, max_attempts=1)
+    job_id = queue.enqueue("echo", {"text": "a"})
+    queue._claim()
+    with pool.write() as conn:
+        conn.execute("UPDATE ai_jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+    assert queue._claim() is None
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_finished_jobs_are_purged(pool):
+    queue = _queue(pool)
+    old, recent, waiting = (queue.enqueue("echo", {"text": t}) for t in "abc")
+    for job_id in (old, recent):
+        queue._run(queue._claim())
+    with pool.write() as conn:
+        conn.execute(
+            "UPDATE ai_jobs SET updated_at = ? WHERE id = ?",
+            ((datetime.now() - timedelta(days=30)).isoformat(), old),
+        )
+    assert queue.purge() == 1
+    assert queue.get(old) is None
+    assert queue.get(recent)["status"] == "done"
+    assert queue.get(waiting)["status"] == "pending"
+
+
+def test_workers_process_jobs(pool):
+    results = []
+    queue = JobQueue(pool, {"echo": lambda p: p["text"]}, lambda job, result: results.append(result), workers=2)
+    ids = [queue.enqueue("echo", {"text": str(i)}) for i in range(5)]
+    deadline = time.time() + 5
+    while queue.pending_count() and time.time() < deadline:
+        time.sleep(0.02)
+    assert sorted(results) == [str(i) for i in range(5)]
+    assert all(queue.get(i)["status"] == "done" for i in ids)
+
+
+def test_results_are_encrypted_and_payloads_hold_no_text(pool):
+    keyring = Keyring(secrets.token_bytes(KEY_SIZE))
+    # Tâches d'une version précédente : texte du message et résultat en clair
+    plain = _queue(pool, {"sentiment": lambda p: {"sentiment": "positif"}})
+    old = plain.enqueue("sentiment", {"message_id": 1, "text": "Bonjour bob"})
+    plain._run(plain._claim())
+    queue = _queue(pool, keyring=keyring)
+    with pool.read() as conn:
+        payload, result = conn.execute("SELECT payload, typeof(result) FROM ai_jobs WHERE id = ?", (old,)).fetchone()
+    assert json.loads(payload) == {"message_id": 1}
+    assert result == "blob"
+    assert queue.get(old)["result"] == {"sentiment": "positif"}
+    job_id = queue.enqueue("echo", {"text": "secret"})
+    queue._run(queue._claim())
+    with pool.read() as conn:
+        assert isinstance(conn.execute("SELECT result FROM ai_jobs WHERE id = ?", (job_id,)).fetchone()[0], bytes)
+    assert queue.get(job_id)["result"] == "SECRET"
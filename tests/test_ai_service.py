@@ -0,0 +1,84 @@
+# tests/test_ai_service.py
+import threading
+
+import pytest
+
+from ai_cache import ResultCache
+from ai_service import AIService
+
+
+class FakeStream:
+    def __init__(self, parts):
+        self.parts = iter(parts)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.parts)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeLLM:
+    models = {"chat": "fake-chat", "analysis": "fake-analysis"}
+
+    def __init__(self, parts=("Bon", "jour", " !")):
+        self.parts = parts
+        self.streams = []
+
+    def stream(self, model, messages, max_tokens):
+        self.streams.append(FakeStream(self.parts))
+        return self.streams[-1]
+
+    def complete(self, model, messages, max_tokens):
+        return "".join(self.parts)
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def ai(tmp_path, llm):
+    return AIService(cache=ResultCache(str(tmp_path / "ai_cache.db")), llm=llm)
+
+
+HISTORY = [{"sender": "alice", "text": "salut"}]
+
+
+def test_complete_stream_is_cached(ai, llm):
+    assert list(ai.stream_suggest_response(HISTORY)) == ["Bon", "jour", " !"]
+    assert llm.streams[0].closed
+    # Même requête : réponse entière servie par le cache, sans appel au modèle
+    assert list(ai.stream_suggest_response(HISTORY)) == ["Bonjour !"]
+    assert len(llm.streams) == 1
+    assert ai.suggest_response(HISTORY) == "Bonjour !"
+
+
+def test_cancelled_stream_is_closed_and_not_cached(ai, llm):
+    cancel = threading.Event()
+    parts = ai.stream_suggest_response(HISTORY, cancel)
+    assert next(parts) == "Bon"
+    cancel.set()
+    assert list(parts) == []
+    assert llm.streams[0].closed
+    assert ai.cache.stats()["bytes"] == 0
+
+
+def test_closing_the_generator_closes_the_stream(ai, llm):
+    parts = ai.stream_fold_summary(None, HISTORY)
+    next(parts)
+    parts.close()
+    assert llm.streams[0].closed
+
+
+def test_stream_error_is_shown_in_the_reply(ai, llm):
+    def fail(model, messages, max_tokens):
+        raise RuntimeError("quota")
+
+    llm.stream = fail
+    assert list(ai.stream_suggest_response(HISTORY)) == ["Erreur: quota"]
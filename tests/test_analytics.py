@@ -0,0 +1,66 @@
+# tests/test_analytics.py
+import pytest
+
+from analytics import Analytics
+from indexes import build_contact_index
+
+
+def _message(i, sender, receiver, timestamp):
+    return {"id": i, "sender": sender, "receiver": receiver, "text": f"m{i}", "timestamp": timestamp}
+
+
+@pytest.fixture
+def data():
+    return {"messages": [
+        _message(1, "bob", "alice", "2026-01-05T09:00:00"),
+        _message(2, "alice", "bob", "2026-01-05T09:03:00"),
+        _message(3, "bob", "alice", "2026-01-05T11:03:00"),
+        _message(4, "carol", "alice", "2026-01-06T14:00:00"),
+        _message(5, "bob", "carol", "2026-01-06T15:00:00"),
+    ]}
+
+
+@pytest.fixture
+def analytics(data):
+    contacts = build_contact_index([
+        {"owner": "alice", "name": "bob", "domain": "Design"},
+        {"owner": "alice", "name": "carol"},
+    ])
+    return Analytics(data, {1: {"sentiment": "positif"}, 2: {"sentiment": "neutre"}}, contacts)
+
+
+def test_per_day_and_per_hour(analytics):
+    stats = analytics.for_user("alice")
+    assert stats["per_day"]["Envoyés"].tolist() == [1, 0]
+    assert stats["per_day"]["Reçus"].tolist() == [2, 1]
+    assert len(stats["per_hour"]) == 24
+    assert stats["per_hour"].loc[9].tolist() == [1, 1]
+
+
+def test_response_times(analytics):
+    stats = analytics.for_user("alice")
+    times = stats["response_times"]
+    assert times.loc["bob", "Mon délai médian (min)"] == 3.0
+    assert times.loc["bob", "Son délai médian (min)"] == 120.0
+    assert stats["response_distribution"]["< 5 min"] == 1
+
+
+def test_sentiment_and_domains(analytics):
+    stats = analytics.for_user("alice")
+    assert stats["sentiment"].sum().to_dict() == {"positif": 1, "neutre": 1, "négatif": 0}
+    assert stats["domains"].to_dict() == {"Design": 1, "Non renseigné": 1}
+
+
+def test_results_are_cached_until_touched(analytics, data):
+    first = analytics.for_user("alice")
+    assert analytics.for_user("alice") is first
+    data["messages"].append(_message(6, "alice", "carol", "2026-01-07T08:00:00"))
+    # Message d'autres utilisateurs : alice reste en cache
+    analytics.touch("bob")
+    assert analytics.for_user("alice") is first
+    analytics.touch("alice", "carol")
+    assert analytics.for_user("alice")["per_day"]["Envoyés"].sum() == 2
+    # Sentiment d'un message déjà en colonnes : ses deux utilisateurs sont recalculés
+    cached = analytics.for_user("carol")
+    analytics.sentiment_added(6)
+    assert analytics.for_user("carol") is not cached
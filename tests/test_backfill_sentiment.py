@@ -0,0 +1,28 @@
+# tests/test_backfill_sentiment.py
+from backfill_sentiment import backfill
+from crypto import Keyring
+from store import Store
+
+
+class FakeAI:
+    def __init__(self, verdict):
+        self.verdict = verdict
+
+    def analyze_sentiment_batch(self, items):
+        return {m["id"]: self.verdict for m in items}
+
+
+def test_rescore_replaces_previous_analyses(tmp_path):
+    store = Store(str(tmp_path / "data.db"), keyring=Keyring())
+    store.add_messages([
+        {"sender": "alice", "receiver": "bob", "text": f"m{i}", "timestamp": f"2026-01-01T00:00:{i:02d}"}
+        for i in range(7)
+    ])
+    checkpoint = str(tmp_path / "checkpoint.json")
+    assert backfill(store, FakeAI("neutre"), batch_size=3, concurrency=2, checkpoint=checkpoint) == 7
+    # Reprise : rien de nouveau à analyser
+    assert backfill(store, FakeAI("neutre"), batch_size=3, checkpoint=checkpoint, restart=True) == 0
+    assert backfill(store, FakeAI("positif"), batch_size=3, rescore=True, checkpoint=checkpoint, restart=True) == 7
+    analyses = store.load()["ai_analyses"]
+    assert sorted(a["message_id"] for a in analyses) == list(range(1, 8))
+    assert {a["sentiment"] for a in analyses} == {"positif"}
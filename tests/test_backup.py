@@ -0,0 +1,76 @@
+# tests/test_backup.py
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+
+from backup import _now, backup_files, restore_files
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_files_are_restored_under_the_output_dir(workdir, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("log")
+    (outside / "00000001.jsonl").write_text('{"a": 1}\n')
+    (workdir / "users.json").write_text("{}")
+    manifest = backup_files([str(outside), "users.json"], workdir / "backups", _now())
+    keys = json.loads(manifest.read_text())
+    assert "users.json" in keys
+    assert all(not k.startswith(("/", "..")) for k in keys)
+
+    output = workdir / "restore"
+    restore_files(workdir / "backups", datetime.now(timezone.utc), output)
+    assert (output / "users.json").read_text() == "{}"
+    restored = output / (outside / "00000001.jsonl").relative_to("/")
+    assert restored.read_text() == '{"a": 1}\n'
+    # Le journal d'origine n'a pas été touché
+    assert (outside / "00000001.jsonl").read_text() == '{"a": 1}\n'
+
+
+@pytest.mark.parametrize("key", ["/etc/passwd", "../evil.json", "messages_log/../../evil.json", "C:\\\\evil"])
+def test_unsafe_manifest_keys_are_rejected(workdir, key):
+    (workdir / "users.json").write_text("{}")
+    manifest = backup_files(["users.json"], workdir / "backups", _now())
+    entries = json.loads(manifest.read_text())
+    manifest.write_text(json.dumps({**entries, key: entries["users.json"]}))
+    output = workdir / "restore"
+    with pytest.raises(ValueError):
+        restore_files(workdir / "backups", datetime.now(timezone.utc), output)
+    assert not output.exists()
+
+
+def _restore(workdir):
+    output = workdir / "restore"
+    shutil.rmtree(output, ignore_errors=True)
+    restore_files(workdir / "backups", datetime.now(timezone.utc), output)
+    return (output / "log" / "00000001.jsonl").read_bytes()
+
+
+@pytest.mark.parametrize("replace", [True, False])
+def test_rewritten_segment_is_copied_in_full(workdir, replace):
+    segment = workdir / "log" / "00000001.jsonl"
+    segment.parent.mkdir()
+    segment.write_bytes(b'{"text": "bonjour"}\n')
+    backup_files(["log"], workdir / "backups", _now())
+    segment.write_bytes(segment.read_bytes() + b'{"text": "salut"}\n')
+    manifest = backup_files(["log"], workdir / "backups", _now())
+    # Ajout seul : seule la suite est copiée
+    assert len(json.loads(manifest.read_text())["log/00000001.jsonl"]["pieces"]) == 2
+    assert _restore(workdir) == b'{"text": "bonjour"}\n{"text": "salut"}\n'
+
+    # Réécriture plus longue (chiffrement, compactage) : la partie déjà sauvegardée a changé
+    rewritten = b'{"text": "enc1:AAAAAAAA"}\n{"text": "enc1:BBBBBBBB"}\n'
+    if replace:
+        tmp = segment.with_name("tmp")
+        tmp.write_bytes(rewritten)
+        os.replace(tmp, segment)
+    else:
+        segment.write_bytes(rewritten)
+    backup_files(["log"], workdir / "backups", _now())
+    assert _restore(workdir) == rewritten
@@ -0,0 +1,35 @@
+# tests/test_bulk_io.py
+import io
+from functools import partial
+
+from bulk_io import export_contacts_csv, import_contacts, import_messages, read_contacts_csv
+from crypto import Keyring
+from store import Store
+
+
+def _message(i, **kw):
+    return {"sender": "alice", "receiver": "bob", "text": f"message {i}", "timestamp": f"2026-01-01T00:00:{i:02d}", **kw}
+
+
+def test_messages_already_present_are_skipped(tmp_path):
+    store = Store(str(tmp_path / "data.db"), keyring=Keyring())
+    store.add_messages([_message(0), _message(1)])
+    records = [_message(0, id=7), _message(2), _message(3), _message(2), None, _message(3, receiver="eve")]
+    # Tranches de 2 : le second « message 2 » est dans une autre tranche que le premier
+    report = import_messages(records, partial(store.add_messages, skip_existing=True), lambda u: u != "eve", chunk_size=2)
+    assert [m["text"] for m in store.iter_messages()] == ["message 0", "message 1", "message 2", "message 3"]
+    assert (report["imported"], report["duplicates"], report["invalid"], report["unknown_users"]) == (2, 2, 1, 1)
+
+
+def test_contact_details_survive_csv_round_trip():
+    source = "nom,favori,domaine,occasion,notes\nbob,oui,Design,Salon,À rappeler\n"
+    stored = []
+    report = import_contacts(
+        read_contacts_csv(io.StringIO(source)), "alice", lambda c: stored.extend(c) or len(c), lambda u: True
+    )
+    assert report["imported"] == 1
+    exported = "".join(export_contacts_csv(stored))
+    contact = next(read_contacts_csv(io.StringIO(exported)))
+    assert contact == {
+        "name": "bob", "favorite": True, "created_at": None, "domain": "Design", "occasion": "Salon", "notes": "À rappeler",
+    }
@@ -0,0 +1,80 @@
+# tests/test_credentials.py
+import hashlib
+
+import pytest
+
+from credentials import Credentials, _check, hash_password, identify, needs_rehash
+
+
+@pytest.fixture
+def credentials():
+    creds = Credentials(workers=1)
+    yield creds
+    creds.close()
+
+
+def test_scrypt_round_trip():
+    stored = hash_password("secret", log_n=4)
+    assert identify(stored) == "scrypt"
+    assert _check("secret", stored)
+    assert not _check("autre", stored)
+    assert needs_rehash(stored)
+    assert not needs_rehash(hash_password("secret"))
+
+
+@pytest.mark.parametrize("stored", [
+    "scrypt$abc",
+    "scrypt$x$8$1$c2Vs$ZW1w",
+    "scrypt$14$8$1$!!!$???",
+    "scrypt$99$8$1$c2Vs$ZW1w",
+    "scrypt$14$8$1$c2Vs$dHJvcCBjb3VydA",
+])
+def test_malformed_scrypt_is_read_as_plaintext(stored):
+    assert identify(stored) == "plain"
+    assert not _check("x", stored)
+    assert _check(stored, stored)
+    assert needs_rehash(stored)
+
+
+def test_legacy_format_is_given_by_the_store():
+    digest = hashlib.sha256(b"secret").hexdigest()
+    assert _check("secret", digest, legacy="sha256")
+    # L'empreinte elle-même ne vaut pas mot de passe
+    assert not _check(digest, digest, legacy="sha256")
+    # Dans un stockage en clair, 64 chiffres hexadécimaux sont un mot de passe
+    assert identify(digest, legacy="plain") == "plain"
+    assert _check(digest, digest, legacy="plain")
+    assert not _check("secret", digest, legacy="plain")
+
+
+def test_verify_returns_new_hash_for_legacy_formats(credentials):
+    ok, new_hash = credentials.verify("secret", "secret", legacy="plain")
+    assert ok and identify(new_hash) == "scrypt" and _check("secret", new_hash)
+    assert credentials.verify("autre", "secret", legacy="plain") == (False, None)
+    assert credentials.verify("secret", None) == (False, None)
+
+
+def test_successful_checks_are_cached_without_the_password(credentials, monkeypatch):
+    stored = hash_password("secret", log_n=10)
+    assert credentials.verify("secret", stored)[0]
+    calls = []
+    monkeypatch.setattr("credentials._check", lambda *args: calls.append(args) or False)
+    # Succès récent : pas de nouveau calcul scrypt ; un échec n'est jamais mis en cache
+    assert credentials.verify("secret", stored)[0]
+    assert credentials.verify("faux", stored) == (False, None)
+    assert len(calls) == 1
+    assert all(b"secret" not in key for key in credentials._verified)
+    # Empreinte changée (nouveau mot de passe) : l'ancien succès ne vaut plus
+    assert credentials.verify("secret", hash_password("secret", log_n=10)) == (False, None)
+
+
+def test_cache_expires_and_is_bounded():
+    creds = Credentials(workers=1, ttl=0, cache_size=2)
+    try:
+        stored = [hash_password(f"pw{i}", log_n=10) for i in range(3)]
+        for i, s in enumerate(stored):
+            assert creds.verify(f"pw{i}", s)[0]
+        assert len(creds._verified) == 2
+        assert not creds._cached(creds._cache_key("pw2", stored[2]))
+    finally:
+        creds.close()
@@ -0,0 +1,100 @@
+# tests/test_crypto.py
+import base64
+import secrets
+
+import pytest
+
+from crypto import KEY_SIZE, TEXT_PREFIX, CryptoError, FieldCipher, Keyring, PlainCipher, aad, parse_key
+
+
+@pytest.fixture
+def cipher():
+    return FieldCipher(secrets.token_bytes(KEY_SIZE))
+
+
+def test_round_trip(cipher):
+    sealed = cipher.encrypt("Réunion à 14h", aad("alice", "bob", "2026-01-01T10:00:00"))
+    assert isinstance(sealed, bytes) and b"14h" not in sealed
+    assert cipher.decrypt(sealed, aad("alice", "bob", "2026-01-01T10:00:00")) == "Réunion à 14h"
+
+
+def test_nonce_is_random(cipher):
+    assert cipher.encrypt("même texte") != cipher.encrypt("même texte")
+
+
+def test_ciphertext_is_bound_to_its_row(cipher):
+    sealed = cipher.encrypt("secret", aad("alice", "bob", "t1"))
+    # Recopié sur une autre ligne, le chiffré ne se déchiffre pas
+    with pytest.raises(CryptoError):
+        cipher.decrypt(sealed, aad("alice", "carol", "t1"))
+    with pytest.raises(CryptoError):
+        cipher.decrypt(sealed, aad("alice", "bob", "t2"))
+
+
+def test_tampered_ciphertext_is_rejected(cipher):
+    sealed = bytearray(cipher.encrypt("secret", b"ad"))
+    sealed[-1] ^= 1
+    with pytest.raises(CryptoError):
+        cipher.decrypt(bytes(sealed), b"ad")
+    with pytest.raises(CryptoError):
+        cipher.decrypt(b"\x02" + bytes(sealed[1:]), b"ad")
+
+
+def test_wrong_key_is_rejected(cipher):
+    sealed = cipher.encrypt("secret", b"ad")
+    with pytest.raises(CryptoError):
+        FieldCipher(secrets.token_bytes(KEY_SIZE)).decrypt(sealed, b"ad")
+
+
+def test_batch_matches_single_values(cipher):
+    values = ["un", None, "trois"]
+    ads = [aad("m", i) for i in range(3)]
+    sealed = cipher.encrypt_many(values, ads)
+    assert sealed[1] is None
+    assert cipher.decrypt_many(sealed, ads) == values
+    assert cipher.decrypt(sealed[2], ads[2]) == "trois"
+    with pytest.raises(CryptoError):
+        cipher.decrypt_many(sealed, list(reversed(ads)))
+
+
+def test_plaintext_values_are_read_as_is(cipher):
+    # Données écrites avant l'activation du chiffrement
+    assert cipher.decrypt("ancien texte", b"ad") == "ancien texte"
+    assert cipher.decrypt_text("ancien texte", b"ad") == "ancien texte"
+
+
+def test_text_variant(cipher):
+    sealed = cipher.encrypt_text("contenu", b"ad")
+    assert sealed.startswith(TEXT_PREFIX)
+    assert cipher.decrypt_text(sealed, b"ad") == "contenu"
+    with pytest.raises(CryptoError):
+        cipher.decrypt_text(sealed, b"autre")
+
+
+def test_plain_cipher_refuses_encrypted_values(cipher):
+    plain = PlainCipher()
+    assert plain.encrypt("texte") == "texte"
+    with pytest.raises(CryptoError):
+        plain.decrypt(cipher.encrypt("texte"))
+    with pytest.raises(CryptoError):
+        plain.decrypt_text(cipher.encrypt_text("texte"))
+
+
+def test_keyring_derives_one_key_per_purpose():
+    master = secrets.token_bytes(KEY_SIZE)
+    keyring = Keyring(master)
+    assert keyring.cipher("messages") is keyring.cipher("messages")
+    sealed = keyring.cipher("messages").encrypt("texte", b"ad")
+    assert Keyring(master).cipher("messages").decrypt(sealed, b"ad") == "texte"
+    with pytest.raises(CryptoError):
+        keyring.cipher("contacts").decrypt(sealed, b"ad")
+    assert not Keyring().enabled
+    assert isinstance(Keyring().cipher("messages"), PlainCipher)
+
+
+def test_parse_key_accepts_hex_and_base64():
+    key = secrets.token_bytes(KEY_SIZE)
+    assert parse_key(key.hex()) == key
+    assert parse_key(base64.b64encode(key).decode()) == key
+    with pytest.raises(CryptoError):
+        parse_key("trop court")
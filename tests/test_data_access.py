@@ -0,0 +1,143 @@
+# tests/test_data_access.py
+import threading
+
+import pytest
+
+import data_access
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = data_access.connect(str(tmp_path / "collabo.db"))
+    data_access.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def _send(conn, count, sender="alice", receiver="bob", start=0):
+    return [
+        data_access.insert_message(conn, sender, receiver, f"m{i}", f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}")
+        for i in range(start, start + count)
+    ]
+
+
+def test_migrations_are_applied_once(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(data_access.MIGRATIONS)
+    assert data_access.migrate(conn) == len(data_access.MIGRATIONS)
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_messages_sender_ts", "idx_messages_receiver_ts", "idx_contacts_owner"} <= indexes
+
+
+def test_feed_pages_follow_the_cursor(conn):
+    _send(conn, 5)
+    _send(conn, 5, "bob", "alice", start=5)
+    _send(conn, 3, "bob", "carol", start=10)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = data_access.fetch_feed(conn, "alice", limit=4, before=cursor)
+        seen.extend(r[3] for r in rows)
+        if cursor is None:
+            break
+    assert seen == [f"m{i}" for i in range(9, -1, -1)]
+
+
+def test_feed_counts_messages_to_self_once(conn):
+    _send(conn, 2, "alice", "alice")
+    rows, cursor = data_access.fetch_feed(conn, "alice")
+    assert [r[3] for r in rows] == ["m1", "m0"]
+    assert cursor is None
+
+
+def test_feed_since_includes_the_cursor(conn):
+    ids = _send(conn, 4)
+    rows = data_access.fetch_feed_since(conn, "bob", ("2026-01-01T00:00:02", ids[2]))
+    assert [r[0] for r in rows] == [ids[3], ids[2]]
+
+
+def test_users(conn):
+    assert data_access.insert_user(conn, "alice", "h1")
+    assert not data_access.insert_user(conn, "alice", "h2")
+    data_access.update_password(conn, "alice", "h3")
+    assert data_access.fetch_user(conn, "alice") == ("alice", "h3")
+    assert data_access.fetch_user(conn, "inconnu") is None
+
+
+def test_contacts(conn):
+    data_access.insert_contact(conn, "alice", "bob", "Design", "Salon", "notes")
+    data_access.insert_contact(conn, "carol", "bob", None, None, None)
+    assert data_access.fetch_contacts(conn, "alice") == [("bob", "Design", "Salon")]
+    assert [c[1:] for c in data_access.iter_contacts(conn)] == [
+        ("alice", "bob", "Design", "Salon", "notes"), ("carol", "bob", None, None, None),
+    ]
+
+
+def test_iter_messages_reads_everything(conn):
+    _send(conn, 1500)
+    assert [r[3] for r in data_access.iter_messages(conn)] == [f"m{i}" for i in range(1500)]
+
+
+# ------------------------------
+# Pool de connexions
+# ------------------------------
+@pytest.fixture
+def pool(tmp_path):
+    pool = data_access.ConnectionPool(str(tmp_path / "pool.db"), readers=2)
+    with pool.exclusive() as conn:
+        data_access.migrate(conn)
+    return pool
+
+
+def test_write_commits_or_rolls_back(pool):
+    with pool.write() as conn:
+        data_access.insert_user(conn, "alice", "h")
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            data_access.insert_user(conn, "bob", "h")
+            raise RuntimeError("échec")
+    with pool.read() as conn:
+        assert [r[0] for r in conn.execute("SELECT username FROM users")] == ["alice"]
+
+
+def test_concurrent_writers_are_serialized(pool):
+    def send(n):
+        for i in range(50):
+            with pool.write() as conn:
+                data_access.insert_message(conn, f"user{n}", "bob", f"m{i}", "2026-01-01T00:00:00")
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with pool.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 200
+
+
+def test_reads_are_not_blocked_by_an_open_write(pool):
+    with pool.write() as conn:
+        data_access.insert_user(conn, "alice", "h")
+        # Lecture depuis un autre thread pendant la transaction : état validé précédent (WAL)
+        result = []
+        reader = threading.Thread(target=lambda: result.append(_count_users(pool)))
+        reader.start()
+        reader.join(timeout=5)
+        assert result == [0]
+    assert _count_users(pool) == 1
+
+
+def test_reader_connections_are_reused(pool):
+    with pool.read() as first:
+        pass
+    with pool.read() as second:
+        assert second is first
+    # Transaction de lecture laissée ouverte : annulée au retour dans le pool
+    with pool.read() as conn:
+        conn.execute("BEGIN")
+        conn.execute("SELECT 1")
+    with pool.read() as conn:
+        assert not conn.in_transaction
+
+
+def _count_users(pool):
+    with pool.read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
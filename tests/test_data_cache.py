@@ -0,0 +1,85 @@
+# tests/test_data_cache.py
+import pytest
+
+from crypto import Keyring
+from data_cache import DataCache
+from store import Store
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "data.db")
+
+
+@pytest.fixture
+def cache(path):
+    store = Store(path, keyring=Keyring())
+    for name in ("alice", "bob"):
+        store.add_user({"username": name, "password": "x"})
+    return DataCache(store)
+
+
+def _message(text, sender="alice", receiver="bob"):
+    return {"sender": sender, "receiver": receiver, "text": text, "timestamp": "2026-01-01T10:00:00"}
+
+
+def test_writes_go_to_the_store_and_the_snapshot(cache, path):
+    assert cache.add_user({"username": "carol", "password": "x"})
+    assert not cache.add_user({"username": "carol", "password": "y"})
+    assert cache.add_contact({"owner": "alice", "name": "bob", "favorite": False})
+    assert not cache.add_contact({"owner": "alice", "name": "bob", "favorite": False})
+    msg_id = cache.add_message(_message("bonjour"))
+
+    assert cache.users["carol"]["password"] == "x"
+    assert cache.contacts.get("alice", "bob") is not None
+    assert [m["id"] for m in cache.conversations.get("bob", "alice")] == [msg_id]
+    # Écriture en place : la version suit celle du store sans rechargement
+    assert cache.version == cache.store.version()
+
+    reloaded = Store(path, keyring=Keyring()).load()
+    assert [u["username"] for u in reloaded["users"]] == ["alice", "bob", "carol"]
+    assert [m["text"] for m in reloaded["messages"]] == ["bonjour"]
+
+
+def test_refresh_picks_up_writes_from_another_process(cache, path):
+    other = Store(path, keyring=Keyring())
+    other.add_message(_message("d'ailleurs", "bob", "alice"))
+    assert cache.conversations.get("alice", "bob") == []
+    cache.refresh()
+    assert [m["text"] for m in cache.conversations.get("alice", "bob")] == ["d'ailleurs"]
+
+
+def test_interleaved_write_reloads_the_snapshot(cache, path):
+    Store(path, keyring=Keyring()).add_user({"username": "dave", "password": "x"})
+    # La version a sauté de deux : l'écriture de l'autre processus est rechargée aussi
+    cache.add_message(_message("bonjour"))
+    assert "dave" in cache.users
+    assert cache.version == cache.store.version()
+    assert len(cache.conversations.get("alice", "bob")) == 1
+
+
+def test_favorite_and_password_updates(cache, path):
+    cache.add_contact({"owner": "alice", "name": "bob", "favorite": False})
+    cache.set_favorite(cache.contacts.get("alice", "bob"), True)
+    cache.set_password(cache.users["alice"], "nouveau")
+    data = Store(path, keyring=Keyring()).load()
+    assert data["contacts"][0]["favorite"] is True
+    assert next(u for u in data["users"] if u["username"] == "alice")["password"] == "nouveau"
+
+
+def test_mark_read_persists_the_cursor(cache, path):
+    cache.add_contact({"owner": "bob", "name": "alice", "favorite": False})
+    first = cache.add_message(_message("un"))
+    last = cache.add_message(_message("deux"))
+    assert cache.activity.counts("bob")["unread"] == 2
+    cache.mark_read("bob", "alice")
+    assert cache.activity.counts("bob")["unread"] == 0
+    version = cache.version
+    # Rien de nouveau : pas d'écriture
+    cache.mark_read("bob", "alice")
+    assert cache.version == version
+    cursors = Store(path, keyring=Keyring()).load()["read_cursors"]
+    assert [(c["user"], c["contact"], c["last_read_id"]) for c in cursors] == [("bob", "alice", last)]
+    # Un curseur plus ancien ne fait pas reculer celui de la base
+    cache.store.mark_read("bob", "alice", first)
+    assert Store(path, keyring=Keyring()).load()["read_cursors"][0]["last_read_id"] == last
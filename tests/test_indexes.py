@@ -0,0 +1,140 @@
+# tests/test_indexes.py
+from indexes import (
+    ActivityIndex, ConversationIndex, build_activity_index, build_contact_index, build_conversation_index, build_user_index, pair_key,
+)
+
+
+def _message(i, sender="alice", receiver="bob", timestamp=None):
+    return {"id": i, "sender": sender, "receiver": receiver, "text": f"m{i}", "timestamp": timestamp or f"2026-01-01T00:00:{i:02d}"}
+
+
+def _ids(messages):
+    return [m["id"] for m in messages]
+
+
+def test_pair_key_ignores_direction():
+    assert pair_key("bob", "alice") == pair_key("alice", "bob") == ("alice", "bob")
+
+
+def test_thread_is_shared_by_both_directions():
+    index = build_conversation_index([
+        _message(1), _message(2, "bob", "alice"), _message(3, "alice", "carol"), _message(4),
+    ])
+    assert _ids(index.get("alice", "bob")) == [1, 2, 4]
+    assert _ids(index.get("bob", "alice")) == [1, 2, 4]
+    assert _ids(index.get("carol", "alice")) == [3]
+    assert index.get("bob", "carol") == []
+    assert index.count("alice", "bob") == 3
+    assert len(index) == 4
+
+
+def test_late_message_is_inserted_by_timestamp():
+    index = ConversationIndex()
+    for m in (_message(1), _message(3), _message(2, timestamp="2026-01-01T00:00:02")):
+        index.add(m["sender"], m["receiver"], m["timestamp"], m)
+    assert _ids(index.get("alice", "bob")) == [1, 2, 3]
+    # Même horodatage : l'ordre d'arrivée est conservé
+    index.add("bob", "alice", "2026-01-01T00:00:02", _message(9))
+    assert _ids(index.get("alice", "bob")) == [1, 2, 9, 3]
+
+
+def test_slice_and_returned_lists_are_copies():
+    index = build_conversation_index([_message(i) for i in range(1, 6)])
+    assert _ids(index.slice("alice", "bob", -2)) == [4, 5]
+    assert _ids(index.slice("alice", "bob", 1, 3)) == [2, 3]
+    thread = index.get("alice", "bob")
+    thread.clear()
+    assert index.count("alice", "bob") == 5
+
+
+def test_remap_replaces_items_of_given_threads():
+    index = ConversationIndex()
+    index.add("alice", "bob", "t1", (1, 0))
+    index.add("alice", "carol", "t2", (1, 50))
+    index.remap([pair_key("alice", "bob")], lambda entry: (2, entry[1] + 10))
+    assert index.get("alice", "bob") == [(2, 10)]
+    assert index.get("alice", "carol") == [(1, 50)]
+
+
+# ------------------------------
+# Utilisateurs et contacts
+# ------------------------------
+def _contact(owner, name, favorite=False):
+    return {"owner": owner, "name": name, "favorite": favorite}
+
+
+def test_user_index():
+    users = build_user_index([{"username": "alice"}, {"username": "bob"}])
+    assert users["bob"] == {"username": "bob"}
+    assert "carol" not in users
+
+
+def test_contacts_are_looked_up_by_owner_and_name():
+    index = build_contact_index([_contact("alice", "bob"), _contact("alice", "carol"), _contact("bob", "alice")])
+    assert index.get("alice", "carol")["name"] == "carol"
+    assert index.get("carol", "alice") is None
+    assert [c["name"] for c in index.of("alice")] == ["bob", "carol"]
+    assert index.of("dave") == []
+    # Doublon refusé, liste renvoyée en copie
+    assert not index.add(_contact("alice", "bob", favorite=True))
+    index.of("alice").clear()
+    assert len(index.of("alice")) == 2
+    assert len(index) == 3
+
+
+# ------------------------------
+# Compteurs du tableau de bord
+# ------------------------------
+def test_counters_follow_writes():
+    contacts = build_contact_index([_contact("alice", "bob", favorite=True)])
+    activity = build_activity_index(
+        [_message(1), _message(2, "bob", "alice"), _message(3, "alice", "alice")], contacts.of("alice"), contacts
+    )
+    assert activity.counts("alice") == {"sent": 2, "received": 2, "favorites": 1, "unread": 1}
+    assert activity.counts("bob") == {"sent": 1, "received": 1, "favorites": 0, "unread": 0}
+    assert activity.received_from("alice", "bob") == 1
+    activity.set_favorite("alice", True, False)
+    activity.set_favorite("alice", False, False)
+    assert activity.counts("alice")["favorites"] == 0
+    assert activity.counts("nobody") == {"sent": 0, "received": 0, "favorites": 0, "unread": 0}
+
+
+def test_recent_activity_is_bounded_and_newest_first():
+    activity = ActivityIndex(build_contact_index([]), recent=3)
+    for i in (1, 5, 2, 4, 3):
+        activity.add_message(_message(i))
+    assert _ids(activity.recent("alice")) == [5, 4, 3]
+    assert _ids(activity.recent("bob", limit=2)) == [5, 4]
+    assert activity.last_message_id("bob", "alice") == 5
+
+
+# ------------------------------
+# Non-lus et curseurs de lecture
+# ------------------------------
+def test_unread_counts_follow_the_read_cursor():
+    contacts = build_contact_index([_contact("bob", "alice")])
+    activity = build_activity_index(
+        [_message(1), _message(2), _message(3), _message(4, "carol", "bob")],
+        contacts.of("bob"), contacts, read_cursors=[{"user": "bob", "contact": "alice", "last_read_id": 2}],
+    )
+    assert activity.unread("bob", "alice") == 1
+    # Seuls les contacts de l'utilisateur comptent dans le total
+    assert activity.unread("bob", "carol") == 1
+    assert activity.counts("bob")["unread"] == 1
+    activity.mark_read("bob", "alice", 3)
+    assert activity.counts("bob")["unread"] == 0
+    # Curseur en retard (autre session) : ignoré
+    activity.mark_read("bob", "alice", 1)
+    activity.add_message(_message(5))
+    assert activity.unread("bob", "alice") == 1
+    assert activity.counts("bob")["unread"] == 1
+
+
+def test_adding_a_contact_counts_its_unread_messages():
+    contacts = build_contact_index([])
+    activity = ActivityIndex(contacts)
+    activity.add_message(_message(1))
+    contact = _contact("bob", "alice")
+    contacts.add(contact)
+    activity.add_contact(contact)
+    assert activity.counts("bob")["unread"] == 1
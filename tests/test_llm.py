@@ -0,0 +1,184 @@
+# tests/test_llm.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import llm
+from llm import AnthropicProvider, LLMClient, LLMError, MockProvider, OpenAIProvider, Provider, make_provider
+
+MESSAGES = [{"role": "system", "content": "Sois bref."}, {"role": "user", "content": "Bonjour"}]
+
+
+class ScriptedProvider(Provider):
+    """Fournisseur dont chaque appel suit le script suivant : exception à lever ou réponse."""
+    name = "scripted"
+    models = {"chat": "c", "analysis": "a"}
+
+    def __init__(self, script, delay=0.0):
+        super().__init__()
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    async def complete(self, model, messages, max_tokens):
+        await asyncio.sleep(self.delay)
+        return self._next()
+
+    async def stream(self, model, messages, max_tokens):
+        await asyncio.sleep(self.delay)
+        for part in self._next():
+            if isinstance(part, Exception):
+                raise part
+            yield part
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm, "BACKOFF_BASE", 0.001)
+
+
+@pytest.fixture
+def clients():
+    opened = []
+
+    def make(provider, **kw):
+        opened.append(LLMClient(provider, **kw))
+        return opened[-1]
+
+    yield make
+    for client in opened:
+        client.close()
+
+
+def test_transient_errors_are_retried(clients):
+    provider = ScriptedProvider([LLMError("503", retryable=True), LLMError("429", retryable=True), "ok"])
+    assert clients(provider).complete("c", MESSAGES, 10) == "ok"
+    assert provider.calls == 3
+
+
+def test_permanent_error_is_not_retried(clients):
+    provider = ScriptedProvider([LLMError("HTTP 401", retryable=False), "ok"])
+    with pytest.raises(LLMError, match="401"):
+        clients(provider).complete("c", MESSAGES, 10)
+    assert provider.calls == 1
+
+
+def test_retries_are_bounded(clients):
+    provider = ScriptedProvider([LLMError("503", retryable=True)])
+    with pytest.raises(LLMError):
+        clients(provider, max_retries=2).complete("c", MESSAGES, 10)
+    assert provider.calls == 3
+
+
+def test_deadline_covers_the_call(clients):
+    client = clients(ScriptedProvider(["trop tard"], delay=1.0), max_retries=0)
+    with pytest.raises(LLMError, match="délai dépassé"):
+        client.complete("c", MESSAGES, 10, timeout=0.05)
+
+
+def test_stream_retries_only_before_the_first_part(clients):
+    provider = ScriptedProvider([[LLMError("503", retryable=True)], ["a", "b"]])
+    assert list(clients(provider).stream("c", MESSAGES, 10)) == ["a", "b"]
+    assert provider.calls == 2
+    provider = ScriptedProvider([["a", LLMError("503", retryable=True)], ["x"]])
+    parts = clients(provider).stream("c", MESSAGES, 10)
+    assert next(parts) == "a"
+    with pytest.raises(LLMError):
+        next(parts)
+    assert provider.calls == 1
+
+
+def test_open_stream_releases_the_semaphore(clients):
+    client = clients(ScriptedProvider([["a", "b"]]), concurrency=1)
+    parts = client.stream("c", MESSAGES, 10)
+    assert next(parts) == "a"
+    # Flux encore ouvert : une autre requête passe quand même
+    assert not client._semaphore.locked()
+    client.provider.script = ["ok"]
+    assert client.complete("c", MESSAGES, 10, timeout=1) == "ok"
+    parts.close()
+
+
+def test_mock_provider(clients):
+    client = clients(MockProvider(latency=0, tokens_per_second=1000))
+    assert client.complete("mock-chat", MESSAGES, 10) == "Réponse simulée (7 caractères reçus)."
+    assert "".join(client.stream("mock-chat", MESSAGES, 10)).strip() == "Réponse simulée (7 caractères reçus)."
+    batch = [{"role": "system", "content": "Sentiment"}, {"role": "user", "content": json.dumps({"1": "super"})}]
+    assert json.loads(client.complete("mock-chat", batch, 10)) == {"1": "neutre"}
+
+
+def _mocked(provider, handler):
+    provider.http = httpx.AsyncClient(base_url=str(provider.http.base_url), transport=httpx.MockTransport(handler))
+    return provider
+
+
+def _sse(events):
+    return "".join(f"data: {e if isinstance(e, str) else json.dumps(e)}\n\n" for e in events).encode()
+
+
+def test_openai_provider(clients):
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if body.get("stream"):
+            chunks = [{"choices": [{"delta": {"content": t}}]} for t in ("Bon", "jour")]
+            return httpx.Response(200, content=_sse([*chunks, "[DONE]"]))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Bonjour"}}]})
+
+    client = clients(_mocked(OpenAIProvider("k"), handler))
+    assert client.complete("gpt", MESSAGES, 10) == "Bonjour"
+    assert list(client.stream("gpt", MESSAGES, 10)) == ["Bon", "jour"]
+    assert requests[0]["messages"] == MESSAGES
+
+
+def test_anthropic_provider_moves_system_prompt(clients):
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if body.get("stream"):
+            events = [
+                {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Bon"}},
+                {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "jour"}},
+                {"type": "message_stop"},
+            ]
+            return httpx.Response(200, content=_sse(events))
+        return httpx.Response(200, json={"content": [{"type": "text", "text": "Bonjour"}]})
+
+    client = clients(_mocked(AnthropicProvider("k"), handler))
+    assert client.complete("claude", MESSAGES, 10) == "Bonjour"
+    assert list(client.stream("claude", MESSAGES, 10)) == ["Bon", "jour"]
+    assert requests[0]["system"] == "Sois bref."
+    assert requests[0]["messages"] == MESSAGES[1:]
+
+
+def test_http_status_decides_retry(clients):
+    statuses = iter([529, 400])
+    client = clients(_mocked(AnthropicProvider("k"), lambda request: httpx.Response(next(statuses), text="erreur")))
+    with pytest.raises(LLMError, match="HTTP 400"):
+        client.complete("claude", MESSAGES, 10)
+
+
+def test_make_provider(monkeypatch):
+    for variable in ("LLM_PROVIDER", "OPENAI_API_KEY", "ANTHROPIC_API_KEY"):
+        monkeypatch.delenv(variable, raising=False)
+    assert make_provider() is None
+    monkeypatch.setenv("OPENAI_API_KEY", "votre_clé_api_ici")
+    assert make_provider() is None
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant")
+    assert isinstance(make_provider(), AnthropicProvider)
+    assert isinstance(make_provider("mock"), MockProvider)
+    with pytest.raises(ValueError):
+        make_provider("inconnu")
@@ -0,0 +1,91 @@
+# tests/test_message_log.py
+import json
+
+from crypto import Keyring
+from message_log import COMPACT_SUFFIX, MessageLog
+
+
+def _record(i, receiver=None):
+    receiver = receiver or ("bob" if i % 2 else "carol")
+    return {"sender": "alice", "receiver": receiver, "content": f"message {i}", "timestamp": f"2026-01-01T00:00:{i:02d}"}
+
+
+def _log(directory, **kw):
+    return MessageLog(directory, background=False, keyring=Keyring(), **kw)
+
+
+def test_append_survives_reopen(tmp_path):
+    log = _log(tmp_path)
+    for i in range(4):
+        log.append(_record(i))
+    reopened = _log(tmp_path)
+    assert len(reopened) == 4
+    assert [m["content"] for m in reopened.conversation("bob", "alice")] == ["message 1", "message 3"]
+    assert [m["content"] for m in reopened.records()] == [f"message {i}" for i in range(4)]
+
+
+def test_roll_and_compaction_keep_send_order(tmp_path):
+    log = _log(tmp_path, segment_max_bytes=600)
+    log.extend([_record(i) for i in range(12)])
+    segments = sorted(tmp_path.glob("*.jsonl"))
+    assert len(segments) > 2
+    assert all(path.name.endswith(COMPACT_SUFFIX) for path in segments[:-1])
+    # Segments compactés : lignes groupées par conversation sur le disque
+    on_disk = [json.loads(line)["content"] for line in segments[0].read_text().splitlines()]
+    assert on_disk != sorted(on_disk)
+    assert [m["content"] for m in log.records()] == [f"message {i}" for i in range(12)]
+    assert [m["content"] for m in log.conversation("alice", "carol")] == [f"message {i}" for i in range(0, 12, 2)]
+    assert [m["content"] for m in _log(tmp_path).records()] == [f"message {i}" for i in range(12)]
+
+
+def test_background_compaction(tmp_path):
+    log = MessageLog(tmp_path, segment_max_bytes=300, keyring=Keyring())
+    log.extend([_record(i) for i in range(12)])
+    log._compactor.join()
+    assert [m["content"] for m in log.conversation("alice", "bob")] == [f"message {i}" for i in range(1, 12, 2)]
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    log = _log(tmp_path)
+    log.extend([_record(0), _record(1)])
+    segment = next(tmp_path.glob("*.jsonl"))
+    with open(segment, "ab") as f:
+        f.write(b'{"sender": "alice", "rec')
+    reopened = _log(tmp_path)
+    assert len(reopened) == 2
+    assert segment.read_bytes().endswith(b"\n")
+    reopened.append(_record(2))
+    assert [m["content"] for m in _log(tmp_path).records()] == ["message 0", "message 1", "message 2"]
+
+
+def test_interrupted_compaction_keeps_compacted_copy(tmp_path):
+    log = _log(tmp_path, segment_max_bytes=300)
+    log.extend([_record(i) for i in range(12)])
+    compacted = sorted(tmp_path.glob(f"*{COMPACT_SUFFIX}"))[0]
+    # Arrêt après l'écriture de la version compactée, avant la suppression de l'originale
+    raw = compacted.with_name(compacted.name.replace(COMPACT_SUFFIX, ".jsonl"))
+    raw.write_bytes(compacted.read_bytes())
+    reopened = _log(tmp_path)
+    assert not raw.exists()
+    assert len(reopened) == 12
+
+
+def test_import_json_is_idempotent(tmp_path):
+    source = tmp_path / "messages.json"
+    messages = [_record(0), _record(1), _record(1)]
+    source.write_text(json.dumps(messages))
+    log = _log(tmp_path / "log")
+    # Arrêt entre l'ajout au journal et le renommage du fichier
+    log.extend(messages[:2])
+    assert log.import_json(source) == 1
+    assert len(log) == 3
+    assert not source.exists()
+    assert (tmp_path / "messages.json.imported").exists()
+
+
+def test_replace_rewrites_the_whole_log(tmp_path):
+    log = _log(tmp_path, segment_max_bytes=300)
+    log.extend([_record(i) for i in range(12)])
+    log.replace([_record(20), _record(21)])
+    assert [m["content"] for m in log.records()] == ["message 20", "message 21"]
+    assert [m["content"] for m in _log(tmp_path).records()] == ["message 20", "message 21"]
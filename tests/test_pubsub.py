@@ -0,0 +1,61 @@
+# tests/test_pubsub.py
+import gc
+
+from data_access import ConnectionPool
+from pubsub import PubSub, SQLiteBroker, message_event, thread_channel, user_channel
+
+
+def _message(sender="alice", receiver="bob"):
+    return {"id": 1, "sender": sender, "receiver": receiver, "timestamp": "2026-01-01T10:00:00"}
+
+
+def test_events_reach_only_listening_sessions():
+    pubsub = PubSub()
+    bob = pubsub.subscribe(user_channel("bob"))
+    thread = pubsub.subscribe(thread_channel("bob", "alice"), user_channel("bob"))
+    carol = pubsub.subscribe(user_channel("carol"))
+    pubsub.publish(*message_event(_message()))
+    assert [c for c, _ in bob.poll()] == [user_channel("bob")]
+    # Abonné aux deux canaux : un seul exemplaire, sur le fil
+    assert [(c, e["sender"]) for c, e in thread.poll()] == [(thread_channel("alice", "bob"), "alice")]
+    assert carol.poll() == []
+    assert bob.poll() == []
+
+
+def test_sending_session_does_not_receive_its_own_event():
+    pubsub = PubSub()
+    alice = pubsub.subscribe(thread_channel("alice", "bob"))
+    other_tab = pubsub.subscribe(thread_channel("alice", "bob"))
+    pubsub.publish(*message_event(_message()), source=alice)
+    assert alice.poll() == []
+    assert len(other_tab.poll()) == 1
+
+
+def test_listen_rebinds_and_closed_sessions_are_released():
+    pubsub = PubSub()
+    session = pubsub.subscribe(user_channel("bob"))
+    session.listen(user_channel("carol"))
+    assert pubsub.subscribers(user_channel("bob")) == 0
+    session.close()
+    assert pubsub.subscribers(user_channel("carol")) == 0
+    pubsub.subscribe(user_channel("dave"))
+    gc.collect()
+    assert pubsub.subscribers(user_channel("dave")) == 0
+
+
+def test_sqlite_broker_relays_other_processes(tmp_path):
+    path = str(tmp_path / "data.db")
+    refreshed = []
+    # Deux processus simulés : un pool et un courtier chacun, démarrage manuel
+    first = PubSub(SQLiteBroker(ConnectionPool(path)))
+    second_broker = SQLiteBroker(ConnectionPool(path))
+    second = PubSub(on_remote=lambda: refreshed.append(True))
+    second.broker = second_broker
+    session = second.subscribe(user_channel("bob"))
+    first.publish(*message_event(_message()))
+    # Ses propres événements ne reviennent pas au processus qui les a publiés
+    assert first.broker.poll() == []
+    second._receive(second_broker.poll())
+    assert refreshed == [True]
+    assert [e["receiver"] for _, e in session.poll()] == ["bob"]
+    first.close()
@@ -0,0 +1,53 @@
+# tests/test_qr_cache.py
+import pytest
+
+import qr_cache
+from qr_cache import QRCache, qr_payload
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+
+    def render(payload):
+        calls.append(payload)
+        return f"png:{payload}".encode().ljust(100, b".")
+
+    monkeypatch.setattr(qr_cache, "QRCODE_AVAILABLE", True)
+    monkeypatch.setattr(qr_cache, "render_qr", render)
+    return calls
+
+
+def test_each_payload_is_rendered_once(renders):
+    cache = QRCache()
+    assert cache.get(qr_payload("bob")) == cache.get(qr_payload("bob"))
+    assert renders == ["collabo://add/bob"]
+
+
+def test_memory_is_bounded_lru(renders):
+    cache = QRCache(max_bytes=250)
+    for name in ("a", "b", "a", "c"):
+        cache.get(qr_payload(name))
+    # "b", le moins récemment servi, est sorti ; "a" est resté
+    assert len(cache) == 2
+    cache.get(qr_payload("a"))
+    cache.get(qr_payload("b"))
+    assert renders == [qr_payload(n) for n in ("a", "b", "c", "b")]
+
+
+def test_disk_cache_survives_restart(renders, tmp_path):
+    QRCache(directory=str(tmp_path)).get(qr_payload("bob"))
+    png = QRCache(directory=str(tmp_path)).get(qr_payload("bob"))
+    assert png.startswith(b"png:collabo://add/bob")
+    assert len(renders) == 1
+    assert [p.suffix for p in tmp_path.iterdir()] == [".png"]
+
+
+def test_without_qrcode(monkeypatch):
+    monkeypatch.setattr(qr_cache, "QRCODE_AVAILABLE", False)
+    assert QRCache().get(qr_payload("bob")) is None
+
+
+def test_render_qr_produces_png():
+    pytest.importorskip("qrcode")
+    assert qr_cache.render_qr(qr_payload("bob")).startswith(b"\x89PNG")
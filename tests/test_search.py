@@ -0,0 +1,95 @@
+# tests/test_search.py
+from search import COMPACT_MIN, SearchIndex, build_search_index, tokenize
+
+
+def _message(index, num, text, users=("alice", "bob")):
+    index.add("message", num, text, users, {"id": num, "text": text})
+
+
+def _ids(results):
+    return [r["item"]["id"] for r in results]
+
+
+def test_tokenize_ignores_case_and_accents():
+    assert tokenize("Réunion À Évry") == ["reunion", "a", "evry"]
+
+
+def test_ranking_prefers_frequent_and_rare_terms():
+    index = SearchIndex()
+    _message(index, 1, "budget budget budget projet")
+    _message(index, 2, "budget projet planning")
+    _message(index, 3, "projet planning réunion")
+    assert _ids(index.search("alice", "budget")) == [1, 2]
+    # "budget" est plus rare que "projet" : il départage les documents
+    assert _ids(index.search("alice", "projet budget"))[:2] == [1, 2]
+
+
+def test_results_are_partitioned_by_user():
+    index = SearchIndex()
+    _message(index, 1, "contrat signé", users=("alice", "bob"))
+    _message(index, 2, "contrat en attente", users=("carol", "dave"))
+    assert _ids(index.search("alice", "contrat")) == [1]
+    assert _ids(index.search("carol", "contrat")) == [2]
+    assert index.search("eve", "contrat") == []
+
+
+def test_last_word_is_expanded_as_prefix():
+    index = SearchIndex()
+    _message(index, 1, "présentation du prototype")
+    _message(index, 2, "prix du prestataire")
+    _message(index, 3, "rien à voir")
+    assert sorted(_ids(index.search("alice", "pr"))) == [1, 2]
+    assert _ids(index.search("alice", "proto")) == [1]
+    # Seul le dernier mot est un préfixe : "voi" ne trouve pas "voir"
+    assert sorted(_ids(index.search("alice", "voi pr"))) == [1, 2]
+
+
+def test_replaced_document_is_searched_by_new_text():
+    index = SearchIndex()
+    _message(index, 1, "ancien texte")
+    _message(index, 1, "nouveau texte")
+    assert index.search("alice", "ancien") == []
+    assert _ids(index.search("alice", "nouveau")) == [1]
+    assert len(index) == 1
+
+
+def test_idf_ignores_deleted_documents():
+    fresh, edited = SearchIndex(), SearchIndex()
+    for index in (fresh, edited):
+        _message(index, 1, "budget trimestriel")
+        _message(index, 2, "planning trimestriel")
+    # Mêmes documents vivants, mais "budget" a figuré dans des messages supprimés
+    for num in range(3, 10):
+        _message(edited, num, "budget")
+        edited.remove("message", num)
+    assert edited.search("alice", "budget")[0]["score"] == fresh.search("alice", "budget")[0]["score"]
+
+
+def test_deleted_postings_are_compacted():
+    index = SearchIndex()
+    _message(index, 0, "gardé")
+    for num in range(1, COMPACT_MIN + 1):
+        _message(index, num, f"temporaire mot{num}")
+    for num in range(1, COMPACT_MIN + 1):
+        index.remove("message", num)
+    partition = index._partitions["alice"]
+    assert partition.dead == 0
+    assert "temporaire" not in partition.postings
+    assert _ids(index.search("alice", "gardé")) == [0]
+
+
+def test_app_documents_are_indexed_by_kind():
+    data = {
+        "messages": [{"id": 1, "sender": "alice", "receiver": "bob", "text": "devis salon", "timestamp": "t"}],
+        "contacts": [{"owner": "alice", "name": "carol", "domain": "Design", "notes": "salon de Lyon"}],
+        "ai_analyses": [
+            {"id": 7, "owner": "alice", "contact": "bob", "result": {"key_points": ["relancer le devis"]}},
+            {"id": 8, "message_id": 1, "sentiment": {"sentiment": "positif"}},
+        ],
+    }
+    index = build_search_index(data)
+    assert {r["kind"] for r in index.search("alice", "salon")} == {"message", "contact"}
+    assert [r["item"]["id"] for r in index.search("alice", "devis", kinds=("analysis",))] == [7]
+    assert len(index.search("alice", "devis", limit=1)) == 1
+    # Contact visible par son seul propriétaire
+    assert index.search("bob", "lyon") == []
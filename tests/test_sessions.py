@@ -0,0 +1,63 @@
+# tests/test_sessions.py
+import time
+
+import pytest
+
+from data_access import ConnectionPool
+from sessions import SessionManager
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return SessionManager(ConnectionPool(str(tmp_path / "sessions.db")))
+
+
+def test_token_is_validated(sessions):
+    token = sessions.create("alice")
+    assert sessions.validate(token) == "alice"
+    assert sessions.validate(token[:-1] + ("A" if token[-1] != "A" else "B")) is None
+    assert sessions.validate("n'importe quoi") is None
+    assert sessions.validate(None) is None
+
+
+def test_rotation_makes_the_token_single_use(sessions):
+    token = sessions.create("alice")
+    username, fresh = sessions.rotate(token)
+    assert username == "alice" and fresh != token
+    assert sessions.rotate(token) is None
+    assert sessions.validate(token) is None
+    assert sessions.validate(fresh) == "alice"
+
+
+def test_expired_token_is_refused(tmp_path):
+    sessions = SessionManager(ConnectionPool(str(tmp_path / "sessions.db")), ttl=-1)
+    token = sessions.create("alice")
+    assert sessions.validate(token) is None
+    assert sessions.rotate(token) is None
+
+
+def test_revoked_token_is_refused(sessions):
+    token = sessions.create("alice")
+    sessions.revoke(token)
+    assert sessions.validate(token) is None
+    assert sessions.rotate(token) is None
+    assert sessions.purge() == 1
+
+
+@pytest.mark.parametrize("token", ["é.9999999999.x", "a.9999999999.é", "a.１２.x", "a.b", 42])
+def test_crafted_tokens_are_refused(sessions, token):
+    assert sessions.validate(token) is None
+    assert sessions.rotate(token) is None
+    sessions.revoke(token)
+
+
+def test_revocation_by_another_process_is_seen_after_the_cache_ttl(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "sessions.db"))
+    app = SessionManager(pool, cache_ttl=0.05)
+    token = app.create("alice")
+    assert app.validate(token) == "alice"
+    SessionManager(pool).revoke(token)
+    # Encore servi par le cache, puis relu dans la table
+    assert app.validate(token) == "alice"
+    time.sleep(0.06)
+    assert app.validate(token) is None
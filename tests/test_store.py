@@ -0,0 +1,154 @@
+# tests/test_store.py
+import secrets
+
+import pytest
+
+from crypto import KEY_SIZE, CryptoError, Keyring
+from message_log import MessageLog
+from store import SEAL_PAGE_SIZE, Store
+
+
+def _messages(count, start=0):
+    return [
+        {
+            "sender": "alice",
+            "receiver": "bob" if i % 2 else "carol",
+            "text": f"message {i}",
+            "timestamp": f"2026-01-01T00:00:00.{i:06d}",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.fixture
+def keyring():
+    return Keyring(secrets.token_bytes(KEY_SIZE))
+
+
+@pytest.fixture
+def store(tmp_path, keyring):
+    return Store(str(tmp_path / "data.db"), keyring=keyring)
+
+
+def _texts(store):
+    return [m["text"] for m in store.load()["messages"]]
+
+
+def test_messages_round_trip_across_page_boundary(store):
+    for message in _messages(SEAL_PAGE_SIZE + 10):
+        store.add_message(message)
+    with store.pool.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sealed_pages").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 10
+        assert conn.execute("SELECT COUNT(*) FROM messages WHERE typeof(text) = 'text'").fetchone()[0] == 0
+    assert _texts(store) == [f"message {i}" for i in range(SEAL_PAGE_SIZE + 10)]
+    # Lecture paginée à cheval sur la page scellée et les lignes récentes
+    page = store.messages_after(SEAL_PAGE_SIZE - 3, 5)
+    assert [m["id"] for m in page] == list(range(SEAL_PAGE_SIZE - 2, SEAL_PAGE_SIZE + 3))
+
+
+def test_bulk_insert_keeps_pending_rows_in_order(store):
+    store.add_messages(_messages(10))
+    store.add_messages(_messages(2 * SEAL_PAGE_SIZE, start=10))
+    assert _texts(store) == [f"message {i}" for i in range(2 * SEAL_PAGE_SIZE + 10)]
+    assert [m["id"] for m in store.iter_messages()] == list(range(1, 2 * SEAL_PAGE_SIZE + 11))
+
+
+def test_ciphertext_copied_to_another_row_fails(store):
+    store.add_messages(_messages(2))
+    with store.transaction() as conn:
+        conn.execute("UPDATE messages SET text = (SELECT text FROM messages WHERE id = 1) WHERE id = 2")
+    with pytest.raises(CryptoError):
+        store.load()
+
+
+def test_swapped_pages_fail(store):
+    store.add_messages(_messages(2 * SEAL_PAGE_SIZE))
+    with store.transaction() as conn:
+        first, second = conn.execute("SELECT payload FROM sealed_pages ORDER BY first_id").fetchall()
+        conn.execute("UPDATE sealed_pages SET payload = ? WHERE first_id = 1", (second[0],))
+    with pytest.raises(CryptoError):
+        store.load()
+
+
+def test_contact_details_are_encrypted(store):
+    store.add_contact({"owner": "alice", "name": "bob", "domain": "Design"})
+    with store.pool.read() as conn:
+        assert isinstance(conn.execute("SELECT domain FROM contacts").fetchone()[0], bytes)
+    assert store.load()["contacts"][0]["domain"] == "Design"
+
+
+def test_encrypt_existing_migrates_plaintext_store(tmp_path, keyring):
+    path = str(tmp_path / "data.db")
+    plain = Store(path, keyring=Keyring())
+    plain.add_messages(_messages(SEAL_PAGE_SIZE + 5))
+    plain.add_contact({"owner": "alice", "name": "bob", "domain": "Design"})
+    store = Store(path, keyring=keyring)
+    counts = store.encrypt_existing()
+    assert counts == {"messages": SEAL_PAGE_SIZE + 5, "ai_analyses": 0, "contacts": 1}
+    with store.pool.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages WHERE typeof(text) = 'text'").fetchone()[0] == 0
+        assert conn.execute("SELECT typeof(domain) FROM contacts").fetchone()[0] == "blob"
+    assert _texts(store) == [f"message {i}" for i in range(SEAL_PAGE_SIZE + 5)]
+    assert store.load()["contacts"][0]["domain"] == "Design"
+
+
+def test_message_log_encrypt_existing(tmp_path, keyring):
+    plain = MessageLog(tmp_path, background=False, keyring=Keyring())
+    plain.extend([
+        {"sender": m["sender"], "receiver": m["receiver"], "content": m["text"], "timestamp": m["timestamp"]}
+        for m in _messages(4)
+    ])
+    log = MessageLog(tmp_path, background=False, keyring=keyring)
+    assert log.encrypt_existing() == 4
+    assert log.encrypt_existing() == 0
+    assert "message" not in "".join(p.read_text() for p in tmp_path.glob("*.jsonl"))
+    assert [m["content"] for m in log.conversation("alice", "bob")] == ["message 1", "message 3"]
+
+
+def test_user_messages_only_open_their_pages(store):
+    messages = _messages(2 * SEAL_PAGE_SIZE)
+    for m in messages[:SEAL_PAGE_SIZE]:
+        m["receiver"] = "dave"
+    store.add_messages(messages + _messages(3, start=2 * SEAL_PAGE_SIZE))
+    with store.pool.read() as conn:
+        users = [r[0] for r in conn.execute("SELECT users FROM sealed_pages ORDER BY first_id")]
+    assert users == ["\x1falice\x1fdave\x1f", "\x1falice\x1fbob\x1fcarol\x1f"]
+    bob = [m["text"] for m in store.iter_messages("bob", batch=50)]
+    assert bob == [f"message {i}" for i in range(SEAL_PAGE_SIZE + 1, 2 * SEAL_PAGE_SIZE + 3, 2)]
+    assert len(list(store.iter_messages("dave"))) == SEAL_PAGE_SIZE
+    assert len(list(store.iter_messages("alice"))) == 2 * SEAL_PAGE_SIZE + 3
+
+
+def test_contact_details_round_trip(store):
+    store.add_contacts([{"owner": "alice", "name": "bob", "domain": "Design", "occasion": "Salon", "notes": "À rappeler"}])
+    contact = next(store.iter_contacts("alice"))
+    assert (contact["domain"], contact["occasion"], contact["notes"]) == ("Design", "Salon", "À rappeler")
+
+
+@pytest.mark.parametrize("encrypted", [True, False])
+def test_replace_sentiments_drops_previous_analyses(tmp_path, keyring, encrypted):
+    store = Store(str(tmp_path / "data.db"), keyring=keyring if encrypted else Keyring())
+    count = SEAL_PAGE_SIZE + 10
+    store.add_analyses([{"message_id": i, "sentiment": "neutre"} for i in range(1, count + 1)])
+    store.add_analysis({"kind": "summary", "result": "résumé"})
+    # Une analyse scellée et une récente remplacées dans la même transaction
+    store.replace_sentiments([{"message_id": 3, "sentiment": "positif"}, {"message_id": count, "sentiment": "négatif"}])
+    analyses = store.load()["ai_analyses"]
+    sentiments = [(a["message_id"], a["sentiment"]) for a in analyses if "sentiment" in a]
+    assert len(sentiments) == count
+    assert dict(sentiments)[3] == "positif"
+    assert dict(sentiments)[count] == "négatif"
+    assert any(a.get("kind") == "summary" for a in analyses)
+    # Identifiants jamais réutilisés, même après réécriture d'une page
+    assert len({a["id"] for a in analyses}) == len(analyses)
+
+
+def test_existing_messages_are_found_after_the_key_changes(tmp_path, keyring):
+    path = str(tmp_path / "data.db")
+    Store(path, keyring=Keyring()).add_messages(_messages(SEAL_PAGE_SIZE + 5))
+    # Nouvelle clé maîtresse : l'index d'empreintes est reconstruit à l'ouverture
+    store = Store(path, keyring=keyring)
+    store.encrypt_existing()
+    assert store.add_messages(_messages(SEAL_PAGE_SIZE + 10), skip_existing=True) == 5
+    assert _texts(store) == [f"message {i}" for i in range(SEAL_PAGE_SIZE + 10)]
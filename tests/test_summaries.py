@@ -0,0 +1,95 @@
+# tests/test_summaries.py
+import secrets
+import threading
+
+import pytest
+
+from crypto import KEY_SIZE, Keyring
+from data_access import ConnectionPool
+from summaries import RollingSummarizer
+
+
+class FakeAI:
+    """Résumé = liste des textes ; enregistre chaque appel au modèle."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fold_summary(self, previous, messages):
+        self.calls.append(("fold", previous, [m["text"] for m in messages]))
+        return "|".join(filter(None, [previous, *(m["text"] for m in messages)]))
+
+    def merge_summaries(self, summaries):
+        self.calls.append(("merge", list(summaries)))
+        return "+".join(summaries)
+
+    def stream_fold_summary(self, previous, messages, cancel=None):
+        yield from self.fold_summary(previous, messages)
+
+    def stream_merge_summaries(self, summaries, cancel=None):
+        yield from self.merge_summaries(summaries)
+
+
+def _messages(start, stop):
+    return [
+        {"id": i, "sender": "alice" if i % 2 else "bob", "receiver": "bob" if i % 2 else "alice",
+         "text": f"m{i}", "timestamp": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+        for i in range(start, stop)
+    ]
+
+
+@pytest.fixture
+def ai():
+    return FakeAI()
+
+
+@pytest.fixture
+def summarizer(tmp_path, ai):
+    return RollingSummarizer(ConnectionPool(str(tmp_path / "data.db")), ai, chunk_size=3, fan_in=2)
+
+
+def test_only_new_messages_are_sent(summarizer, ai):
+    assert summarizer.summarize("alice", "bob", _messages(0, 2)) == "m0|m1"
+    assert summarizer.summarize("bob", "alice", _messages(0, 4)) == "m0|m1|m2|m3"
+    assert ai.calls[-1] == ("fold", "m0|m1", ["m2", "m3"])
+    # Rien de nouveau : pas d'appel au modèle
+    calls = len(ai.calls)
+    assert summarizer.summarize("alice", "bob", _messages(0, 4)) == "m0|m1|m2|m3"
+    assert len(ai.calls) == calls
+    state = summarizer.get("bob", "alice")
+    assert state["watermark"] == ("2026-01-01T00:00:03", 3)
+    assert state["message_count"] == 4
+
+
+def test_long_backlog_is_summarized_hierarchically(summarizer, ai):
+    summary = summarizer.summarize("alice", "bob", _messages(0, 8))
+    # Tranches de 3, fusionnées deux par deux
+    assert [c[0] for c in ai.calls] == ["fold", "fold", "fold", "merge", "merge"]
+    assert summary == "m0|m1|m2+m3|m4|m5+m6|m7"
+    assert summarizer.get("alice", "bob")["message_count"] == 8
+
+
+def test_stream_saves_only_complete_summaries(summarizer):
+    cancel = threading.Event()
+    parts = summarizer.stream("alice", "bob", _messages(0, 2), cancel)
+    next(parts)
+    cancel.set()
+    list(parts)
+    assert summarizer.get("alice", "bob") is None
+    assert "".join(summarizer.stream("alice", "bob", _messages(0, 2))) == "m0|m1"
+    assert summarizer.get("alice", "bob")["summary"] == "m0|m1"
+    # Déjà à jour : le résumé enregistré est renvoyé tel quel
+    assert list(summarizer.stream("alice", "bob", _messages(0, 2))) == ["m0|m1"]
+
+
+def test_summary_is_encrypted_at_rest(tmp_path, ai):
+    pool = ConnectionPool(str(tmp_path / "data.db"))
+    RollingSummarizer(pool, ai, keyring=Keyring()).summarize("alice", "bob", _messages(0, 2))
+    keyring = Keyring(secrets.token_bytes(KEY_SIZE))
+    # Résumé en clair d'avant la clé : chiffré à l'ouverture
+    summarizer = RollingSummarizer(pool, ai, keyring=keyring)
+    summarizer.summarize("carol", "bob", _messages(0, 1))
+    with pool.read() as conn:
+        assert {r[0] for r in conn.execute("SELECT typeof(summary) FROM conversation_summaries")} == {"blob"}
+    assert summarizer.get("bob", "alice")["summary"] == "m0|m1"
+    assert summarizer.get("bob", "carol")["summary"] == "m0"
@@ -1,21 +1,18 @@
-import os
-import json
-import sqlite3
-import hashlib
 from datetime import datetime
 import streamlit as st
 from dotenv import load_dotenv
-import openai
+
+import data_access
+from ai_service import AIService
+from credentials import get_credentials
+from data_access import DB_FILE, FEED_PAGE_SIZE
+from search import SearchIndex, index_contact, index_message
+from sessions import SessionManager
 
 # ==============================
 # CONFIG
 # ==============================
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-AI_ANALYSIS_ENABLED = os.getenv("AI_ANALYSIS_ENABLED", "true").lower() == "true"
-
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
 
 st.set_page_config(
     page_title="🤝 Collabo",
@@ -26,105 +23,90 @@ st.set_page_config(
 # ==============================
 # DATABASE (LOCAL – PRIVÉ)
 # ==============================
-DB_FILE = "collabo.db"
-
-def get_db():
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
-
-db = get_db()
-cur = db.cursor()
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    username TEXT PRIMARY KEY,
-    password TEXT
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS messages (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    sender TEXT,
-    receiver TEXT,
-    content TEXT,
-    timestamp TEXT
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS contacts (
-    owner TEXT,
-    name TEXT,
-    domain TEXT,
-    occasion TEXT,
-    notes TEXT
-)
-""")
-
-db.commit()
+@st.cache_resource
+def get_pool():
+    # Partagé par toutes les sessions : chaque requête emprunte sa propre connexion
+    pool = data_access.ConnectionPool(DB_FILE)
+    with pool.exclusive() as conn:
+        data_access.migrate(conn)
+    return pool
+
+pool = get_pool()
+
+def message_doc(msg_id, sender, receiver, content, timestamp):
+    return {"id": msg_id, "sender": sender, "receiver": receiver, "text": content, "timestamp": timestamp}
+
+def contact_doc(owner, name, domain, occasion, notes):
+    return {"owner": owner, "name": name, "domain": domain, "occasion": occasion, "notes": notes}
+
+@st.cache_resource
+def get_search_index():
+    # Construit une fois au démarrage, puis tenu à jour à chaque écriture
+    index = SearchIndex()
+    with pool.read() as conn:
+        for row in data_access.iter_messages(conn):
+            index_message(index, message_doc(*row))
+        for rowid, *contact in data_access.iter_contacts(conn):
+            index_contact(index, contact_doc(*contact), key=rowid)
+    return index
+
+search_index = get_search_index()
 
 # ==============================
 # AUTH
 # ==============================
-def hash_pwd(p):
-    return hashlib.sha256(p.encode()).hexdigest()
-
 def register(u, p):
-    try:
-        cur.execute("INSERT INTO users VALUES (?,?)", (u, hash_pwd(p)))
-        db.commit()
-        return True
-    except:
-        return False
+    password_hash = get_credentials().hash(p)
+    with pool.write() as conn:
+        return data_access.insert_user(conn, u, password_hash)
 
 def login(u, p):
-    cur.execute("SELECT * FROM users WHERE username=? AND password=?", (u, hash_pwd(p)))
-    return cur.fetchone() is not None
+    with pool.read() as conn:
+        row = data_access.fetch_user(conn, u)
+    ok, new_hash = get_credentials().verify(p, row[1] if row else None, legacy="sha256")
+    # Ancienne empreinte SHA-256 : remplacée par scrypt dès la première connexion
+    if ok and new_hash:
+        with pool.write() as conn:
+            data_access.update_password(conn, u, new_hash)
+    return ok
 
 # ==============================
 # AI SERVICE
 # ==============================
-class AIService:
-    def analyze(self, text, contact):
-        if not OPENAI_API_KEY or not AI_ANALYSIS_ENABLED:
-            return self.mock()
-
-        prompt = f"""
-Analyse cette discussion professionnelle avec {contact}.
-Retourne UNIQUEMENT du JSON avec :
-key_points, opportunities, cooperation_model,
-credibility_score, usefulness_score,
-success_probability, priority_level, next_actions
-"""
-        try:
-            r = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt + "\n\n" + text}],
-                max_tokens=1200
-            )
-            return json.loads(r.choices[0].message.content)
-        except:
-            return self.mock()
-
-    def mock(self):
-        return {
-            "key_points": ["Discussion stratégique"],
-            "opportunities": ["Collaboration"],
-            "cooperation_model": "Partenariat",
-            "credibility_score": 8,
-            "usefulness_score": 7,
-            "success_probability": 70,
-            "priority_level": "medium",
-            "next_actions": ["Relancer", "Planifier RDV"]
-        }
-
 ai = AIService()
 
 # ==============================
 # SESSION
 # ==============================
+@st.cache_resource
+def get_sessions():
+    sessions = SessionManager(pool)
+    sessions.purge()
+    return sessions
+
+sessions = get_sessions()
+
+# Fil paginé : propre à l'utilisateur connecté, effacé à chaque changement
+FEED_STATE = ("feed_older", "feed_anchor", "feed_cursor")
+
+def reset_feed():
+    for key in FEED_STATE:
+        st.session_state.pop(key, None)
+
 if "user" not in st.session_state:
+    # Rafraîchissement du navigateur : reprise depuis le jeton de l'URL, sans mot de passe ;
+    # le jeton présenté est aussitôt remplacé par un nouveau
+    restored = sessions.rotate(st.query_params.get("session"))
+    st.session_state.user = restored[0] if restored else None
+    if restored:
+        st.query_params["session"] = restored[1]
+    else:
+        st.query_params.pop("session", None)
+elif st.session_state.user and sessions.validate(st.query_params.get("session")) != st.session_state.user:
+    # Session révoquée ailleurs ou expirée : retour à l'écran de connexion
+    reset_feed()
     st.session_state.user = None
+    st.query_params.pop("session", None)
 
 # ==============================
 # AUTH UI
@@ -140,7 +122,9 @@ if not st.session_state.user:
 
         if st.button("Se connecter"):
             if login(u, p):
+                reset_feed()
                 st.session_state.user = u
+                st.query_params["session"] = sessions.create(u)
                 st.rerun()
             else:
                 st.error("Identifiants incorrects")
@@ -165,7 +149,7 @@ st.sidebar.success(f"Connecté : {user}")
 
 menu = st.sidebar.radio(
     "Menu",
-    ["💬 Chat", "👥 Contacts", "🧠 Analyse IA", "🚪 Déconnexion"]
+    ["💬 Chat", "👥 Contacts", "🔎 Recherche", "🧠 Analyse IA", "🚪 Déconnexion"]
 )
 
 # ==============================
@@ -178,21 +162,38 @@ if menu == "💬 Chat":
     msg = st.text_area("Message")
 
     if st.button("Envoyer"):
-        cur.execute(
-            "INSERT INTO messages (sender,receiver,content,timestamp) VALUES (?,?,?,?)",
-            (user, receiver, msg, datetime.now().isoformat())
-        )
-        db.commit()
-
-    cur.execute("""
-    SELECT sender, content, timestamp FROM messages
-    WHERE (sender=? OR receiver=?)
-    ORDER BY timestamp DESC
-    """, (user, user))
-
-    for s, c, t in cur.fetchall():
+        timestamp = datetime.now().isoformat()
+        with pool.write() as conn:
+            msg_id = data_access.insert_message(conn, user, receiver, msg, timestamp)
+        index_message(search_index, message_doc(msg_id, user, receiver, msg, timestamp))
+
+    # Première page : les FEED_PAGE_SIZE messages les plus récents. Les pages
+    # plus anciennes sont chargées à la demande depuis le curseur de la
+    # précédente ; une fois l'historique ouvert, le haut du fil est relu
+    # depuis l'ancre de la première page, sans trou ni doublon.
+    if "feed_older" not in st.session_state:
+        st.session_state.feed_older = []
+        st.session_state.feed_anchor = None
+        st.session_state.feed_cursor = None
+
+    with pool.read() as conn:
+        if st.session_state.feed_anchor is None:
+            rows, cursor = data_access.fetch_feed(conn, user, limit=FEED_PAGE_SIZE)
+        else:
+            rows = data_access.fetch_feed_since(conn, user, st.session_state.feed_anchor)
+            cursor = st.session_state.feed_cursor
+    for _id, s, _r, c, t in rows + st.session_state.feed_older:
         st.markdown(f"**{s}** : {c}")
 
+    if cursor is not None and st.button("⬆️ Messages plus anciens"):
+        with pool.read() as conn:
+            page, next_cursor = data_access.fetch_feed(conn, user, limit=FEED_PAGE_SIZE, before=cursor)
+        if st.session_state.feed_anchor is None:
+            st.session_state.feed_anchor = cursor
+        st.session_state.feed_older.extend(page)
+        st.session_state.feed_cursor = next_cursor
+        st.rerun()
+
 # ==============================
 # CONTACTS
 # ==============================
@@ -205,14 +206,32 @@ if menu == "👥 Contacts":
     notes = st.text_area("Notes")
 
     if st.button("Ajouter"):
-        cur.execute(
-            "INSERT INTO contacts VALUES (?,?,?,?,?)",
-            (user, name, domain, occasion, notes)
-        )
-        db.commit()
+        with pool.write() as conn:
+            rowid = data_access.insert_contact(conn, user, name, domain, occasion, notes)
+        index_contact(search_index, contact_doc(user, name, domain, occasion, notes), key=rowid)
+
+    with pool.read() as conn:
+        contacts = data_access.fetch_contacts(conn, user)
+    st.table(contacts)
 
-    cur.execute("SELECT name, domain, occasion FROM contacts WHERE owner=?", (user,))
-    st.table(cur.fetchall())
+# ==============================
+# RECHERCHE
+# ==============================
+if menu == "🔎 Recherche":
+    st.header("🔎 Recherche")
+
+    query = st.text_input("Messages, contacts, domaines, notes...", key="search_query")
+    if query.strip():
+        results = search_index.search(user, query)
+        if not results:
+            st.info("Aucun résultat")
+        for result in results:
+            item = result["item"]
+            if result["kind"] == "message":
+                st.markdown(f"💬 **{item['sender']}** → **{item['receiver']}** : {item['text']}")
+            else:
+                details = " · ".join(filter(None, (item["domain"], item["occasion"], item["notes"])))
+                st.markdown(f"👥 **{item['name']}** {details}")
 
 # ==============================
 # ANALYSE IA
@@ -225,12 +244,16 @@ if menu == "🧠 Analyse IA":
 
     if st.button("Analyser"):
         with st.spinner("Analyse IA..."):
-            result = ai.analyze(text, contact)
+            result = ai.analyze_conversation(text, contact)
         st.json(result)
 
 # ==============================
 # LOGOUT
 # ==============================
 if menu == "🚪 Déconnexion":
+    if "session" in st.query_params:
+        sessions.revoke(st.query_params["session"])
+        del st.query_params["session"]
+    reset_feed()
     st.session_state.user = None
     st.rerun()
\ No newline at end of file